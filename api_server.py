@@ -1,10 +1,13 @@
-from flask import Flask, jsonify, send_from_directory
+from flask import Flask, Response, jsonify, request, send_from_directory
 from flask_cors import CORS
-import json
 import os
 import threading
 import subprocess
-from datetime import datetime
+import time
+import catalogo
+from metriche import formato_prometheus, leggi_ultimo_run
+from indice_bandi import CursorScaduto, QueryNonValida, LIMIT_DEFAULT, LIMIT_MAX
+from ndjson_bandi import riga_ndjson
 
 # ========================
 # 🚀 INIZIALIZZAZIONE APP
@@ -13,35 +16,29 @@ from datetime import datetime
 app = Flask(__name__)
 CORS(app)
 
-bandi_cache = []
-ultimo_aggiornamento = None
-JSON_FILE = os.path.join(os.path.dirname(__file__), "bandi_database_reale.json")
+# Byte per blocco quando si inviano i payload mappati in memoria
+BLOCCO_RISPOSTA = 64 * 1024
 
 # ========================
 # 🧠 FUNZIONI DI UTILITÀ
 # ========================
 
 def carica_bandi_da_json():
-    """Carica i bandi dal file locale"""
-    global bandi_cache, ultimo_aggiornamento
+    """Carica i bandi dal file locale (in caso di errore resta lo snapshot precedente)"""
     try:
-        if not os.path.exists(JSON_FILE):
-            with open(JSON_FILE, "w", encoding="utf-8") as f:
-                json.dump([], f)
-
-        with open(JSON_FILE, "r", encoding="utf-8") as f:
-            bandi_cache = json.load(f)
-
-        ultimo_aggiornamento = datetime.fromtimestamp(os.path.getmtime(JSON_FILE))
-        print(f"✅ Caricati {len(bandi_cache)} bandi da {JSON_FILE}")
+        catalogo.ricarica(forza=True)
     except Exception as e:
         print(f"⚠️ Errore caricamento JSON: {e}")
-        bandi_cache = []
+
+def _iso(aggiornamento):
+    return aggiornamento.isoformat() if aggiornamento else None
 
 def aggiorna_bandi_in_background():
     """Esegue genera_database_bandi.py senza bloccare Flask"""
     try:
         print("\n⚙️ Avvio aggiornamento bandi in background...\n")
+        snapshot_file = catalogo.file_snapshot()
+        mtime_prima = os.path.getmtime(snapshot_file) if os.path.exists(snapshot_file) else None
         result = subprocess.run(
             ["python", "genera_database_bandi.py"],
             capture_output=True,
@@ -50,8 +47,12 @@ def aggiorna_bandi_in_background():
         )
         print(result.stdout)
         if result.returncode == 0:
+            snapshot_file = catalogo.file_snapshot()
+            if os.path.exists(snapshot_file) and os.path.getmtime(snapshot_file) == mtime_prima:
+                print("💤 Nessuna modifica ai bandi, ricaricamento non necessario.")
+                return
             print("✅ Aggiornamento bandi completato, ricarico il file JSON...")
-            carica_bandi_da_json()
+            catalogo.ricarica()
         else:
             print(f"⚠️ Errore durante genera_database_bandi.py: {result.stderr}")
     except Exception as e:
@@ -65,23 +66,144 @@ def aggiorna_bandi_in_background():
 def serve_frontend():
     return send_from_directory(".", "index.html")
 
+# Parametri che attivano la modalità query (filtri + paginazione lato server)
+PARAMETRI_QUERY = ("categoria", "regione", "stato", "ente", "q", "sort", "limit", "cursor")
+
 @app.route("/api/bandi")
 def get_bandi():
+    if any(p in request.args for p in PARAMETRI_QUERY):
+        return query_bandi()
+
+    payload = catalogo.corrente().payload
+    headers = {
+        "ETag": f'"{payload["etag"]}"',
+        "Vary": "Accept-Encoding",
+        "Cache-Control": "no-cache"
+    }
+    if request.if_none_match.contains_weak(payload["etag"]):
+        return Response(status=304, headers=headers)
+
+    # Preferenza br > gzip > identity, tra le varianti già compresse
+    varianti = payload["varianti"]
+    encoding = "identity"
+    for candidato in ("br", "gzip"):
+        if candidato in varianti and request.accept_encodings[candidato]:
+            encoding = candidato
+            break
+    if encoding != "identity":
+        headers["Content-Encoding"] = encoding
+
+    corpo = varianti[encoding]
+    if isinstance(corpo, bytes):
+        return Response(corpo, mimetype="application/json", headers=headers)
+
+    # Variante mappata in memoria: inviata a blocchi senza copiarla tutta nel worker
+    headers["Content-Length"] = str(len(corpo))
+    blocchi = (corpo[i:i + BLOCCO_RISPOSTA] for i in range(0, len(corpo), BLOCCO_RISPOSTA))
+    return Response(blocchi, mimetype="application/json", headers=headers, direct_passthrough=True)
+
+def query_bandi():
+    """Filtri, ordinamento e paginazione a cursore risolti sugli indici in memoria"""
+    snapshot = catalogo.corrente()
+    filtri = {k: request.args.get(k) for k in ("categoria", "regione", "stato", "ente")}
+    try:
+        limit = int(request.args.get("limit", LIMIT_DEFAULT))
+        pagina, totale, next_cursor = snapshot.indice.cerca(
+            filtri=filtri,
+            q=request.args.get("q"),
+            sort=request.args.get("sort"),
+            limit=limit,
+            cursor=request.args.get("cursor"),
+        )
+    except CursorScaduto as e:
+        return jsonify({"success": False, "error": str(e)}), 410
+    except (ValueError, QueryNonValida) as e:
+        return jsonify({"success": False, "error": str(e)}), 400
+
     return jsonify({
         "success": True,
-        "count": len(bandi_cache),
-        "ultimo_aggiornamento": ultimo_aggiornamento.isoformat() if ultimo_aggiornamento else None,
-        "bandi": bandi_cache
+        "count": totale,
+        "ultimo_aggiornamento": _iso(snapshot.aggiornamento),
+        "bandi": [bando.a_dict() for bando in pagina],
+        "limit": limit,
+        "next_cursor": next_cursor
+    })
+
+@app.route("/api/bandi.ndjson")
+def export_bandi_ndjson():
+    """Export NDJSON (un bando per riga) in chunked transfer, a memoria costante"""
+    snapshot = catalogo.corrente()
+    percorso = catalogo.file_snapshot()
+
+    def genera():
+        if percorso.endswith(".ndjson"):
+            with open(percorso, "rb") as f:
+                while True:
+                    blocco = f.read(BLOCCO_RISPOSTA)
+                    if not blocco:
+                        break
+                    yield blocco
+        else:
+            for bando in snapshot.bandi:
+                yield riga_ndjson(bando.a_dict()).encode("utf-8")
+
+    return Response(genera(), mimetype="application/x-ndjson",
+                    headers={"Content-Disposition": "inline; filename=bandi.ndjson"})
+
+@app.route("/api/bandi/search")
+def search_bandi():
+    """Ricerca full-text con ranking BM25; l'ultima parola vale anche come prefisso"""
+    snapshot = catalogo.corrente()
+    q = request.args.get("q", "")
+    filtri = {k: request.args.get(k) for k in ("categoria", "regione", "stato", "ente")}
+    try:
+        limit = int(request.args.get("limit", 20))
+        if limit < 1 or limit > LIMIT_MAX:
+            raise QueryNonValida(f"limit deve essere tra 1 e {LIMIT_MAX}")
+        candidati = snapshot.indice.filtra(filtri)
+    except (ValueError, QueryNonValida) as e:
+        return jsonify({"success": False, "error": str(e)}), 400
+
+    testo = snapshot.indice.testo
+    risultati, totale = testo.cerca(q, limit=limit, candidati=candidati)
+    ultima = q.split()[-1] if q.strip() and not q[-1].isspace() else ""
+
+    return jsonify({
+        "success": True,
+        "count": totale,
+        "bandi": [snapshot.bandi[pos].a_dict() for pos, _ in risultati],
+        "punteggi": [round(punteggio, 4) for _, punteggio in risultati],
+        "suggerimenti": testo.completa(ultima) if ultima else []
     })
 
 @app.route("/api/health")
 def health_check():
+    snapshot = catalogo.corrente()
     return jsonify({
         "status": "ok",
-        "bandi_count": len(bandi_cache),
-        "ultimo_aggiornamento": ultimo_aggiornamento.isoformat() if ultimo_aggiornamento else None
+        "bandi_count": len(snapshot.bandi),
+        "ultimo_aggiornamento": _iso(snapshot.aggiornamento)
     })
 
+@app.route("/api/ultimo-run")
+def ultimo_run():
+    """Riepilogo dell'ultimo refresh: sorgenti, host, stadi della pipeline."""
+    riepilogo = leggi_ultimo_run()
+    if riepilogo is None:
+        return jsonify({"error": "Nessun refresh registrato"}), 404
+    return jsonify(riepilogo)
+
+@app.route("/metrics")
+def metrics():
+    """Metriche in formato Prometheus: catalogo servito + ultimo refresh (data/ultimo_run.json)."""
+    snapshot = catalogo.corrente()
+    extra = [("bandi_catalogo_bandi", "Bandi nel catalogo servito", len(snapshot.bandi), {})]
+    if snapshot.aggiornamento:
+        eta = time.time() - snapshot.aggiornamento.timestamp()
+        extra.append(("bandi_catalogo_eta_secondi", "Secondi dall'ultimo aggiornamento del catalogo", round(eta, 1), {}))
+    return Response(formato_prometheus(leggi_ultimo_run(), extra),
+                    content_type="text/plain; version=0.0.4; charset=utf-8")
+
 @app.route("/sitemap.xml")
 def serve_sitemap():
     return send_from_directory(os.getcwd(), "sitemap.xml")
@@ -103,8 +225,11 @@ def serve_static_files(path):
 # ⚙️ AVVIO FLASK SU RAILWAY
 # ========================
 
+# Caricamento all'import: vale anche per ogni worker gunicorn (Procfile), non solo per __main__
+carica_bandi_da_json()
+catalogo.avvia_osservatore()
+
 if __name__ == "__main__":
-    carica_bandi_da_json()
     # Avvia lo scraping in un thread parallelo
     threading.Thread(target=aggiorna_bandi_in_background, daemon=True).start()
     port = int(os.environ.get("PORT", 8080))
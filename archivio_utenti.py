@@ -0,0 +1,324 @@
+"""
+Archivio Utenti - Utenti di auth_server su SQLite in modalità WAL
+
+Ogni modifica tocca solo le righe dell'utente interessato (niente riscrittura
+dell'intero users_data.json a ogni registrazione o bando salvato) e più worker
+gunicorn possono scrivere insieme: WAL permette letture concorrenti alle
+scritture e busy_timeout mette in fila i writer degli altri processi.
+L'email è la chiave primaria, quindi la ricerca per email usa l'indice. I
+bandi salvati stanno in una tabella a parte, una riga per (utente, bando): le
+raffiche di salva/rimuovi passano da un thread di scrittura che raggruppa in
+un'unica transazione (un solo commit) tutte le operazioni arrivate nel
+frattempo.
+"""
+
+import json
+import os
+import queue
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future
+
+from id_bandi import ID_MAX
+
+DB_FILE = os.environ.get("USERS_DB", "users_data.sqlite3")
+JSON_LEGACY = "users_data.json"  # vecchio archivio, importato una volta sola
+
+# Massimo INTEGER di SQLite: oltre, sqlite3 non riesce nemmeno a passare il parametro
+INTERO_MAX = 2 ** 63 - 1
+
+# Commit di gruppo in ritardo o fallito: la scrittura non è avvenuta, per il client è un 503
+ERRORI_SCRITTURA = (TimeoutError, sqlite3.Error)
+
+# Colonne proprie della tabella; gli altri campi dell'utente finiscono in `extra` (JSON)
+COLONNE = ("password", "name", "plan", "created_at", "oauth_provider")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS utenti (
+    email TEXT PRIMARY KEY,
+    password TEXT,
+    name TEXT,
+    plan TEXT NOT NULL DEFAULT 'free',
+    created_at TEXT,
+    oauth_provider TEXT,
+    preferences TEXT NOT NULL DEFAULT '{}',
+    extra TEXT NOT NULL DEFAULT '{}'
+);
+CREATE TABLE IF NOT EXISTS bandi_salvati (
+    email TEXT NOT NULL REFERENCES utenti(email) ON DELETE CASCADE,
+    bando_id INTEGER NOT NULL,
+    salvato_il REAL NOT NULL,
+    PRIMARY KEY (email, bando_id)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS meta (chiave TEXT PRIMARY KEY, valore TEXT);
+CREATE TABLE IF NOT EXISTS token_revocati (
+    digest BLOB PRIMARY KEY,
+    scadenza REAL NOT NULL,
+    revocato_il REAL NOT NULL
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS token_revocati_il ON token_revocati (revocato_il);
+CREATE TABLE IF NOT EXISTS raccomandazioni (
+    email TEXT NOT NULL REFERENCES utenti(email) ON DELETE CASCADE,
+    posizione INTEGER NOT NULL,
+    bando_id INTEGER NOT NULL,
+    punteggio REAL NOT NULL,
+    PRIMARY KEY (email, posizione)
+) WITHOUT ROWID;
+"""
+
+
+def _connetti(percorso):
+    conn = sqlite3.connect(percorso, isolation_level=None, check_same_thread=False, timeout=5)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")  # in WAL resta consistente anche dopo un crash
+    conn.execute("PRAGMA foreign_keys=ON")
+    conn.execute("PRAGMA busy_timeout=5000")
+    return conn
+
+
+class _CommitDiGruppo:
+    """
+    Thread unico di scrittura: prende dalla coda tutte le operazioni in attesa
+    (fino a MASSIMO) e le applica in una transazione. Mentre un commit è in
+    corso le nuove richieste si accumulano e partono insieme nel successivo,
+    quindi sotto carico il costo del commit si divide tra molte operazioni.
+    """
+
+    MASSIMO = 512
+    TIMEOUT = 10
+
+    def __init__(self, percorso):
+        self._percorso = percorso
+        self._coda = queue.Queue()
+        threading.Thread(target=self._ciclo, daemon=True, name="utenti-commit").start()
+
+    def esegui(self, sql, parametri=()):
+        """Accoda una scrittura e aspetta il suo commit; restituisce il rowcount."""
+        fatto = Future()
+        self._coda.put((sql, parametri, fatto))
+        return fatto.result(timeout=self.TIMEOUT)
+
+    def _ciclo(self):
+        conn = _connetti(self._percorso)
+        while True:
+            gruppo = [self._coda.get()]
+            while len(gruppo) < self.MASSIMO:
+                try:
+                    gruppo.append(self._coda.get_nowait())
+                except queue.Empty:
+                    break
+            esiti = []
+            try:
+                conn.execute("BEGIN IMMEDIATE")
+                for sql, parametri, fatto in gruppo:
+                    try:
+                        esiti.append((fatto, conn.execute(sql, parametri).rowcount, None))
+                    except sqlite3.Error as e:  # fallisce solo l'istruzione, non il gruppo
+                        esiti.append((fatto, None, e))
+                conn.execute("COMMIT")
+            except sqlite3.Error as e:
+                if conn.in_transaction:
+                    conn.execute("ROLLBACK")
+                for _, _, fatto in gruppo:
+                    fatto.set_exception(e)
+                continue
+            for fatto, righe, errore in esiti:
+                if errore is None:
+                    fatto.set_result(righe)
+                else:
+                    fatto.set_exception(errore)
+
+
+class ArchivioUtenti:
+    """Accesso agli utenti per email; i dict restituiti hanno la stessa forma del vecchio users_db."""
+
+    def __init__(self, percorso=DB_FILE, json_legacy=JSON_LEGACY):
+        self.percorso = percorso
+        self._locale = threading.local()
+        with self._conn() as conn:
+            conn.executescript(SCHEMA)
+        self._scrittore = _CommitDiGruppo(percorso)
+        if json_legacy:
+            self.importa_json(json_legacy)
+
+    def _conn(self):
+        """Una connessione per thread (le letture non si bloccano a vicenda in WAL)."""
+        conn = getattr(self._locale, "conn", None)
+        if conn is None:
+            conn = self._locale.conn = _connetti(self.percorso)
+        return conn
+
+    # ---------- Lettura ----------
+    def get(self, email, con_salvati=True):
+        """
+        Utente con i suoi bandi salvati, None se non esiste. Con con_salvati=False
+        (es. a ogni richiesta autenticata) si legge solo la riga dell'utente.
+        """
+        if not email:
+            return None
+        conn = self._conn()
+        riga = conn.execute("SELECT * FROM utenti WHERE email = ?", (email,)).fetchone()
+        if riga is None:
+            return None
+        utente = json.loads(riga["extra"])
+        utente.update({k: riga[k] for k in COLONNE if riga[k] is not None})
+        utente["email"] = riga["email"]
+        utente["preferences"] = json.loads(riga["preferences"])
+        if con_salvati:
+            utente["saved_bandi"] = self.bandi_salvati(email)
+        return utente
+
+    def esiste(self, email):
+        return self._conn().execute("SELECT 1 FROM utenti WHERE email = ?", (email,)).fetchone() is not None
+
+    def bandi_salvati(self, email):
+        righe = self._conn().execute(
+            "SELECT bando_id FROM bandi_salvati WHERE email = ? ORDER BY salvato_il", (email,))
+        return [r[0] for r in righe]
+
+    # ---------- Scrittura ----------
+    def crea(self, email, dati):
+        """Inserisce un nuovo utente; False se l'email è già registrata."""
+        dati = dict(dati)
+        salvati = dati.pop("saved_bandi", None) or []
+        preferenze = dati.pop("preferences", None) or {}
+        dati.pop("email", None)
+        dati["plan"] = dati.get("plan") or "free"  # con OR IGNORE un NOT NULL violato scarterebbe la riga in silenzio
+        valori = [dati.pop(k, None) for k in COLONNE]
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            inserito = conn.execute(
+                f"INSERT OR IGNORE INTO utenti (email, {', '.join(COLONNE)}, preferences, extra) "
+                f"VALUES (?, {', '.join('?' * len(COLONNE))}, ?, ?)",
+                (email, *valori, json.dumps(preferenze), json.dumps(dati)),
+            ).rowcount == 1
+            if inserito:
+                ora = time.time()
+                conn.executemany(
+                    "INSERT OR IGNORE INTO bandi_salvati (email, bando_id, salvato_il) VALUES (?, ?, ?)",
+                    [(email, bando_id, ora + i * 1e-6) for i, bando_id in enumerate(salvati)])
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return inserito
+
+    def aggiorna(self, email, **campi):
+        """Aggiorna solo i campi indicati (name, plan, preferences, ...) della riga dell'utente."""
+        assegnazioni, valori, extra = [], [], {}
+        for nome, valore in campi.items():
+            if nome == "preferences":
+                assegnazioni.append("preferences = ?")
+                valori.append(json.dumps(valore or {}))
+            elif nome in COLONNE:
+                assegnazioni.append(f"{nome} = ?")
+                valori.append(valore)
+            else:
+                extra[nome] = valore
+        if extra:
+            assegnazioni.append("extra = json_patch(extra, ?)")
+            valori.append(json.dumps(extra))
+        if not assegnazioni:
+            return False
+        conn = self._conn()
+        cur = conn.execute(
+            f"UPDATE utenti SET {', '.join(assegnazioni)} WHERE email = ?", (*valori, email))
+        if "preferences" in campi:  # calcolate con le preferenze vecchie
+            conn.execute("DELETE FROM raccomandazioni WHERE email = ?", (email,))
+        return cur.rowcount == 1
+
+    def salva_bando(self, email, bando_id):
+        """Aggiunge un bando ai salvati (idempotente); True se non c'era."""
+        return self._scrittore.esegui(
+            "INSERT OR IGNORE INTO bandi_salvati (email, bando_id, salvato_il) VALUES (?, ?, ?)",
+            (email, bando_id, time.time())) == 1
+
+    def rimuovi_bando(self, email, bando_id):
+        """Toglie un bando dai salvati; True se c'era."""
+        return self._scrittore.esegui(
+            "DELETE FROM bandi_salvati WHERE email = ? AND bando_id = ?", (email, bando_id)) == 1
+
+    # ---------- Token revocati (logout) ----------
+    def revoca_token(self, digest, scadenza):
+        """Registra il digest di un token revocato fino alla sua scadenza naturale."""
+        self._conn().execute(
+            "INSERT OR REPLACE INTO token_revocati (digest, scadenza, revocato_il) VALUES (?, ?, ?)",
+            (digest, scadenza, time.time()))
+
+    def token_revocati(self, dal=0.0):
+        """(digest, scadenza, revocato_il) dei token revocati dopo `dal` e non ancora scaduti."""
+        return self._conn().execute(
+            "SELECT digest, scadenza, revocato_il FROM token_revocati WHERE revocato_il > ? AND scadenza > ?",
+            (dal, time.time())).fetchall()
+
+    def pulisci_token_revocati(self):
+        """Un token scaduto viene già rifiutato da jwt: la sua revoca non serve più."""
+        return self._conn().execute("DELETE FROM token_revocati WHERE scadenza <= ?", (time.time(),)).rowcount
+
+    # ---------- Raccomandazioni (preferenze_bandi) ----------
+    def preferenze_utenti(self):
+        """(email, preferences) di tutti gli utenti, per il batch dopo il refresh."""
+        righe = self._conn().execute("SELECT email, preferences FROM utenti")
+        return [(r["email"], json.loads(r["preferences"])) for r in righe]
+
+    def salva_raccomandazioni(self, risultati):
+        """Sostituisce in una transazione le raccomandazioni di tutti gli utenti ({email: [(bando_id, punteggio)]})."""
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute("DELETE FROM raccomandazioni")
+            conn.executemany(
+                "INSERT OR IGNORE INTO raccomandazioni (email, posizione, bando_id, punteggio) VALUES (?, ?, ?, ?)",
+                ((email, i, bando_id, punteggio)
+                 for email, classifica in risultati.items()
+                 for i, (bando_id, punteggio) in enumerate(classifica)))
+            conn.execute("INSERT OR REPLACE INTO meta (chiave, valore) VALUES ('raccomandazioni_il', ?)",
+                         (repr(time.time()),))
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    def raccomandazioni(self, email):
+        """(calcolate_il, [(bando_id, punteggio)]) dall'ultimo batch; calcolate_il None se non è mai girato."""
+        conn = self._conn()
+        riga = conn.execute("SELECT valore FROM meta WHERE chiave = 'raccomandazioni_il'").fetchone()
+        righe = conn.execute(
+            "SELECT bando_id, punteggio FROM raccomandazioni WHERE email = ? ORDER BY posizione", (email,))
+        return (float(riga[0]) if riga else None), [(r[0], r[1]) for r in righe]
+
+    # ---------- Migrazione ----------
+    def importa_json(self, percorso):
+        """
+        Importa una volta sola il vecchio users_data.json ({email: utente}); gli
+        utenti già presenti non vengono toccati. Il file resta dov'è.
+        I bandi salvati con i vecchi id (abs(hash()), quasi sempre oltre ID_MAX)
+        non corrispondono a nessun id del catalogo attuale e non vengono importati.
+        """
+        conn = self._conn()
+        if conn.execute("SELECT 1 FROM meta WHERE chiave = 'importato_json'").fetchone():
+            return 0
+        if not os.path.exists(percorso):
+            return 0
+        try:
+            with open(percorso, "r") as f:
+                utenti = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"⚠️ {percorso} non importato: {e}")
+            return 0
+        scartati = 0
+        for dati in utenti.values():
+            salvati = dati.get("saved_bandi") or []
+            validi = [i for i in salvati if type(i) is int and 0 <= i <= ID_MAX]
+            scartati += len(salvati) - len(validi)
+            dati["saved_bandi"] = validi
+        if scartati:
+            print(f"⚠️ {scartati} bandi salvati con id del vecchio formato non importati")
+        importati = sum(self.crea(email, dati) for email, dati in utenti.items())
+        conn.execute("INSERT OR REPLACE INTO meta (chiave, valore) VALUES ('importato_json', ?)",
+                     (f"{percorso}: {importati} utenti",))
+        print(f"📦 Importati {importati} utenti da {percorso} in {self.percorso}")
+        return importati
@@ -3,12 +3,16 @@
 
 from flask import Flask, request, jsonify, session, redirect
 from flask_cors import CORS
-from werkzeug.security import generate_password_hash, check_password_hash
 import jwt
 import datetime
 import os
 from functools import wraps
-import json
+import catalogo
+from archivio_utenti import ERRORI_SCRITTURA, INTERO_MAX, ArchivioUtenti
+from preferenze_bandi import LIMITE, raccomanda
+from id_bandi import ID_MAX
+from hash_password import ERRORI_POOL, LIMITE_ACCOUNT, LIMITE_IP, LimiteTentativi, PoolHash
+from verifica_token import TokenRevocato, VerificaToken
 
 # OAuth libraries
 from authlib.integrations.flask_client import OAuth
@@ -38,33 +42,34 @@ apple = oauth.register(
     client_kwargs={'scope': 'name email'}
 )
 
-# Database simulato (in produzione usa PostgreSQL/MongoDB)
-users_db = {}  # {email: {password, name, plan, created_at, ...}}
+# Utenti su SQLite (WAL): scritture puntuali per utente, condivise tra i worker.
+# Al primo avvio importa il vecchio users_data.json
+utenti = ArchivioUtenti()
 sessions_db = {}  # {token: {email, expires}}
 
-# File per persistenza
-USERS_FILE = 'users_data.json'
+# Claim dei JWT già verificati in cache; le revoche (logout) sono condivise via archivio
+verifica_token = VerificaToken(app.secret_key, archivio=utenti)
 
-def load_users():
-    """Carica utenti da file"""
-    global users_db
-    try:
-        if os.path.exists(USERS_FILE):
-            with open(USERS_FILE, 'r') as f:
-                users_db = json.load(f)
-    except:
-        users_db = {}
-
-def save_users():
-    """Salva utenti su file"""
-    try:
-        with open(USERS_FILE, 'w') as f:
-            json.dump(users_db, f, indent=2)
-    except Exception as e:
-        print(f"Errore salvataggio utenti: {e}")
+# Stesso catalogo ricaricato a caldo di api_server: i bandi salvati si risolvono per id
+try:
+    catalogo.ricarica()
+except Exception as e:
+    print(f"⚠️ Errore caricamento catalogo: {e}")
+catalogo.avvia_osservatore()
+
+# Hash delle password in un pool di processi limitato, con limiti di tentativi davanti
+pool_hash = PoolHash()
+tentativi = LimiteTentativi()
+
+def troppi_tentativi(attesa):
+    risposta = jsonify({'error': 'Troppi tentativi, riprova più tardi'})
+    risposta.headers['Retry-After'] = str(int(attesa) + 1)
+    return risposta, 429
 
-# Carica utenti all'avvio
-load_users()
+def server_occupato():
+    risposta = jsonify({'error': 'Server occupato, riprova tra poco'})
+    risposta.headers['Retry-After'] = '1'
+    return risposta, 503
 
 def token_required(f):
     """Decorator per proteggere endpoint che richiedono autenticazione"""
@@ -77,15 +82,18 @@ def token_required(f):
         
         try:
             token = token.replace('Bearer ', '')
-            data = jwt.decode(token, app.secret_key, algorithms=['HS256'])
-            current_user = users_db.get(data['email'])
+            data = verifica_token.verifica(token)
+            # Solo la riga dell'utente: i bandi salvati li legge chi li usa
+            current_user = utenti.get(data['email'], con_salvati=False)
             
             if not current_user:
                 return jsonify({'error': 'Utente non trovato'}), 401
                 
         except jwt.ExpiredSignatureError:
             return jsonify({'error': 'Token scaduto'}), 401
-        except:
+        except TokenRevocato:
+            return jsonify({'error': 'Token revocato'}), 401
+        except (jwt.InvalidTokenError, KeyError):
             return jsonify({'error': 'Token invalido'}), 401
         
         return f(current_user, *args, **kwargs)
@@ -106,20 +114,27 @@ def register():
     if not email or not password or not name:
         return jsonify({'error': 'Campi mancanti'}), 400
     
-    if email in users_db:
+    if utenti.esiste(email):
         return jsonify({'error': 'Email già registrata'}), 400
     
-    # Crea nuovo utente
-    users_db[email] = {
-        'password': generate_password_hash(password),
+    attesa = tentativi.consenti((f'ip:{request.remote_addr}', LIMITE_IP))
+    if attesa:
+        return troppi_tentativi(attesa)
+    try:
+        hash_password = pool_hash.genera(password)
+    except ERRORI_POOL:
+        return server_occupato()
+    
+    # Crea nuovo utente (l'inserimento fallisce se un'altra richiesta l'ha appena registrato)
+    creato = utenti.crea(email, {
+        'password': hash_password,
         'name': name,
         'plan': 'free',  # free, pro, business
         'created_at': datetime.datetime.now().isoformat(),
-        'preferences': {},
-        'saved_bandi': []
-    }
-    
-    save_users()
+        'preferences': {}
+    })
+    if not creato:
+        return jsonify({'error': 'Email già registrata'}), 400
     
     # Genera token
     token = jwt.encode({
@@ -150,10 +165,28 @@ def login():
     if not email or not password:
         return jsonify({'error': 'Email e password richiesti'}), 400
     
-    user = users_db.get(email)
+    account = f'account:{email.lower()}'
+    attesa = tentativi.consenti((account, LIMITE_ACCOUNT), (f'ip:{request.remote_addr}', LIMITE_IP))
+    if attesa:
+        return troppi_tentativi(attesa)
     
-    if not user or not check_password_hash(user['password'], password):
+    user = utenti.get(email, con_salvati=False)
+    hash_salvato = (user or {}).get('password', '')
+    try:
+        valida = pool_hash.verifica(hash_salvato, password)
+    except ERRORI_POOL:
+        return server_occupato()
+    
+    if not valida:
         return jsonify({'error': 'Credenziali non valide'}), 401
+    tentativi.azzera(account)
+    
+    if pool_hash.da_rifare(hash_salvato):
+        # Costo cambiato (PASSWORD_HASH_METODO): si rifà l'hash ora che si conosce la password
+        try:
+            utenti.aggiorna(email, password=pool_hash.genera(password))
+        except ERRORI_POOL:
+            pass  # ci si riprova al prossimo login
     
     # Genera token
     token = jwt.encode({
@@ -189,17 +222,14 @@ def google_callback():
         email = user_info['email']
         name = user_info.get('name', email.split('@')[0])
         
-        # Crea o aggiorna utente
-        if email not in users_db:
-            users_db[email] = {
-                'name': name,
-                'plan': 'free',
-                'created_at': datetime.datetime.now().isoformat(),
-                'oauth_provider': 'google',
-                'preferences': {},
-                'saved_bandi': []
-            }
-            save_users()
+        # Crea l'utente al primo accesso (no-op se esiste già)
+        utenti.crea(email, {
+            'name': name,
+            'plan': 'free',
+            'created_at': datetime.datetime.now().isoformat(),
+            'oauth_provider': 'google',
+            'preferences': {}
+        })
         
         # Genera token
         jwt_token = jwt.encode({
@@ -231,17 +261,14 @@ def apple_callback():
         email = user_info['email']
         name = user_info.get('name', email.split('@')[0])
         
-        # Crea o aggiorna utente
-        if email not in users_db:
-            users_db[email] = {
-                'name': name,
-                'plan': 'free',
-                'created_at': datetime.datetime.now().isoformat(),
-                'oauth_provider': 'apple',
-                'preferences': {},
-                'saved_bandi': []
-            }
-            save_users()
+        # Crea l'utente al primo accesso (no-op se esiste già)
+        utenti.crea(email, {
+            'name': name,
+            'plan': 'free',
+            'created_at': datetime.datetime.now().isoformat(),
+            'oauth_provider': 'apple',
+            'preferences': {}
+        })
         
         # Genera token
         jwt_token = jwt.encode({
@@ -268,7 +295,7 @@ def get_profile(current_user):
             'plan': current_user.get('plan', 'free'),
             'created_at': current_user.get('created_at'),
             'preferences': current_user.get('preferences', {}),
-            'saved_bandi': current_user.get('saved_bandi', [])
+            'saved_bandi': utenti.bandi_salvati(current_user['email'])
         }
     })
 
@@ -279,13 +306,13 @@ def update_profile(current_user):
     data = request.get_json()
     
     # Aggiorna campi permessi
-    if 'name' in data:
-        current_user['name'] = data['name']
-    if 'preferences' in data:
-        current_user['preferences'] = data['preferences']
-    
-    save_users()
+    campi = {k: data[k] for k in ('name', 'preferences') if k in data}
+    if campi:
+        utenti.aggiorna(current_user['email'], **campi)
+        current_user.update(campi)
     
+    current_user.pop('password', None)  # l'hash non esce mai dal server
+    current_user['saved_bandi'] = utenti.bandi_salvati(current_user['email'])
     return jsonify({'success': True, 'user': current_user})
 
 # ========== BANDI SALVATI ==========
@@ -294,18 +321,19 @@ def update_profile(current_user):
 @token_required
 def save_bando(current_user):
     """Salva un bando nei preferiti"""
-    data = request.get_json()
+    data = request.get_json(silent=True) or {}
     bando_id = data.get('bando_id')
     
-    if not bando_id:
+    if bando_id is None:
         return jsonify({'error': 'ID bando mancante'}), 400
+    # Solo interi JSON nel range degli id (niente stringhe, float o true/false)
+    if type(bando_id) is not int or not 0 <= bando_id <= ID_MAX:
+        return jsonify({'error': 'ID bando non valido'}), 400
     
-    if 'saved_bandi' not in current_user:
-        current_user['saved_bandi'] = []
-    
-    if bando_id not in current_user['saved_bandi']:
-        current_user['saved_bandi'].append(bando_id)
-        save_users()
+    try:
+        utenti.salva_bando(current_user['email'], bando_id)
+    except ERRORI_SCRITTURA:
+        return server_occupato()
     
     return jsonify({'success': True})
 
@@ -313,18 +341,87 @@ def save_bando(current_user):
 @token_required
 def remove_saved_bando(current_user, bando_id):
     """Rimuovi un bando dai preferiti"""
-    if 'saved_bandi' in current_user and bando_id in current_user['saved_bandi']:
-        current_user['saved_bandi'].remove(bando_id)
-        save_users()
+    # Non solo fino a ID_MAX: si deve poter togliere qualunque id già salvato (anche i vecchi)
+    if bando_id > INTERO_MAX:
+        return jsonify({'error': 'ID bando non valido'}), 400
+    try:
+        utenti.rimuovi_bando(current_user['email'], bando_id)
+    except ERRORI_SCRITTURA:
+        return server_occupato()
     
     return jsonify({'success': True})
 
+@app.route('/api/user/saved-bandi', methods=['GET'])
+@token_required
+def get_saved_bandi(current_user):
+    """Bandi salvati risolti sul catalogo corrente (stato e scadenza aggiornati), in ordine di salvataggio"""
+    snapshot = catalogo.corrente()
+    bandi, non_disponibili, visti = [], [], set()
+    for bando_id in utenti.bandi_salvati(current_user['email']):
+        bando = snapshot.bando(bando_id)
+        if bando is None:
+            non_disponibili.append(bando_id)  # uscito dal catalogo
+        elif bando.id not in visti:  # due salvati fusi nello stesso bando
+            visti.add(bando.id)
+            bandi.append(bando.a_dict())
+    
+    return jsonify({
+        'success': True,
+        'count': len(bandi),
+        'bandi': bandi,
+        'non_disponibili': non_disponibili,
+        'ultimo_aggiornamento': snapshot.aggiornamento.isoformat() if snapshot.aggiornamento else None
+    })
+
+# ========== RACCOMANDAZIONI ==========
+
+@app.route('/api/user/raccomandazioni', methods=['GET'])
+@token_required
+def get_raccomandazioni(current_user):
+    """Bandi consigliati in base alle preferenze, i più pertinenti prima"""
+    try:
+        limit = int(request.args.get('limit', LIMITE))
+    except ValueError:
+        return jsonify({'error': 'limit non valido'}), 400
+    if limit < 1 or limit > LIMITE:
+        return jsonify({'error': f'limit deve essere tra 1 e {LIMITE}'}), 400
+    
+    # Il batch dopo il refresh le ha già calcolate; se sono di uno snapshot o di un giorno
+    # precedente (o le preferenze sono cambiate) si calcolano ora sugli indici bitmap
+    snapshot = catalogo.corrente()
+    calcolate_il, classifica = utenti.raccomandazioni(current_user['email'])
+    precalcolate = bool(
+        calcolate_il and classifica and snapshot.aggiornamento
+        and calcolate_il >= snapshot.aggiornamento.timestamp()
+        and datetime.date.fromtimestamp(calcolate_il) == datetime.date.today()
+    )
+    if precalcolate:
+        risultati = [(snapshot.bando(bando_id), punteggio) for bando_id, punteggio in classifica]
+        risultati = [(bando, punteggio) for bando, punteggio in risultati if bando is not None]
+    else:
+        risultati = raccomanda(snapshot.preferenze, current_user.get('preferences'), limite=limit)
+    
+    bandi = []
+    for bando, punteggio in risultati[:limit]:
+        dati = bando.a_dict()
+        dati['punteggio'] = punteggio
+        bandi.append(dati)
+    
+    return jsonify({
+        'success': True,
+        'count': len(bandi),
+        'bandi': bandi,
+        'precalcolate': precalcolate
+    })
+
 # ========== LOGOUT ==========
 
 @app.route('/api/auth/logout', methods=['POST'])
 def logout():
-    """Logout utente"""
-    # Nel caso di JWT, il logout è gestito lato client eliminando il token
+    """Logout utente: il token viene revocato lato server (il client lo elimina comunque)"""
+    token = (request.headers.get('Authorization') or '').replace('Bearer ', '')
+    if token:
+        verifica_token.revoca(token)
     return jsonify({'success': True})
 
 if __name__ == '__main__':
@@ -336,6 +433,8 @@ if __name__ == '__main__':
     print("   GET  /api/auth/apple")
     print("   GET  /api/user/profile")
     print("   PUT  /api/user/profile")
+    print("   GET  /api/user/saved-bandi")
     print("   POST /api/user/saved-bandi")
+    print("   GET  /api/user/raccomandazioni")
     
     app.run(host='0.0.0.0', port=5001, debug=False)
@@ -0,0 +1,53 @@
+"""
+Micro-benchmark dell'estrazione card di InvitaliaScraper su pagine elenco salvate
+
+Misura separatamente la costruzione dell'albero (lxml) e
+l'estrazione (_extract_cards_from_listing + _find_next_page), in ms per pagina.
+
+    python benchmark/estrazione_invitalia.py [--ripetizioni 50]
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from invitalia_scraper import InvitaliaScraper, albero  # noqa: E402
+
+FIXTURE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "invitalia")
+
+
+def misura(ripetizioni):
+    scraper = InvitaliaScraper()
+    # Le pagine elenco registrate per la suite (suite_scraper.py), ognuna col proprio URL
+    with open(os.path.join(FIXTURE, "registro.json"), "r", encoding="utf-8") as f:
+        voci = [v for v in json.load(f) if v.get("status", 200) == 200]
+    pagine = []
+    for voce in voci:
+        with open(os.path.join(FIXTURE, voce["file"]), "r", encoding="utf-8") as f:
+            pagine.append((voce["file"], voce["url"], f.read()))
+    if not pagine:
+        sys.exit(f"Nessuna fixture in {FIXTURE}")
+
+    for nome, url, html in pagine:
+        t_albero = t_estrazione = 0.0
+        for _ in range(ripetizioni):
+            inizio = time.perf_counter()
+            root = albero(html)
+            t_albero += time.perf_counter() - inizio
+
+            inizio = time.perf_counter()
+            cards = scraper._extract_cards_from_listing(root, url)
+            scraper._find_next_page(root, url)
+            t_estrazione += time.perf_counter() - inizio
+        print(f"{nome:40s} {len(cards):3d} card  albero {t_albero / ripetizioni * 1000:7.2f} ms  "
+              f"estrazione {t_estrazione / ripetizioni * 1000:7.2f} ms/pagina")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--ripetizioni", type=int, default=50)
+    misura(parser.parse_args().ripetizioni)
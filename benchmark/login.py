@@ -0,0 +1,121 @@
+"""
+Benchmark dei login di auth_server: login/s e latenze a concorrenza crescente
+
+Per ogni livello di concorrenza N thread fanno POST /api/auth/login (client di
+test Flask, nessuna rete) per `--durata` secondi su account diversi, con il
+limite di tentativi disattivato: si misura il pool di hash. Riporta login/s,
+p50/p99 dei login riusciti e le risposte 503 (coda piena), poi il massimo di
+login/s con p99 entro `--p99`.
+
+    python benchmark/login.py [--concorrenza 1 2 4 8 16] [--durata 5] [--p99 500]
+                              [--worker N] [--coda N] [--metodo scrypt:16384:8:1]
+"""
+
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+PASSWORD = "password-di-prova"
+PAUSA_RIFIUTO = 0.05
+
+
+def percentile(valori, p):
+    valori = sorted(valori)
+    return valori[min(len(valori) - 1, int(len(valori) * p / 100))] if valori else 0.0
+
+
+def livello(app, concorrenza, durata, account):
+    latenze, status = [], {}
+    lock = threading.Lock()
+    fine = time.perf_counter() + durata
+
+    def cliente(n):
+        client = app.test_client()
+        mie, miei = [], {}
+        i = n
+        while time.perf_counter() < fine:
+            email = account[i % len(account)]
+            inizio = time.perf_counter()
+            r = client.post("/api/auth/login", json={"email": email, "password": PASSWORD})
+            miei[r.status_code] = miei.get(r.status_code, 0) + 1
+            if r.status_code == 200:
+                mie.append(time.perf_counter() - inizio)
+            else:
+                time.sleep(PAUSA_RIFIUTO)  # un client vero aspetterebbe Retry-After
+            i += concorrenza
+        with lock:
+            latenze.extend(mie)
+            for codice, n in miei.items():
+                status[codice] = status.get(codice, 0) + n
+
+    inizio = time.perf_counter()
+    thread = [threading.Thread(target=cliente, args=(n,)) for n in range(concorrenza)]
+    for t in thread:
+        t.start()
+    for t in thread:
+        t.join()
+    trascorso = time.perf_counter() - inizio
+    return {
+        "concorrenza": concorrenza,
+        "login_s": status.get(200, 0) / trascorso,
+        "p50_ms": percentile(latenze, 50) * 1000,
+        "p99_ms": percentile(latenze, 99) * 1000,
+        "status": status,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--concorrenza", type=int, nargs="+", default=[1, 2, 4, 8, 16])
+    parser.add_argument("--durata", type=float, default=5.0)
+    parser.add_argument("--p99", type=float, default=500.0, help="obiettivo di p99 in ms")
+    parser.add_argument("--account", type=int, default=64)
+    parser.add_argument("--worker", help="HASH_WORKER")
+    parser.add_argument("--coda", help="HASH_CODA")
+    parser.add_argument("--metodo", help="PASSWORD_HASH_METODO")
+    args = parser.parse_args()
+
+    # La configurazione del pool si legge all'import: va impostata prima
+    for variabile, valore in (("HASH_WORKER", args.worker), ("HASH_CODA", args.coda),
+                              ("PASSWORD_HASH_METODO", args.metodo)):
+        if valore:
+            os.environ[variabile] = valore
+    cartella = tempfile.mkdtemp(prefix="bench_login_")
+    os.environ["USERS_DB"] = os.path.join(cartella, "utenti.sqlite3")
+
+    import auth_server  # noqa: E402
+
+    auth_server.tentativi.consenti = lambda *chiavi_limiti: 0
+    account = [f"utente{i}@example.com" for i in range(args.account)]
+    for email in account:
+        auth_server.utenti.crea(email, {"password": auth_server.pool_hash.genera(PASSWORD), "name": email})
+    pool = auth_server.pool_hash
+    print(f"🔐 {len(account)} account, pool da {pool.worker} processi, metodo {pool.metodo or 'default werkzeug'}")
+
+    risultati = []
+    for concorrenza in args.concorrenza:
+        r = livello(auth_server.app, concorrenza, args.durata, account)
+        risultati.append(r)
+        altri = ", ".join(f"{codice}: {n}" for codice, n in sorted(r["status"].items()) if codice != 200)
+        print(f"  {concorrenza:3d} client  {r['login_s']:8.1f} login/s  p50 {r['p50_ms']:7.1f} ms  "
+              f"p99 {r['p99_ms']:7.1f} ms" + (f"  ({altri})" if altri else ""))
+
+    entro = [r for r in risultati if r["p99_ms"] <= args.p99 and r["login_s"] > 0]
+    if entro:
+        migliore = max(entro, key=lambda r: r["login_s"])
+        print(f"✅ Massimo entro p99 {args.p99:.0f} ms: {migliore['login_s']:.1f} login/s "
+              f"con {migliore['concorrenza']} client")
+    else:
+        print(f"⚠️ Nessun livello con p99 entro {args.p99:.0f} ms")
+    pool.chiudi()
+    shutil.rmtree(cartella, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,360 @@
+"""
+Benchmark offline degli scraper su risposte HTTP registrate
+
+Un server locale riproduce le risposte di benchmark/fixtures/<sorgente>/
+(registro.json + corpi) e il client condiviso riscrive ogni URL verso di lui:
+lo scraper gira senza modifiche, senza rete e senza i rate limit dei siti veri.
+Ogni sorgente è misurata in un processo figlio, così RSS e CPU non includono
+il server: pagine/s, record/s, CPU per pagina (download locale + parsing),
+tempo di parsing per pagina (dai cronometri di metriche.METRICHE negli
+scraper), picco di memoria allocata (tracemalloc) e RSS di picco.
+
+Ogni esecuzione è aggiunta a benchmark/risultati.jsonl insieme al commit, per
+confrontare le regressioni tra commit:
+
+    python benchmark/suite_scraper.py                       # tutte le sorgenti
+    python benchmark/suite_scraper.py consap invitalia --ripetizioni 5
+    python benchmark/suite_scraper.py --confronta [COMMIT]  # delta rispetto a un altro commit
+    python benchmark/suite_scraper.py --registra mimit      # (online) rigenera le fixture dal sito vero
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import resource
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+RADICE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RADICE)
+
+FIXTURE = os.path.join(RADICE, "benchmark", "fixtures")
+RISULTATI = os.path.join(RADICE, "benchmark", "risultati.jsonl")
+
+# Sorgente -> (modulo, classe, etichetta delle metriche di parsing); ogni classe espone iter_bandi()
+SCRAPER = {
+    "inpa": ("inpa_scraper", "InPAScraper", "InPA"),
+    "invitalia": ("invitalia_scraper", "InvitaliaScraper", "Invitalia"),
+    "mimit": ("mimit_scraper", "MIMITScraper", "MIMIT"),
+    "consap": ("consap_scraper", "ConsapScraper", "Consap"),
+    "gazzetta": ("gazzetta_scraper", "GazzettaScraper", "Gazzetta"),
+}
+
+# Metriche confrontate tra commit: nome -> True se "più alto è meglio"
+METRICHE = {
+    "pagine_s": True,
+    "record_s": True,
+    "cpu_ms_pagina": False,
+    "parsing_ms_pagina": False,
+    "picco_alloc_kb": False,
+    "rss_picco_mb": False,
+}
+
+
+def chiave(metodo, url):
+    """Chiave di una risposta registrata: metodo, host, path e query ordinata (schema e frammento ignorati)."""
+    parti = urlsplit(url)
+    query = urlencode(sorted(parse_qsl(parti.query, keep_blank_values=True)))
+    return f"{metodo.upper()} {parti.netloc}{parti.path or '/'}?{query}"
+
+
+def riscrivi_url(url, locale):
+    """https://host/path?q -> http://<locale>/host/path?q (l'host originale resta nel path)."""
+    parti = urlsplit(url)
+    return urlunsplit(("http", locale, f"/{parti.netloc}{parti.path}", parti.query, ""))
+
+
+# ---------- Server che riproduce le risposte ----------
+def carica_registro(sorgente):
+    """Legge registro.json e i corpi di una sorgente: {chiave: (status, content-type, corpo)}."""
+    cartella = os.path.join(FIXTURE, sorgente)
+    with open(os.path.join(cartella, "registro.json"), "r", encoding="utf-8") as f:
+        voci = json.load(f)
+    risposte = {}
+    for voce in voci:
+        with open(os.path.join(cartella, voce["file"]), "rb") as f:
+            corpo = f.read()
+        risposte[chiave(voce["metodo"], voce["url"])] = (voce.get("status", 200), voce.get("tipo", "text/html"), corpo)
+    return risposte
+
+
+class _Riproduttore(BaseHTTPRequestHandler):
+    """Le richieste arrivano come /<host originale>/<path>?query (vedi riscrivi_url)."""
+
+    protocol_version = "HTTP/1.1"  # keep-alive, come verso i siti veri
+    risposte = {}
+
+    def _rispondi(self):
+        lunghezza = int(self.headers.get("Content-Length") or 0)
+        if lunghezza:
+            self.rfile.read(lunghezza)  # il corpo (es. il {} delle POST InPA) non entra nella chiave
+        registrata = self.risposte.get(chiave(self.command, "http:/" + self.path))
+        status, tipo, corpo = registrata or (404, "text/plain", b"non registrata")
+        self.send_response(status)
+        if registrata is None:
+            self.send_header("X-Non-Registrata", "1")
+        self.send_header("Content-Type", tipo)
+        self.send_header("Content-Length", str(len(corpo)))
+        self.end_headers()
+        self.wfile.write(corpo)
+
+    do_GET = do_POST = _rispondi
+
+    def log_message(self, *args):
+        pass
+
+
+def avvia_server(risposte):
+    """Server in un thread su una porta libera; restituisce il server (porta in server_address)."""
+    handler = type("Riproduttore", (_Riproduttore,), {"risposte": risposte})
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+# ---------- Misura (processo figlio) ----------
+def _prepara_client(porta=None):
+    """Client condiviso con conteggio delle richieste e, se c'è una porta, riscrittura verso il server locale."""
+    from http_client import client_condiviso
+
+    client = client_condiviso()
+    conteggio = {"richieste": 0, "byte": 0, "non_registrate": 0}
+    lock = threading.Lock()
+    originale = client.request
+
+    def request(method, url, **kwargs):
+        r = originale(method, url, **kwargs)
+        with lock:
+            conteggio["richieste"] += 1
+            conteggio["byte"] += len(r.content)
+            conteggio["non_registrate"] += "X-Non-Registrata" in r.headers
+        return r
+
+    client.request = request
+    if porta is not None:
+        locale = f"127.0.0.1:{porta}"
+        client.imposta_limite(locale, rate=1e6, burst=10**6)  # qui si misura lo scraper, non la cortesia
+        client.imposta_riscrittura(lambda url: riscrivi_url(url, locale))
+    return client, conteggio
+
+
+def _esegui(sorgente):
+    """Un passaggio completo dello scraper, con cache HTTP vuota (niente 304 né estratti riusati)."""
+    import cache_http
+
+    modulo, classe, _ = SCRAPER[sorgente]
+    scraper = getattr(__import__(modulo), classe)()
+    cartella = tempfile.mkdtemp(prefix="bench_cache_")
+    cache_http.CARTELLA_DEFAULT = cartella
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            return sum(1 for _ in scraper.iter_bandi())
+    finally:
+        shutil.rmtree(cartella, ignore_errors=True)
+
+
+def misura(sorgente, porta, ripetizioni, con_tracemalloc=True):
+    """Metriche di una sorgente (da chiamare nel processo figlio)."""
+    client, conteggio = _prepara_client(porta)
+    _esegui(sorgente)  # riscaldamento: import, connessioni keep-alive, regex compilate
+
+    from metriche import METRICHE
+
+    METRICHE.azzera()
+    passaggi = []
+    for _ in range(ripetizioni):
+        conteggio.update(richieste=0, byte=0, non_registrate=0)
+        cpu, inizio = time.process_time(), time.perf_counter()
+        record = _esegui(sorgente)
+        passaggi.append((time.perf_counter() - inizio, time.process_time() - cpu, record, dict(conteggio)))
+    rss_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss  # KB su Linux
+    parsing = METRICHE.riepilogo()["sorgenti"].get(SCRAPER[sorgente][2], {}).get("secondi_parsing", 0.0)
+
+    secondi = statistics.median(p[0] for p in passaggi)
+    cpu = statistics.median(p[1] for p in passaggi)
+    record, pagine = passaggi[-1][2], passaggi[-1][3]["richieste"]
+    risultato = {
+        "pagine": pagine,
+        "record": record,
+        "kb_scaricati": round(passaggi[-1][3]["byte"] / 1024, 1),
+        "non_registrate": passaggi[-1][3]["non_registrate"],
+        "secondi": round(secondi, 4),
+        "pagine_s": round(pagine / secondi, 1) if secondi else None,
+        "record_s": round(record / secondi, 1) if secondi else None,
+        "cpu_ms_pagina": round(cpu / pagine * 1000, 3) if pagine else None,
+        "parsing_ms_pagina": round(parsing / ripetizioni / pagine * 1000, 3) if pagine else None,
+        "rss_picco_mb": round(rss_kb / 1024, 1),
+    }
+
+    if con_tracemalloc:
+        # Passaggio separato: tracemalloc rallenta parecchio e falserebbe i tempi
+        tracemalloc.start()
+        _esegui(sorgente)
+        residuo, picco = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        risultato["picco_alloc_kb"] = round(picco / 1024, 1)
+        risultato["residuo_alloc_kb"] = round(residuo / 1024, 1)
+    client.close()
+    return risultato
+
+
+def misura_in_figlio(sorgente, porta, ripetizioni, con_tracemalloc):
+    comando = [sys.executable, os.path.abspath(__file__), "--figlio", sorgente,
+               "--porta", str(porta), "--ripetizioni", str(ripetizioni)]
+    if not con_tracemalloc:
+        comando.append("--senza-tracemalloc")
+    esito = subprocess.run(comando, capture_output=True, text=True, cwd=RADICE)
+    if esito.returncode != 0:
+        raise RuntimeError(esito.stderr.strip().splitlines()[-1] if esito.stderr.strip() else f"uscita {esito.returncode}")
+    return json.loads(esito.stdout.strip().splitlines()[-1])
+
+
+# ---------- Registrazione (online) ----------
+def registra(sorgente):
+    """Esegue lo scraper sul sito vero e salva ogni risposta come fixture."""
+    client, _ = _prepara_client()
+    cartella = os.path.join(FIXTURE, sorgente)
+    os.makedirs(cartella, exist_ok=True)
+    voci, lock = {}, threading.Lock()
+    originale = client.request
+
+    def request(method, url, **kwargs):
+        r = originale(method, url, **kwargs)
+        k = chiave(method, r.request.url)
+        estensione = ".json" if "json" in r.headers.get("Content-Type", "") else ".html"
+        with lock:
+            if k not in voci:
+                nome = f"{len(voci):03d}{estensione}"
+                with open(os.path.join(cartella, nome), "wb") as f:
+                    f.write(r.content)
+                voci[k] = {"metodo": method.upper(), "url": r.request.url, "status": r.status_code,
+                           "tipo": r.headers.get("Content-Type", "text/html"), "file": nome}
+        return r
+
+    client.request = request
+    record = _esegui(sorgente)
+    with open(os.path.join(cartella, "registro.json"), "w", encoding="utf-8") as f:
+        json.dump(list(voci.values()), f, ensure_ascii=False, indent=1)
+        f.write("\n")
+    print(f"📼 {sorgente}: {len(voci)} risposte registrate in {cartella} ({record} record)")
+
+
+# ---------- Storico e confronto ----------
+def commit_corrente():
+    try:
+        esito = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, cwd=RADICE)
+        commit = esito.stdout.strip() or "sconosciuto"
+        sporco = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"],
+                                capture_output=True, text=True, cwd=RADICE).stdout.strip()
+        return commit + ("-modificato" if sporco else "")
+    except OSError:
+        return "sconosciuto"
+
+
+def leggi_storico():
+    if not os.path.exists(RISULTATI):
+        return []
+    with open(RISULTATI, "r", encoding="utf-8") as f:
+        return [json.loads(riga) for riga in f if riga.strip()]
+
+
+def confronta(run, candidati):
+    """Delta di ogni sorgente rispetto al run più recente tra i candidati che l'ha misurata."""
+    for sorgente, metriche in run["sorgenti"].items():
+        riferimento = next((r for r in reversed(candidati) if sorgente in r["sorgenti"]), None)
+        if riferimento is None:
+            print(f"   {sorgente:10s} nessun run di riferimento")
+            continue
+        prima = riferimento["sorgenti"][sorgente]
+        delta = []
+        for nome, meglio_alto in METRICHE.items():
+            a, b = prima.get(nome), metriche.get(nome)
+            if not a or b is None:
+                continue
+            variazione = (b - a) / a * 100
+            peggiora = variazione < -5 if meglio_alto else variazione > 5
+            delta.append(f"{nome} {variazione:+.1f}%{' ⚠️' if peggiora else ''}")
+        print(f"   {sorgente:10s} vs {riferimento['commit']}: " + "  ".join(delta))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("sorgenti", nargs="*", metavar="SORGENTE",
+                        help=f"sorgenti da misurare tra {', '.join(SCRAPER)} (default: tutte)")
+    parser.add_argument("--ripetizioni", type=int, default=3)
+    parser.add_argument("--senza-tracemalloc", action="store_true", help="salta il passaggio con tracemalloc")
+    parser.add_argument("--confronta", nargs="?", const="", metavar="COMMIT",
+                        help="confronta con l'ultimo run di COMMIT (default: l'ultimo di un altro commit)")
+    parser.add_argument("--non-salvare", action="store_true", help="non aggiungere il run a risultati.jsonl")
+    parser.add_argument("--registra", choices=list(SCRAPER), help="(online) registra le fixture di una sorgente")
+    parser.add_argument("--figlio", choices=list(SCRAPER), help=argparse.SUPPRESS)
+    parser.add_argument("--porta", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.figlio:
+        print(json.dumps(misura(args.figlio, args.porta, args.ripetizioni, not args.senza_tracemalloc)))
+        return
+    if args.registra:
+        registra(args.registra)
+        return
+
+    sorgenti = args.sorgenti or list(SCRAPER)
+    sconosciute = set(sorgenti) - set(SCRAPER)
+    if sconosciute:
+        parser.error(f"sorgenti sconosciute: {', '.join(sorted(sconosciute))}")
+    run = {
+        "commit": commit_corrente(),
+        "data": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "macchina": platform.node(),
+        "ripetizioni": args.ripetizioni,
+        "sorgenti": {},
+    }
+    print(f"⏱️ Benchmark offline scraper @ {run['commit']} ({args.ripetizioni} ripetizioni)")
+    print(f"   {'sorgente':10s} {'pagine':>6s} {'record':>6s} {'pag/s':>8s} {'rec/s':>9s} "
+          f"{'cpu ms/pag':>10s} {'parse ms/pag':>12s} {'alloc KB':>9s} {'RSS MB':>7s}")
+    for sorgente in sorgenti:
+        server = avvia_server(carica_registro(sorgente))
+        try:
+            m = misura_in_figlio(sorgente, server.server_address[1], args.ripetizioni, not args.senza_tracemalloc)
+        except Exception as e:
+            print(f"   {sorgente:10s} ❌ {e}")
+            continue
+        finally:
+            server.shutdown()
+            server.server_close()
+        run["sorgenti"][sorgente] = m
+        avviso = f"  ⚠️ {m['non_registrate']} richieste senza fixture" if m["non_registrate"] else ""
+        print(f"   {sorgente:10s} {m['pagine']:6d} {m['record']:6d} {m['pagine_s'] or 0:8.1f} {m['record_s'] or 0:9.1f} "
+              f"{m['cpu_ms_pagina'] or 0:10.2f} {m['parsing_ms_pagina'] or 0:12.2f} {m.get('picco_alloc_kb', '-'):>9} {m['rss_picco_mb']:7.1f}{avviso}")
+
+    storico = leggi_storico()
+    if args.confronta is not None:
+        candidati = [r for r in storico if (r["commit"].startswith(args.confronta) if args.confronta
+                                            else r["commit"] != run["commit"])]
+        if candidati:
+            print("\n📊 Confronto")
+            confronta(run, candidati)
+        else:
+            print("\nℹ️ Nessun run di riferimento in " + os.path.relpath(RISULTATI, RADICE))
+    if not args.non_salvare and run["sorgenti"]:
+        with open(RISULTATI, "a", encoding="utf-8") as f:
+            f.write(json.dumps(run, ensure_ascii=False) + "\n")
+        print(f"\n💾 Risultati aggiunti a {os.path.relpath(RISULTATI, RADICE)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""
+Cache HTTP - GET condizionali (ETag/Last-Modified) con riuso dei dati estratti
+
+Per ogni URL salva su disco i validatori, l'hash del corpo e i record già
+estratti dallo scraper. Se il server risponde 304, o il corpo ha lo stesso
+hash dell'ultima volta, lo scraper riusa i record senza rifare il parsing.
+"""
+
+import hashlib
+import json
+import os
+import threading
+
+from http_client import client_condiviso
+
+CARTELLA_DEFAULT = os.getenv("BANDI_HTTP_CACHE", os.path.join("data", "http_cache"))
+
+
+def impronta(obj):
+    """Hash stabile di un oggetto JSON (es. gli override manuali applicati in estrazione)."""
+    return hashlib.sha256(json.dumps(obj, sort_keys=True, ensure_ascii=False).encode("utf-8")).hexdigest()[:16]
+
+
+class PaginaCache:
+    """Esito di un GET passato dalla cache."""
+
+    def __init__(self, url, risposta=None, invariata=False, estratto=None, voce=None):
+        self.url = url
+        self.risposta = risposta    # None se il server ha risposto 304
+        self.invariata = invariata  # True: `estratto` è valido, niente parsing
+        self.estratto = estratto
+        self._voce = voce or {}
+
+
+class CacheHttp:
+    def __init__(self, cartella=None, client=None):
+        self.cartella = cartella or CARTELLA_DEFAULT
+        self.http = client or client_condiviso()
+        os.makedirs(self.cartella, exist_ok=True)
+
+    def _percorso(self, url):
+        return os.path.join(self.cartella, hashlib.sha1(url.encode("utf-8")).hexdigest() + ".json")
+
+    def _carica(self, url):
+        try:
+            with open(self._percorso(url), "r", encoding="utf-8") as f:
+                voce = json.load(f)
+            return voce if voce.get("url") == url else None
+        except (OSError, ValueError):
+            return None
+
+    def _scrivi(self, voce):
+        percorso = self._percorso(voce["url"])
+        tmp = f"{percorso}.{os.getpid()}.{threading.get_ident()}.tmp"  # più worker possono scrivere insieme
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(voce, f, ensure_ascii=False)
+        os.replace(tmp, percorso)
+
+    def get(self, url, versione="", **kwargs):
+        """
+        GET condizionale. `versione` identifica le regole di estrazione (es. impronta
+        degli override): se cambia, i dati estratti in cache non sono più riusabili.
+        """
+        voce = self._carica(url)
+        if voce and voce.get("versione") != versione:
+            voce = None
+
+        headers = dict(kwargs.pop("headers", None) or {})
+        if voce:
+            if voce.get("etag"):
+                headers["If-None-Match"] = voce["etag"]
+            if voce.get("last_modified"):
+                headers["If-Modified-Since"] = voce["last_modified"]
+
+        r = self.http.get(url, headers=headers, **kwargs)
+        if r.status_code == 304 and voce:
+            return PaginaCache(url, invariata=True, estratto=voce["estratto"])
+        r.raise_for_status()
+
+        hash_corpo = hashlib.sha256(r.content).hexdigest()
+        nuova = {
+            "url": url,
+            "versione": versione,
+            "etag": r.headers.get("ETag"),
+            "last_modified": r.headers.get("Last-Modified"),
+            "hash": hash_corpo,
+        }
+        if voce and voce.get("hash") == hash_corpo:
+            # Stesso corpo senza validatori utili: si aggiornano solo gli header
+            nuova["estratto"] = voce["estratto"]
+            if (nuova["etag"], nuova["last_modified"]) != (voce.get("etag"), voce.get("last_modified")):
+                self._scrivi(nuova)
+            return PaginaCache(url, risposta=r, invariata=True, estratto=voce["estratto"])
+        return PaginaCache(url, risposta=r, voce=nuova)
+
+    def salva_estratto(self, pagina, estratto):
+        """Memorizza i dati estratti da una pagina scaricata (e parsata) di nuovo."""
+        if pagina.invariata:
+            return
+        voce = dict(pagina._voce, estratto=estratto)
+        try:
+            self._scrivi(voce)
+        except OSError as e:
+            print(f"[CacheHttp] ⚠️ Impossibile scrivere la cache per {pagina.url}: {e}")
@@ -0,0 +1,229 @@
+"""
+Catalogo - Snapshot dei bandi in memoria con ricarica a caldo
+
+Un Catalogo è immutabile: bandi, indici e payload precompressi vengono
+costruiti fuori dal percorso delle richieste e poi pubblicati con un solo
+assegnamento, quindi una richiesta vede sempre uno snapshot coerente.
+Un thread osservatore controlla il file dello snapshot e ricarica quando cambia.
+
+I corpi precompressi di /api/bandi (la parte più pesante) sono scritti su disco
+una volta per contenuto e letti via mmap: con più worker gunicorn restano
+nella page cache condivisa invece di essere copiati in ogni processo.
+"""
+
+import gzip
+import hashlib
+import json
+import mmap
+import os
+import threading
+import time
+from datetime import datetime
+
+from indice_bandi import IndiceBandi
+from preferenze_bandi import IndicePreferenze
+from ndjson_bandi import leggi_ndjson
+from schema_bandi import Bando
+
+try:
+    import brotli
+except ImportError:  # brotli è opzionale: senza, si servono solo gzip e identity
+    brotli = None
+
+JSON_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "bandi_database_reale.json")
+NDJSON_FILE = os.path.join(os.path.dirname(JSON_FILE), "bandi_database_reale.ndjson")
+CARTELLA_PAYLOAD = os.getenv("BANDI_PAYLOAD_DIR", os.path.join(os.path.dirname(JSON_FILE), ".payload_cache"))
+INTERVALLO_CONTROLLO = float(os.getenv("BANDI_RELOAD_INTERVALLO", 2.0))
+# Un payload vecchio si cancella solo dopo questo tempo: un altro worker può ancora scriverlo o mapparlo
+GRAZIA_PAYLOAD = float(os.getenv("BANDI_PAYLOAD_GRAZIA", 600))
+
+ESTENSIONI = {"identity": ".json", "gzip": ".json.gz", "br": ".json.br"}
+
+
+# ========================
+# 📦 PAYLOAD CONDIVISI
+# ========================
+
+def _mappa_file(percorso):
+    with open(percorso, "rb") as f:
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+def _scrivi_atomico(percorso, dati):
+    tmp = f"{percorso}.{os.getpid()}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(dati)
+    os.replace(tmp, percorso)
+
+
+def _comprimi(corpo):
+    varianti = {"identity": corpo, "gzip": gzip.compress(corpo, compresslevel=9)}
+    if brotli is not None:
+        varianti["br"] = brotli.compress(corpo, quality=11)
+    return varianti
+
+
+def prepara_payload(bandi, aggiornamento, cartella=None):
+    """
+    Serializza e comprime la risposta completa di /api/bandi una volta per ricarica.
+    Con `cartella` le varianti sono file <etag>.json[.gz|.br] mappati in memoria
+    (se un altro worker li ha già scritti vengono solo mappati), altrimenti
+    restano bytes nel processo.
+    """
+    corpo = json.dumps({
+        "success": True,
+        "count": len(bandi),
+        "ultimo_aggiornamento": aggiornamento.isoformat() if aggiornamento else None,
+        "bandi": [bando.a_dict() for bando in bandi]
+    }, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    etag = hashlib.sha256(corpo).hexdigest()[:32]
+    if cartella is None:
+        return {"etag": etag, "varianti": _comprimi(corpo)}
+
+    try:
+        os.makedirs(cartella, exist_ok=True)
+        percorsi = {enc: os.path.join(cartella, etag + est) for enc, est in ESTENSIONI.items()
+                    if enc != "br" or brotli is not None}
+        if not all(os.path.exists(p) for p in percorsi.values()):
+            for encoding, dati in _comprimi(corpo).items():
+                _scrivi_atomico(percorsi[encoding], dati)
+        varianti = {encoding: _mappa_file(p) for encoding, p in percorsi.items()}
+        _pulisci_payload(cartella, etag)
+    except (OSError, ValueError) as e:
+        # Disco non scrivibile (o file vuoto non mappabile): varianti in memoria del processo
+        print(f"⚠️ Payload su disco non disponibili ({e}), uso la memoria")
+        varianti = _comprimi(corpo)
+
+    return {"etag": etag, "varianti": varianti}
+
+
+def _pulisci_payload(cartella, etag_corrente):
+    """
+    Rimuove i payload di snapshot precedenti (le mappe già aperte restano valide).
+    La cartella è condivisa tra i worker e un altro può essere a metà della sua
+    ricarica (anche verso uno snapshot diverso): si toglie solo ciò che è più
+    vecchio del payload corrente e fermo da più di GRAZIA_PAYLOAD, compresi i
+    .tmp lasciati da un processo morto durante la scrittura.
+    """
+    try:
+        corrente = os.stat(os.path.join(cartella, etag_corrente + ESTENSIONI["identity"])).st_mtime
+    except OSError:
+        return
+    limite = min(corrente, time.time() - GRAZIA_PAYLOAD)
+    for nome in os.listdir(cartella):
+        if nome.startswith(etag_corrente):
+            continue
+        percorso = os.path.join(cartella, nome)
+        try:
+            if os.stat(percorso).st_mtime < limite:
+                os.remove(percorso)
+        except OSError:
+            pass
+
+
+# ========================
+# 📚 SNAPSHOT
+# ========================
+
+class Catalogo:
+    """Snapshot immutabile del catalogo: bandi (record Bando), indici e payload precalcolati."""
+
+    def __init__(self, bandi, aggiornamento=None, firma=None, cartella_payload=None):
+        self.bandi = bandi
+        self.aggiornamento = aggiornamento
+        self.firma = firma
+        self.payload = prepara_payload(bandi, aggiornamento, cartella_payload)
+        # I cursor di paginazione portano l'etag: stesso contenuto, stesso ordine
+        self.indice = IndiceBandi(bandi, versione=self.payload["etag"][:12])
+        self.preferenze = IndicePreferenze(bandi)
+        self.per_id = {b.id: b for b in bandi if b.id is not None}
+        # id dei quasi-duplicati assorbiti (duplicati_bandi) -> bando canonico che li ha sostituiti
+        self.assorbiti = {f["id"]: b for b in bandi for f in (b.fonti or ())
+                          if f.get("id") is not None and f["id"] != b.id}
+
+    def bando(self, bando_id):
+        """Bando con questo id, anche se nel frattempo è stato fuso in un altro; None se non c'è più."""
+        return self.per_id.get(bando_id) or self.assorbiti.get(bando_id)
+
+
+def file_snapshot():
+    """Snapshot da servire: l'NDJSON se esiste, altrimenti il JSON classico."""
+    return NDJSON_FILE if os.path.exists(NDJSON_FILE) else JSON_FILE
+
+
+def _leggi_bandi(percorso):
+    """Bandi dello snapshot come Bando (anche gli snapshot col vecchio schema misto)."""
+    if percorso.endswith(".ndjson"):
+        return [Bando.da_dict(b) for b in leggi_ndjson(percorso)]
+    with open(percorso, "r", encoding="utf-8") as f:
+        return [Bando.da_dict(b) for b in json.load(f)]
+
+
+def _firma_file(percorso):
+    st = os.stat(percorso)
+    return (st.st_mtime_ns, st.st_size, st.st_ino)
+
+
+_corrente = Catalogo([])
+_lock_ricarica = threading.Lock()
+
+
+def corrente():
+    """Snapshot attivo (da leggere una volta per richiesta)."""
+    return _corrente
+
+
+def ricarica(percorso=None, forza=False):
+    """Ricostruisce il catalogo se il file è cambiato e lo pubblica atomicamente."""
+    global _corrente
+    with _lock_ricarica:
+        percorso = percorso or file_snapshot()
+        if not os.path.exists(percorso):
+            with open(percorso, "w", encoding="utf-8") as f:
+                json.dump([], f)
+
+        firma = _firma_file(percorso)
+        if not forza and firma == _corrente.firma:
+            return _corrente
+
+        bandi = _leggi_bandi(percorso)
+        aggiornamento = datetime.fromtimestamp(os.path.getmtime(percorso))
+        nuovo = Catalogo(bandi, aggiornamento, firma, cartella_payload=CARTELLA_PAYLOAD)
+        _corrente = nuovo
+        print(f"✅ Caricati {len(bandi)} bandi da {percorso}")
+        return nuovo
+
+
+class OsservatoreSnapshot(threading.Thread):
+    """Thread daemon che controlla mtime/dimensione/inode del file e ricarica al cambio."""
+
+    def __init__(self, percorso=None, intervallo=INTERVALLO_CONTROLLO):
+        super().__init__(daemon=True, name="osservatore-snapshot")
+        self.percorso = percorso
+        self.intervallo = intervallo
+        self._fermato = threading.Event()
+
+    def run(self):
+        while not self._fermato.wait(self.intervallo):
+            try:
+                percorso = self.percorso or file_snapshot()
+                if os.path.exists(percorso) and _firma_file(percorso) != _corrente.firma:
+                    ricarica(percorso)
+            except Exception as e:
+                # File in scrittura o JSON incompleto: si riprova al prossimo giro
+                print(f"⚠️ Ricarica snapshot fallita: {e}")
+
+    def ferma(self):
+        self._fermato.set()
+
+
+_osservatore = None
+
+
+def avvia_osservatore(percorso=None):
+    """Avvia (una sola volta per processo) il thread che ricarica lo snapshot."""
+    global _osservatore
+    if _osservatore is None or not _osservatore.is_alive():
+        _osservatore = OsservatoreSnapshot(percorso)
+        _osservatore.start()
+    return _osservatore
@@ -1,10 +1,12 @@
-import requests
-from bs4 import BeautifulSoup
+from bs4 import BeautifulSoup, SoupStrainer
+from concurrent.futures import ThreadPoolExecutor
 from urllib.parse import urljoin, urlparse
 from datetime import datetime
 import re
-import json
-import os
+import time
+from http_client import client_condiviso
+from cache_http import CacheHttp
+from metriche import METRICHE
 
 
 def normalizza_categoria(categoria):
@@ -24,7 +26,19 @@ def normalizza_categoria(categoria):
     return "generale"
 
 
+# Delle pagine fondo servono solo titolo e corpo centrale: lxml costruisce
+# l'albero di questi sottoalberi e salta header, menu e footer
+SOLO_CONTENUTO = SoupStrainer(
+    lambda nome, attrs: nome in ("h1", "title", "main")
+    or (nome == "div" and "single-content" in (attrs.get("class") or "").split())
+)
+SOLO_LINK = SoupStrainer("a", href=True)
+
+
 class ConsapScraper:
+    MAX_IN_VOLO = 6  # pagine fondo scaricate in parallelo (il rate limit per host resta nel client)
+    TIMEOUT = 10
+
     def __init__(self):
         self.start_urls = [
             "https://www.consap.it/servizi-assicurativi/",
@@ -32,138 +46,154 @@ class ConsapScraper:
             "https://www.consap.it/servizi-finanziari/"
         ]
         self.source = "Consap"
-        self.manual_file = "data/manual_overrides.json"  # ✅ file per descrizioni/modifiche manuali
-
-    def carica_modifiche_manual(self):
-        """Carica eventuali descrizioni brevi o dati aggiornati manualmente."""
-        if os.path.exists(self.manual_file):
+        self.http = client_condiviso()
+
+    def _analizza_fondo(self, url, html):
+        """Estrae il bando da una pagina fondo Consap (None se la pagina va ignorata)."""
+        subsoup = BeautifulSoup(html, "lxml", parse_only=SOLO_CONTENUTO)
+
+        # titolo principale
+        titolo_tag = subsoup.find("h1") or subsoup.find("title")
+        titolo = titolo_tag.get_text(strip=True) if titolo_tag else "Bando Consap"
+        titolo_lower = titolo.lower()
+
+        # ignora pagine inutili
+        if any(x in titolo_lower for x in ["media room", "video", "comunicato", "istituzionale"]):
+            return None
+
+        # corpo testo vero (sezione centrale)
+        content = subsoup.find("div", class_="single-content") or subsoup.find("main") or subsoup
+        testo = content.get_text(" ", strip=True)
+        testo = re.sub(r"(Chi siamo|Media Room|Contatti|Servizi|Certificazioni|Ruolo dei periti|Centro di Informazione|Organismo di Indennizzo)[^.]*", "", testo)
+        testo = re.sub(r"\s+", " ", testo).strip()
+
+        # stato del fondo (aperto/chiuso)
+        testo_lower = testo.lower()
+        if any(kw in testo_lower for kw in [
+            "non è più possibile presentare domanda",
+            "fondo abrogato",
+            "non è più attivo",
+            "chiuso",
+            "cessato"
+        ]):
+            stato = "chiuso"
+        else:
+            stato = "aperto"
+
+        descrizione = testo[:800] if testo else "Nessuna descrizione disponibile."
+
+        # categorizzazione coerente con BandiPerTe
+        if any(x in titolo_lower for x in ["casa", "mutuo", "immobile"]):
+            categoria = "immobili"
+        elif any(x in titolo_lower for x in ["impresa", "azienda", "autotrasporto", "ecologica"]):
+            categoria = "imprese e investimenti"
+        elif any(x in titolo_lower for x in ["bonus", "cultura", "studio", "docente", "vista", "patente"]):
+            categoria = "lavoro e concorsi"
+        else:
+            categoria = "generale"
+
+        categoria = normalizza_categoria(categoria)
+
+        # Descrizione breve, importo e scadenza manuali sono applicati dalla pipeline (pipeline_bandi)
+        return {
+            "titolo": titolo,
+            "descrizione": descrizione,
+            "descrizione_breve": "",  # ✍️ testo editoriale manuale
+            "ente": self.source,
+            "categoria": categoria,
+            "regione": "Nazionale",
+            "stato": stato,
+            "importo": 0,
+            "scadenza": "N/D",
+            "link": url,
+            "fonte": "consap"
+        }
+
+    def _trova_link(self):
+        """1️⃣ Scansione sezioni principali per trovare tutti i fondi"""
+        links = set()
+        for start_url in self.start_urls:
             try:
-                with open(self.manual_file, "r", encoding="utf-8") as f:
-                    return json.load(f)
-            except Exception as e:
-                print(f"[ConsapScraper] ⚠️ Errore lettura file manual_overrides.json: {e}")
-        return {}
+                r = self.http.get(start_url, timeout=self.TIMEOUT)
+                r.raise_for_status()
+                with METRICHE.tempo_parsing("Consap"):
+                    soup = BeautifulSoup(r.text, "lxml", parse_only=SOLO_LINK)
+
+                for a in soup.find_all("a", href=True):
+                    href = a["href"].strip()
+
+                    # normalizza URL
+                    if href.startswith("/"):
+                        full_url = urljoin(start_url, href)
+                    elif href.startswith("https://www.consap.it/"):
+                        full_url = href
+                    else:
+                        continue
 
-    def scrape(self):
-        bandi = []
-        manual_data = self.carica_modifiche_manual()
+                    path = urlparse(full_url).path.strip("/")
 
-        try:
-            print("[ConsapScraper] 🔍 Avvio scraping Consap...")
-
-            links = set()
-
-            # 1️⃣ Scansione sezioni principali per trovare tutti i fondi
-            for start_url in self.start_urls:
-                try:
-                    r = requests.get(start_url, timeout=10)
-                    r.raise_for_status()
-                    soup = BeautifulSoup(r.text, "html.parser")
-
-                    for a in soup.find_all("a", href=True):
-                        href = a["href"].strip()
-
-                        # normalizza URL
-                        if href.startswith("/"):
-                            full_url = urljoin(start_url, href)
-                        elif href.startswith("https://www.consap.it/"):
-                            full_url = href
-                        else:
-                            continue
-
-                        path = urlparse(full_url).path.strip("/")
-
-                        # ignora pagine non rilevanti
-                        if not path or any(x in path for x in [
-                            "chi-siamo", "media-room", "contatti", "privacy", "cookie",
-                            "news", "comunicati", "istituzionale", "video"
-                        ]):
-                            continue
-
-                        # tieni solo pagine con fondi o bonus
-                        if any(path.startswith(prefix) for prefix in [
-                            "fondo-", "bonus-", "indennizzo-", "sostegno-", "sisma-", "garanzia-",
-                            "ricostruzione-", "buono-", "carta-"
-                        ]):
-                            links.add(full_url)
-                except Exception as e:
-                    print(f"[ConsapScraper] ⚠️ Errore su sezione {start_url}: {e}")
-
-            print(f"[ConsapScraper] 🌐 Trovati {len(links)} link potenziali da Consap.")
-
-            # 2️⃣ Analizza ogni fondo trovato
-            for url in sorted(list(links)):
-                try:
-                    sub = requests.get(url, timeout=10)
-                    sub.raise_for_status()
-                    subsoup = BeautifulSoup(sub.text, "html.parser")
-
-                    # titolo principale
-                    titolo_tag = subsoup.find("h1") or subsoup.find("title")
-                    titolo = titolo_tag.get_text(strip=True) if titolo_tag else "Bando Consap"
-                    titolo_lower = titolo.lower()
-
-                    # ignora pagine inutili
-                    if any(x in titolo_lower for x in ["media room", "video", "comunicato", "istituzionale"]):
+                    # ignora pagine non rilevanti
+                    if not path or any(x in path for x in [
+                        "chi-siamo", "media-room", "contatti", "privacy", "cookie",
+                        "news", "comunicati", "istituzionale", "video"
+                    ]):
                         continue
 
-                    # corpo testo vero (sezione centrale)
-                    content = subsoup.find("div", class_="single-content") or subsoup.find("main") or subsoup
-                    testo = content.get_text(" ", strip=True)
-                    testo = re.sub(r"(Chi siamo|Media Room|Contatti|Servizi|Certificazioni|Ruolo dei periti|Centro di Informazione|Organismo di Indennizzo)[^.]*", "", testo)
-                    testo = re.sub(r"\s+", " ", testo).strip()
-
-                    # stato del fondo (aperto/chiuso)
-                    testo_lower = testo.lower()
-                    if any(kw in testo_lower for kw in [
-                        "non è più possibile presentare domanda",
-                        "fondo abrogato",
-                        "non è più attivo",
-                        "chiuso",
-                        "cessato"
+                    # tieni solo pagine con fondi o bonus
+                    if any(path.startswith(prefix) for prefix in [
+                        "fondo-", "bonus-", "indennizzo-", "sostegno-", "sisma-", "garanzia-",
+                        "ricostruzione-", "buono-", "carta-"
                     ]):
-                        stato = "chiuso"
-                    else:
-                        stato = "aperto"
-
-                    descrizione = testo[:800] if testo else "Nessuna descrizione disponibile."
-
-                    # categorizzazione coerente con BandiPerTe
-                    if any(x in titolo_lower for x in ["casa", "mutuo", "immobile"]):
-                        categoria = "immobili"
-                    elif any(x in titolo_lower for x in ["impresa", "azienda", "autotrasporto", "ecologica"]):
-                        categoria = "imprese e investimenti"
-                    elif any(x in titolo_lower for x in ["bonus", "cultura", "studio", "docente", "vista", "patente"]):
-                        categoria = "lavoro e concorsi"
-                    else:
-                        categoria = "generale"
-
-                    categoria = normalizza_categoria(categoria)
-
-                    # 🔄 Applica eventuali modifiche manuali (descrizione breve, importo, scadenza ecc.)
-                    override = manual_data.get(titolo) or manual_data.get(url) or {}
-
-                    bando = {
-                        "titolo": titolo,
-                        "descrizione": descrizione,
-                        "descrizione_breve": override.get("descrizione_breve", ""),  # ✍️ testo editoriale manuale
-                        "ente": self.source,
-                        "categoria": categoria,
-                        "regione": "Nazionale",
-                        "stato": stato,
-                        "importo": override.get("importo", 0),
-                        "scadenza": override.get("scadenza", "N/D"),
-                        "link": url
-                    }
-
-                    bandi.append(bando)
-
-                except Exception as sub_e:
-                    print(f"[ConsapScraper] ⚠️ Errore parsing {url}: {sub_e}")
-
-            print(f"[ConsapScraper] ✅ Raccolti {len(bandi)} bandi Consap validi.")
-            return bandi
+                        links.add(full_url)
+            except Exception as e:
+                print(f"[ConsapScraper] ⚠️ Errore su sezione {start_url}: {e}")
+        return links
 
+    def _scarica_fondo(self, cache, url):
+        """Scarica e analizza una pagina fondo; restituisce (bando, secondi, esito)."""
+        inizio = time.monotonic()
+        try:
+            pagina = cache.get(url, timeout=self.TIMEOUT)
+            if pagina.invariata:
+                bando, esito = pagina.estratto.get("bando"), "cache"
+            else:
+                with METRICHE.tempo_parsing("Consap"):
+                    bando = self._analizza_fondo(url, pagina.risposta.text)
+                esito = "ok"
+                cache.salva_estratto(pagina, {"bando": bando})
+        except Exception as sub_e:
+            bando, esito = None, f"errore: {sub_e}"
+        return bando, time.monotonic() - inizio, esito
+
+    def iter_bandi(self):
+        """
+        Genera i bandi Consap: raccolti i link dalle sezioni, le pagine fondo sono
+        scaricate da MAX_IN_VOLO worker sulla sessione keep-alive condivisa.
+        """
+        print("[ConsapScraper] 🔍 Avvio scraping Consap...")
+        try:
+            links = self._trova_link()
         except Exception as e:
             print(f"[ConsapScraper] ❌ Errore principale: {e}")
-            return []
+            return
+        print(f"[ConsapScraper] 🌐 Trovati {len(links)} link potenziali da Consap.")
+
+        # 2️⃣ Analizza i fondi in parallelo (riusando i dati estratti se la pagina non è cambiata)
+        cache = CacheHttp(client=self.http)
+        trovati, latenze = 0, 0.0
+        inizio = time.monotonic()
+        with ThreadPoolExecutor(max_workers=self.MAX_IN_VOLO) as pool:
+            for url, (bando, secondi, esito) in zip(
+                    sorted(links), pool.map(lambda u: self._scarica_fondo(cache, u), sorted(links))):
+                latenze += secondi
+                print(f"[ConsapScraper] ⏱️ {secondi:.2f}s {esito} {url}")
+                if bando:
+                    trovati += 1
+                    yield bando
+
+        print(f"[ConsapScraper] ✅ Raccolti {trovati} bandi Consap validi in "
+              f"{time.monotonic() - inizio:.2f}s ({latenze:.2f}s di latenza sommata, "
+              f"{self.MAX_IN_VOLO} in parallelo).")
+
+    def scrape(self):
+        return list(self.iter_bandi())
@@ -3,13 +3,50 @@ Database Manager - Gestisce salvataggio e recupero bandi
 """
 
 import psycopg2
-from psycopg2.extras import execute_values
+from psycopg2.extras import Json, execute_values
 from datetime import datetime
+import json
 import os
 from dotenv import load_dotenv
 
 load_dotenv()
 
+# Colonne della tabella bandi e nomi alternativi usati dagli scraper
+COLONNE = {
+    'title': ('title', 'titolo'),
+    'category': ('category', 'categoria'),
+    'region': ('region', 'regione'),
+    'entity': ('entity', 'ente'),
+    'description': ('description', 'descrizione'),
+    'amount': ('amount', 'importo'),
+    'deadline': ('deadline', 'scadenza'),
+    'published': ('published', 'pubblicato'),
+    'url': ('url', 'link'),
+    'source': ('source', 'fonte'),
+}
+LUNGHEZZE_MAX = {'title': 500, 'category': 50, 'region': 100, 'entity': 200, 'source': 50}
+FORMATI_DATA = ('%Y-%m-%d', '%d/%m/%Y', '%d.%m.%Y', '%d-%m-%Y')
+AMOUNT_MAX = 2 ** 63 - 1  # colonna BIGINT: fondi da miliardi di euro non stanno in un INTEGER
+
+# Chiave di upsert: nel vincolo UNIQUE(title, entity, deadline) i NULL non collidono mai, quindi
+# i bandi senza scadenza (Consap: sempre "N/D") o senza ente verrebbero reinseriti a ogni run.
+# L'indice unico sulle espressioni tratta i NULL come uguali; ON CONFLICT deve ripeterle identiche.
+CHIAVE_UPSERT = "title, COALESCE(entity, ''), COALESCE(deadline, 'infinity'::date)"
+
+
+def _data_o_none(valore):
+    """Date testuali -> date; testi come 'N/D' o 'A sportello' -> None"""
+    if not valore:
+        return None
+    testo = str(valore).strip()[:10]
+    for fmt in FORMATI_DATA:
+        try:
+            return datetime.strptime(testo, fmt).date()
+        except ValueError:
+            continue
+    return None
+
+
 class Database:
     def __init__(self):
         self.conn = psycopg2.connect(
@@ -25,7 +62,7 @@ class Database:
         """Crea tabelle se non esistono"""
         cursor = self.conn.cursor()
         
-        cursor.execute("""
+        cursor.execute(f"""
             CREATE TABLE IF NOT EXISTS bandi (
                 id SERIAL PRIMARY KEY,
                 title VARCHAR(500) NOT NULL,
@@ -33,7 +70,7 @@ class Database:
                 region VARCHAR(100),
                 entity VARCHAR(200),
                 description TEXT,
-                amount INTEGER DEFAULT 0,
+                amount BIGINT DEFAULT 0,
                 deadline DATE,
                 published DATE,
                 url TEXT,
@@ -46,49 +83,120 @@ class Database:
             CREATE INDEX IF NOT EXISTS idx_bandi_category ON bandi(category);
             CREATE INDEX IF NOT EXISTS idx_bandi_region ON bandi(region);
             CREATE INDEX IF NOT EXISTS idx_bandi_deadline ON bandi(deadline);
+
+            -- Tabelle create prima di questa versione: amount era INTEGER e i bandi senza
+            -- scadenza o ente si sono accumulati in copie (si tiene la più vecchia)
+            DO $$
+            BEGIN
+                IF (SELECT data_type FROM information_schema.columns
+                    WHERE table_name = 'bandi' AND column_name = 'amount') = 'integer' THEN
+                    ALTER TABLE bandi ALTER COLUMN amount TYPE BIGINT;
+                END IF;
+                IF to_regclass('idx_bandi_chiave') IS NULL THEN
+                    DELETE FROM bandi a USING bandi b
+                    WHERE a.id > b.id AND a.title = b.title
+                      AND a.entity IS NOT DISTINCT FROM b.entity
+                      AND a.deadline IS NOT DISTINCT FROM b.deadline;
+                    CREATE UNIQUE INDEX idx_bandi_chiave ON bandi ({CHIAVE_UPSERT});
+                END IF;
+            END $$;
+
+            CREATE TABLE IF NOT EXISTS bandi_quarantena (
+                id SERIAL PRIMARY KEY,
+                payload JSONB NOT NULL,
+                motivo TEXT NOT NULL,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            );
         """)
         
         self.conn.commit()
         cursor.close()
     
+    def _prepara_riga(self, bando):
+        """Restituisce (riga, None) se il bando è valido, altrimenti (None, motivo)"""
+        valori = {}
+        for colonna, chiavi in COLONNE.items():
+            valori[colonna] = next((bando[k] for k in chiavi if bando.get(k) not in (None, '')), None)
+
+        if not valori['title'] or not valori['category']:
+            return None, 'title o category mancante'
+        for colonna, massimo in LUNGHEZZE_MAX.items():
+            if valori[colonna] is not None and len(str(valori[colonna])) > massimo:
+                return None, f'{colonna} oltre {massimo} caratteri'
+        try:
+            valori['amount'] = int(float(valori['amount'] or 0))
+        except (TypeError, ValueError):
+            return None, f"amount non numerico: {valori['amount']!r}"
+        if abs(valori['amount']) > AMOUNT_MAX:
+            return None, f"amount fuori scala: {valori['amount']}"
+        valori['deadline'] = _data_o_none(valori['deadline'])
+        valori['published'] = _data_o_none(valori['published'])
+
+        return tuple(valori[c] for c in COLONNE), None
+
     def save_bandi(self, bandi_list):
-        """Salva lista di bandi in database (skip duplicati)"""
-        cursor = self.conn.cursor()
-        new_count = 0
-        
+        """
+        Salva i bandi con un upsert unico: righe valide in una tabella temporanea
+        (execute_values, un solo round-trip) e merge con INSERT ... ON CONFLICT.
+        Le righe non valide finiscono in bandi_quarantena senza bloccare il resto.
+        Restituisce i conteggi inseriti/aggiornati/invariati/quarantena.
+        """
+        righe, chiavi, scartati = [], set(), []
         for bando in bandi_list:
-            try:
-                cursor.execute("""
-                    INSERT INTO bandi (title, category, region, entity, description, 
-                                      amount, deadline, published, url, source)
-                    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-                    ON CONFLICT (title, entity, deadline) DO NOTHING
-                    RETURNING id;
-                """, (
-                    bando.get('title'),
-                    bando.get('category'),
-                    bando.get('region'),
-                    bando.get('entity'),
-                    bando.get('description'),
-                    bando.get('amount', 0),
-                    bando.get('deadline'),
-                    bando.get('published'),
-                    bando.get('url'),
-                    bando.get('source')
-                ))
-                
-                if cursor.fetchone():
-                    new_count += 1
-                    
-            except Exception as e:
-                print(f"Errore salvataggio bando: {str(e)}")
-                self.conn.rollback()
+            riga, motivo = self._prepara_riga(bando)
+            if motivo:
+                scartati.append((Json(bando, dumps=lambda o: json.dumps(o, default=str)), motivo))
                 continue
-        
-        self.conn.commit()
-        cursor.close()
-        
-        return new_count
+            chiave = (riga[0], riga[3], riga[6])  # title, entity, deadline
+            if chiave in chiavi:
+                continue
+            chiavi.add(chiave)
+            righe.append(riga)
+
+        esito = {'inseriti': 0, 'aggiornati': 0, 'invariati': 0, 'quarantena': len(scartati)}
+        colonne = ', '.join(COLONNE)
+        # published resta quello del primo inserimento: gli scraper lo valorizzano con la data del run
+        aggiornabili = [c for c in COLONNE if c not in ('title', 'entity', 'deadline', 'published')]
+        cursor = self.conn.cursor()
+        try:
+            if scartati:
+                execute_values(cursor, "INSERT INTO bandi_quarantena (payload, motivo) VALUES %s",
+                               scartati, page_size=len(scartati))
+                print(f"⚠️ {len(scartati)} bandi in quarantena (vedi tabella bandi_quarantena)")
+
+            if righe:
+                cursor.execute(f"""
+                    CREATE TEMP TABLE bandi_staging ON COMMIT DROP AS
+                    SELECT {colonne} FROM bandi WITH NO DATA;
+                """)
+                execute_values(cursor, f"INSERT INTO bandi_staging ({colonne}) VALUES %s",
+                               righe, page_size=len(righe))
+                cursor.execute(f"""
+                    WITH merged AS (
+                        INSERT INTO bandi ({colonne})
+                        SELECT {colonne} FROM bandi_staging
+                        ON CONFLICT ({CHIAVE_UPSERT}) DO UPDATE SET
+                            {', '.join(f'{c} = EXCLUDED.{c}' for c in aggiornabili)},
+                            updated_at = CURRENT_TIMESTAMP
+                        WHERE ({', '.join(f'bandi.{c}' for c in aggiornabili)})
+                              IS DISTINCT FROM ({', '.join(f'EXCLUDED.{c}' for c in aggiornabili)})
+                        RETURNING (xmax = 0) AS inserito
+                    )
+                    SELECT COUNT(*) FILTER (WHERE inserito), COUNT(*) FILTER (WHERE NOT inserito)
+                    FROM merged;
+                """)
+                esito['inseriti'], esito['aggiornati'] = cursor.fetchone()
+                esito['invariati'] = len(righe) - esito['inseriti'] - esito['aggiornati']
+
+            self.conn.commit()
+        except Exception as e:
+            self.conn.rollback()
+            print(f"Errore salvataggio bandi: {str(e)}")
+            raise
+        finally:
+            cursor.close()
+
+        return esito
     
     def get_all_bandi(self):
         """Recupera tutti i bandi attivi"""
@@ -0,0 +1,89 @@
+"""
+Differenze Bandi - Impronte dei record e diff tra snapshot successivi
+
+Ogni bando è identificato da una chiave stabile (link canonico) e da un hash
+del contenuto: confrontando le impronte con lo snapshot precedente si sa
+cosa è stato aggiunto, modificato o rimosso senza riscrivere nulla.
+Il confronto avviene man mano che i bandi arrivano, senza liste complete in memoria.
+"""
+
+import hashlib
+import json
+import os
+from datetime import datetime
+from id_bandi import canonicalizza_url
+
+# Campi che cambiano a ogni run senza che il bando cambi davvero
+CAMPI_VOLATILI = ("id", "pubblicato", "published")
+
+DELTA_FILE = os.path.join("data", "bandi_delta.json")
+
+
+def chiave_bando(bando):
+    """Chiave stabile: link del bando, altrimenti titolo + ente."""
+    link = bando.get("link") or bando.get("url")
+    if link:
+        return canonicalizza_url(link)
+    titolo = bando.get("titolo") or bando.get("title") or ""
+    ente = bando.get("ente") or bando.get("entity") or ""
+    return f"{titolo.strip().lower()}|{ente.strip().lower()}"
+
+
+def hash_contenuto(bando):
+    contenuto = {k: v for k, v in bando.items() if k not in CAMPI_VOLATILI}
+    testo = json.dumps(contenuto, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha1(testo.encode("utf-8")).hexdigest()
+
+
+class DiffIncrementale:
+    """
+    Diff in streaming contro lo snapshot precedente. Del vecchio snapshot si
+    tengono solo chiave -> (hash, data di pubblicazione), non i record interi.
+    I bandi invariati conservano la data di pubblicazione precedente.
+    """
+
+    def __init__(self, precedenti):
+        self.precedenti = {}
+        for bando in precedenti:
+            self.precedenti.setdefault(chiave_bando(bando), (
+                hash_contenuto(bando), bando.get("pubblicato") or bando.get("published")))
+        self.visti = set()
+        self.diff = {"aggiunti": [], "modificati": [], "rimossi": []}
+
+    def osserva(self, bando):
+        """Classifica un bando; restituisce il record da scrivere o None se duplicato."""
+        chiave = chiave_bando(bando)
+        if chiave in self.visti:
+            return None
+        self.visti.add(chiave)
+        precedente = self.precedenti.get(chiave)
+        if precedente is None:
+            self.diff["aggiunti"].append(bando)
+        elif precedente[0] != hash_contenuto(bando):
+            self.diff["modificati"].append(bando)
+        elif precedente[1]:
+            for campo in ("pubblicato", "published"):
+                if campo in bando:
+                    bando[campo] = precedente[1]
+        return bando
+
+    def chiudi(self):
+        """Da chiamare dopo l'ultimo bando: completa i rimossi e restituisce il diff."""
+        self.diff["rimossi"] = [k for k in self.precedenti if k not in self.visti]
+        return self.diff
+
+
+def diff_vuoto(diff):
+    return not (diff["aggiunti"] or diff["modificati"] or diff["rimossi"])
+
+
+def salva_delta(diff, file_path=DELTA_FILE):
+    """Scrive su disco solo il delta dell'ultimo run."""
+    os.makedirs(os.path.dirname(file_path) or ".", exist_ok=True)
+    with open(file_path, "w", encoding="utf-8") as f:
+        json.dump({"generato": datetime.now().isoformat(timespec="seconds"), **diff}, f, ensure_ascii=False)
+
+
+def riepilogo(diff):
+    return (f"+{len(diff['aggiunti'])} aggiunti, ~{len(diff['modificati'])} modificati, "
+            f"-{len(diff['rimossi'])} rimossi")
@@ -0,0 +1,233 @@
+"""
+Duplicati Bandi - Quasi-duplicati tra sorgenti diverse
+
+La stessa misura ("Resto al Sud", "Smart&Start Italia") arriva da Invitalia,
+MIMIT e dal catalogo curato con titoli e URL leggermente diversi, quindi la
+dedup per link non la riconosce. Ogni bando riceve una firma MinHash dei
+trigrammi del titolo normalizzato (parole piegate e ridotte alla radice come
+nella ricerca); con l'LSH a bande si confrontano solo le coppie che collidono
+in almeno una banda, per cui il costo cresce circa linearmente col catalogo.
+Le coppie candidate sono verificate sulla similarità esatta di titolo e
+descrizione e unite con union-find, dalla più simile: un gruppo ha al massimo
+un bando per sorgente, quindi le catene A~B~C non fondono mai due bandi diversi
+della stessa sorgente. Di ogni gruppo resta un solo bando, il più completo, con
+la provenienza di tutti gli altri in `fonti`.
+"""
+
+import hashlib
+import re
+import struct
+from functools import lru_cache
+
+from ricerca import parole, stem
+
+NUM_PERMUTAZIONI = 60
+RIGHE_BANDA = 3  # 20 bande da 3: collide il ~93% delle coppie con Jaccard 0.5, il ~15% di quelle a 0.2
+SOGLIA_TITOLO = 0.6  # titoli così simili bastano da soli
+SOGLIA_TITOLO_MIN = 0.4  # tra 0.4 e 0.6 serve anche una descrizione simile
+SOGLIA_DESCRIZIONE = 0.3
+PAROLE_DESCRIZIONE = 80  # la descrizione conta solo per l'inizio
+MIN_SHINGLE = 4  # titoli più corti (o il titolo di default) non vengono raggruppati
+
+TITOLO_DEFAULT = "Bando senza titolo"
+_NUMERI_RE = re.compile(r"\d+")
+_VETTORE = struct.Struct(f"<{NUM_PERMUTAZIONI}Q")
+_radice = lru_cache(maxsize=1 << 16)(stem)
+
+
+@lru_cache(maxsize=1 << 16)
+def _hash_shingle(shingle):
+    """
+    NUM_PERMUTAZIONI hash indipendenti di uno shingle in un colpo solo (SHAKE-128
+    a lunghezza variabile): deterministici tra run e macchine e, visto che i
+    trigrammi distinti sono pochi, quasi sempre già in cache.
+    """
+    return _VETTORE.unpack(hashlib.shake_128(shingle.encode("utf-8")).digest(_VETTORE.size))
+
+
+def shingle_titolo(titolo):
+    """Trigrammi di carattere delle radici del titolo ("Resto al Sud" -> " rest", "rest sud ", ...)."""
+    testo = f" {' '.join(_radice(p) for p in parole(titolo))} "
+    return {testo[i:i + 3] for i in range(len(testo) - 2)}
+
+
+def shingle_descrizione(descrizione):
+    """Coppie di radici consecutive dell'inizio della descrizione."""
+    radici = [_radice(p) for p in parole(descrizione)[:PAROLE_DESCRIZIONE]]
+    return {f"{a} {b}" for a, b in zip(radici, radici[1:])}
+
+
+def firma(shingle):
+    """Firma MinHash: per ogni funzione di hash il minimo sugli shingle (min colonna per colonna in C)."""
+    return tuple(map(min, zip(*map(_hash_shingle, shingle))))
+
+
+def jaccard(a, b):
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+class _Impronta:
+    __slots__ = ("titolo", "numeri", "fonte", "_testo", "_descrizione")
+
+    def __init__(self, bando):
+        self.titolo = shingle_titolo(bando.titolo or "")
+        self.numeri = frozenset(_NUMERI_RE.findall(bando.titolo or ""))
+        self.fonte = bando.fonte
+        self._testo = bando.descrizione or ""
+        self._descrizione = None
+
+    @property
+    def descrizione(self):
+        # Serve solo per le coppie con titolo al limite: calcolata alla prima richiesta
+        if self._descrizione is None:
+            self._descrizione = shingle_descrizione(self._testo)
+        return self._descrizione
+
+
+def impronta(bando):
+    """Shingle di un bando, None se il titolo è troppo povero per confrontarlo."""
+    if not bando.titolo or bando.titolo == TITOLO_DEFAULT:
+        return None
+    risultato = _Impronta(bando)
+    return risultato if len(risultato.titolo) >= MIN_SHINGLE else None
+
+
+def simili(a, b):
+    """Verifica esatta di una coppia candidata (due _Impronta)."""
+    if a.fonte == b.fonte:
+        return False  # dentro una sorgente i doppioni li toglie già la dedup per link
+    if a.numeri and b.numeri and a.numeri != b.numeri:
+        return False  # "Concorso ... 400 funzionari" e "... 40 funzionari", edizioni 2024 e 2025
+    titolo = jaccard(a.titolo, b.titolo)
+    if titolo >= SOGLIA_TITOLO:
+        return True
+    return titolo >= SOGLIA_TITOLO_MIN and jaccard(a.descrizione, b.descrizione) >= SOGLIA_DESCRIZIONE
+
+
+class _UnionFind:
+    """Union-find in cui un gruppo non può contenere due elementi della stessa sorgente."""
+
+    def __init__(self, fonti):
+        self.padre = list(range(len(fonti)))
+        self.dimensione = [1] * len(fonti)
+        self.fonti = [{fonte} for fonte in fonti]  # sorgenti del gruppo, valide sulla radice
+
+    def trova(self, x):
+        while self.padre[x] != x:
+            self.padre[x] = self.padre[self.padre[x]]  # path halving
+            x = self.padre[x]
+        return x
+
+    def unisci(self, x, y):
+        """Unisce i due gruppi; False se sono già uniti o hanno una sorgente in comune."""
+        x, y = self.trova(x), self.trova(y)
+        if x == y or self.fonti[x] & self.fonti[y]:
+            return False
+        if self.dimensione[x] < self.dimensione[y]:
+            x, y = y, x
+        self.padre[y] = x
+        self.dimensione[x] += self.dimensione[y]
+        self.fonti[x] |= self.fonti[y]
+        self.fonti[y] = None
+        return True
+
+
+def coppie_candidate(impronte):
+    """Coppie di indici che condividono almeno una banda della firma, solo tra sorgenti diverse."""
+    bucket = {}
+    for i, impronta in enumerate(impronte):
+        if impronta is None:
+            continue
+        sig = firma(impronta.titolo)
+        for banda in range(0, NUM_PERMUTAZIONI, RIGHE_BANDA):
+            bucket.setdefault((banda, *sig[banda:banda + RIGHE_BANDA]), []).append(i)
+
+    coppie = set()
+    for membri in bucket.values():
+        if len(membri) < 2:
+            continue
+        per_fonte = {}
+        for i in membri:
+            per_fonte.setdefault(impronte[i].fonte, []).append(i)
+        if len(per_fonte) < 2:
+            continue  # es. decine di concorsi InPA con lo stesso titolo tipo
+        gruppi = list(per_fonte.values())
+        for g, gruppo in enumerate(gruppi):
+            for altro in gruppi[g + 1:]:
+                coppie.update((min(i, j), max(i, j)) for i in gruppo for j in altro)
+    return coppie
+
+
+def _completezza(bando):
+    """Il bando canonico di un gruppo è quello con più informazioni (a parità, id minore)."""
+    importo = bando.importo if isinstance(bando.importo, (int, float)) else 0
+    return (bando.scadenza is not None, importo > 0, bool(bando.descrizione_breve),
+            len(bando.descrizione or ""), -(bando.id or 0))
+
+
+def _provenienza(bando):
+    return bando.fonti or [{"fonte": bando.fonte, "link": bando.link, "id": bando.id}]
+
+
+def fondi(gruppo):
+    """Bando canonico del gruppo, con i campi mancanti presi dagli altri e la provenienza di tutti."""
+    canonico = max(gruppo, key=_completezza)
+    altri = [b for b in gruppo if b is not canonico]
+    for altro in sorted(altri, key=_completezza, reverse=True):
+        if canonico.scadenza is None and altro.scadenza is not None:
+            canonico.scadenza = altro.scadenza
+            canonico.scadenza_nota = None
+        if not canonico.importo and altro.importo:
+            canonico.importo = altro.importo
+        for campo in ("descrizione_breve", "pubblicato", "requisiti", "scadenza_nota"):
+            if not getattr(canonico, campo) and getattr(altro, campo):
+                setattr(canonico, campo, getattr(altro, campo))
+    fonti = _provenienza(canonico)
+    for altro in altri:
+        fonti.extend(f for f in _provenienza(altro) if f not in fonti)
+    canonico.fonti = fonti
+    return canonico
+
+
+def raggruppa_simili(bandi, ordine_fonti=()):
+    """
+    Stadio BARRIERA della pipeline: consuma tutto il flusso a monte e tiene in
+    memoria l'intero catalogo prima di emettere il primo bando, perché un bando
+    può avere il suo doppione nell'ultimo arrivato. Fino a qui scraping,
+    normalizzazione e dedup restano in streaming (sorgenti in parallelo, code
+    limitate); da qui in poi no. Per questo è l'ultimo stadio di flusso_bandi.
+
+    Emette un bando per ogni gruppo di quasi-duplicati, al massimo uno per
+    sorgente in ogni gruppo. Le sorgenti girano in parallelo e arrivano
+    mescolate: l'uscita è riordinata per fonte (prima quelle di `ordine_fonti`,
+    poi le altre in ordine alfabetico) e, dentro ogni fonte, nell'ordine di
+    arrivo. Due run con gli stessi dati danno lo stesso snapshot (e ETag).
+    """
+    rango = {fonte: i for i, fonte in enumerate(ordine_fonti)}
+    # barriera (vedi sopra); sorted è stabile, quindi dentro una fonte resta l'ordine di arrivo
+    bandi = sorted(bandi, key=lambda b: (rango.get(b.fonte, len(rango)), b.fonte or ""))
+    impronte = [impronta(b) for b in bandi]
+
+    # Dalla coppia più simile: se una catena porterebbe due bandi della stessa
+    # sorgente nello stesso gruppo, vince il legame più forte
+    verificate = sorted(
+        ((jaccard(impronte[i].titolo, impronte[j].titolo), i, j)
+         for i, j in coppie_candidate(impronte) if simili(impronte[i], impronte[j])),
+        reverse=True)
+    uf = _UnionFind([b.fonte for b in bandi])
+    for _, i, j in verificate:
+        uf.unisci(i, j)
+
+    gruppi = {}
+    for i in range(len(bandi)):
+        gruppi.setdefault(uf.trova(i), []).append(bandi[i])
+    canonici = set()
+    for gruppo in gruppi.values():
+        canonici.add(id(fondi(gruppo) if len(gruppo) > 1 else gruppo[0]))
+    if len(canonici) < len(bandi):
+        print(f"🧬 Quasi-duplicati: {len(bandi) - len(canonici)} bandi assorbiti, ne restano {len(canonici)}")
+    for bando in bandi:
+        if id(bando) in canonici:
+            yield bando
@@ -1,23 +1,27 @@
-import requests
 from bs4 import BeautifulSoup
 from datetime import datetime
+from http_client import client_condiviso
+from metriche import METRICHE
 
 class GazzettaScraper:
     def __init__(self):
         self.base_url = "https://www.gazzettaufficiale.it"
         # Pagina che elenca i concorsi attivi ordinati per pubblicazione
         self.concorsi_url = f"{self.base_url}/concorsi/concorsi/elenco"
+        self.http = client_condiviso()
 
-    def scrape_bandi_attivi(self, max_bandi=50):
+    def iter_bandi(self, max_bandi=50):
+        """Genera i concorsi attivi della Gazzetta una riga alla volta"""
         print("🔍 Inizio scraping Gazzetta Ufficiale - elenco concorsi attivi")
-        bandi = []
+        trovati = 0
 
         try:
-            response = requests.get(self.concorsi_url, timeout=15)
+            response = self.http.get(self.concorsi_url, timeout=15)
             response.raise_for_status()
 
-            soup = BeautifulSoup(response.content, 'html.parser')
-            rows = soup.select('li.rigaBando')
+            with METRICHE.tempo_parsing("Gazzetta"):
+                soup = BeautifulSoup(response.content, 'html.parser')
+                rows = soup.select('li.rigaBando')
 
             print(f"📄 Trovati {len(rows)} bandi nella pagina")
             for row in rows[:max_bandi]:
@@ -37,7 +41,6 @@ class GazzettaScraper:
                         link = self.concorsi_url
 
                     bando = {
-                        'id': abs(hash(link)),
                         'title': title,
                         'category': 'lavoro',
                         'region': 'nazionale',
@@ -49,7 +52,8 @@ class GazzettaScraper:
                         'url': link,
                         'source': 'gazzetta_ufficiale'
                     }
-                    bandi.append(bando)
+                    trovati += 1
+                    yield bando
                 except Exception as er:
                     print(f"⚠️ Errore parser row: {er}")
                     continue
@@ -57,8 +61,10 @@ class GazzettaScraper:
         except Exception as e:
             print(f"❌ Errore scraping Gazzetta: {e}")
 
-        print(f"✅ Totale bandi trovati da Gazzetta: {len(bandi)}")
-        return bandi
+        print(f"✅ Totale bandi trovati da Gazzetta: {trovati}")
+
+    def scrape_bandi_attivi(self, max_bandi=50):
+        return list(self.iter_bandi(max_bandi))
 
 if __name__ == "__main__":
     scraper = GazzettaScraper()
@@ -1,4 +1,3 @@
-import json
 import base64
 import requests
 import os
@@ -8,39 +7,60 @@ from invitalia_scraper import InvitaliaScraper
 from mimit_scraper import MIMITScraper
 from consap_scraper import ConsapScraper
 from gazzetta_scraper import GazzettaScraper
+from id_bandi import assegna_id
+from duplicati_bandi import raggruppa_simili
+from pipeline_bandi import FlussoSorgenti, applica_override, carica_override, deduplica
+from schema_bandi import Bando, normalizza
+from differenze_bandi import DiffIncrementale, diff_vuoto, riepilogo, salva_delta
+from ndjson_bandi import JSON_FILE, NDJSON_FILE, ScrittoreSnapshot, leggi_snapshot
+from metriche import METRICHE, salva_ultimo_run
+from archivio_utenti import DB_FILE, ArchivioUtenti
+from preferenze_bandi import IndicePreferenze, raccomanda_tutti
 
 
 # =========================================================
 # 🧠 GENERAZIONE DATABASE BANDI
 # =========================================================
 
-def generate_real_bandi_database():
-    bandi = []
-    try:
-        bandi += InPAScraper().scrape_bandi_list()
-        print(f"✅ InPA: {len(bandi)} bandi totali")
-    except Exception as e:
-        print(f"⚠️ Errore InPA: {e}")
-
-    try:
-        bandi += InvitaliaScraper().scrape_incentivi()
-        print(f"✅ Invitalia: {len(bandi)} bandi totali")
-    except Exception as e:
-        print(f"⚠️ Errore Invitalia: {e}")
+# Ogni sorgente è una funzione senza argomenti che restituisce un iterabile di bandi:
+# i generatori iter_bandi() emettono i bandi man mano che vengono estratti
+SORGENTI = [
+    ("InPA", lambda: InPAScraper().iter_bandi()),
+    ("Invitalia", lambda: InvitaliaScraper().iter_bandi()),
+    ("MIMIT", lambda: MIMITScraper().iter_bandi()),
+    ("Consap", lambda: ConsapScraper().iter_bandi()),
+]
+
+# Sorgenti eseguite in parallelo (1 = sequenziale) e tempo massimo per sorgente
+CONCORRENZA = int(os.getenv("SCRAPER_CONCORRENZA", len(SORGENTI)))
+TIMEOUT_SORGENTE = float(os.getenv("SCRAPER_TIMEOUT_SORGENTE", 600))
+
+
+def flusso_bandi(sorgenti=None, concorrenza=None, timeout_sorgente=None):
+    """
+    Pipeline in streaming: sorgenti in parallelo -> normalizzazione (Bando) ->
+    override manuali -> id stabili -> dedup per link -> quasi-duplicati tra sorgenti.
+    Restituisce un generatore; la coda limitata tra scraper e stadi a valle fa
+    da backpressure fino alla dedup. L'ultimo stadio (raggruppa_simili) è una
+    barriera: raccoglie tutti i Bando (compatti) per raggrupparli, poi li emette
+    di nuovo uno alla volta, nell'ordine delle sorgenti e non in quello di arrivo.
+    Ogni stadio è cronometrato in metriche.METRICHE.
+    """
+    flusso = FlussoSorgenti(sorgenti or SORGENTI, concorrenza or CONCORRENZA,
+                            timeout_sorgente or TIMEOUT_SORGENTE)
+    stadio = METRICHE.cronometra
+    bandi = stadio("scraping", flusso)
+    bandi = stadio("normalizzazione", normalizza(bandi))
+    bandi = stadio("override", applica_override(bandi, carica_override()))
+    bandi = stadio("id", assegna_id(bandi))
+    bandi = stadio("dedup", deduplica(bandi))
+    # Fonte dei record di ogni sorgente = nome della sorgente in minuscolo ("InPA" -> "inpa")
+    ordine_fonti = [nome.lower() for nome, _ in (sorgenti or SORGENTI)]
+    return stadio("quasi_duplicati", raggruppa_simili(bandi, ordine_fonti))
 
-    try:
-        bandi += MIMITScraper().scrape_incentivi()
-        print(f"✅ MIMIT: {len(bandi)} bandi totali")
-    except Exception as e:
-        print(f"⚠️ Errore MIMIT: {e}")
-
-    try:
-        bandi += ConsapScraper().scrape()
-        print(f"✅ Consap: {len(bandi)} bandi totali")
-    except Exception as e:
-        print(f"⚠️ Errore Consap: {e}")
 
-    return bandi
+def generate_real_bandi_database():
+    return [bando.a_dict() for bando in flusso_bandi()]
 
 
 # =========================================================
@@ -48,74 +68,133 @@ def generate_real_bandi_database():
 # =========================================================
 
 def save_to_json():
-    bandi = generate_real_bandi_database()
-    file_path = 'bandi_database_reale.json'
-
-    # 🔹 Salva in locale
-    with open(file_path, 'w', encoding='utf-8') as f:
-        json.dump(bandi, f, ensure_ascii=False)
-    print(f"💾 File salvato con {len(bandi)} bandi.")
-
-    # 📊 Log riepilogativo
+    """Refresh completo; il riepilogo con le metriche del run va in data/ultimo_run.json."""
+    METRICHE.azzera()
+    esito = {"esito": "errore", "bandi": None}
     try:
-        print("\n📊 Riepilogo per sorgente:")
-        sorgenti = {}
-        for bando in bandi:
-            src = bando.get("source", "sconosciuta")
+        pubblicato = _aggiorna_snapshot(esito)
+        esito["esito"] = "pubblicato" if pubblicato else "invariato"
+        # Anche a snapshot invariato: i bandi scaduti da ieri escono dalle raccomandazioni
+        try:
+            esito["raccomandazioni"] = aggiorna_raccomandazioni()
+        except Exception as e:
+            print(f"⚠️ Raccomandazioni non aggiornate: {e}")
+        return pubblicato
+    finally:
+        try:
+            salva_ultimo_run(METRICHE.riepilogo(**esito))
+        except OSError as e:
+            print(f"⚠️ Riepilogo del run non salvato: {e}")
+
+
+def _aggiorna_snapshot(esito):
+    nuovi = flusso_bandi()
+
+    # 🔍 Confronto in streaming con lo snapshot precedente mentre si scrivono i file temporanei:
+    # se nulla è cambiato i temporanei vengono scartati e non si pubblica nulla
+    diff_run = DiffIncrementale(leggi_snapshot(NDJSON_FILE, JSON_FILE))
+    sorgenti = {}
+    with ScrittoreSnapshot(NDJSON_FILE, JSON_FILE) as scrittore:
+        for bando in nuovi:
+            bando = diff_run.osserva(bando.a_dict())
+            if bando is None:
+                continue
+            scrittore.scrivi(bando)
+            src = bando.get("source") or bando.get("fonte") or "sconosciuta"
             sorgenti[src] = sorgenti.get(src, 0) + 1
-        for src, count in sorgenti.items():
-            print(f"   - {src}: {count} bandi")
-        print("✅ Aggiornamento completato con successo.\n")
-    except Exception as e:
-        print(f"⚠️ Errore durante il riepilogo: {e}")
+        diff = diff_run.chiudi()
+        esito.update(bandi=scrittore.conteggio, modifiche=riepilogo(diff))
+        if diff_vuoto(diff):
+            scrittore.annulla()
+
+    if diff_vuoto(diff):
+        print(f"💤 Nessuna modifica rispetto allo snapshot ({scrittore.conteggio} bandi): salvataggio e push saltati.")
+        return False
+    print(f"🔁 Modifiche rilevate: {riepilogo(diff)}")
+    salva_delta(diff)
+    print(f"💾 File salvati con {scrittore.conteggio} bandi ({NDJSON_FILE}, {JSON_FILE}).")
+
+    # 📊 Log riepilogativo
+    print("\n📊 Riepilogo per sorgente:")
+    for src, count in sorgenti.items():
+        print(f"   - {src}: {count} bandi")
+    print("✅ Aggiornamento completato con successo.\n")
 
     # 🚀 Push su GitHub via API
-    push_to_github(file_path)
+    push_to_github(JSON_FILE, NDJSON_FILE, riepilogo_modifiche=riepilogo(diff))
+    return True
+
+
+def aggiorna_raccomandazioni():
+    """Batch delle raccomandazioni di tutti gli utenti sullo snapshot corrente; utenti elaborati."""
+    if not os.path.exists(DB_FILE):
+        return None  # nessun archivio utenti dove gira il refresh (es. GitHub Actions)
+    bandi = [Bando.da_dict(b) for b in leggi_snapshot(NDJSON_FILE, JSON_FILE)]
+    archivio = ArchivioUtenti(json_legacy=None)
+    risultati = raccomanda_tutti(IndicePreferenze(bandi), archivio.preferenze_utenti())
+    archivio.salva_raccomandazioni(risultati)
+    return len(risultati)
 
 
 # =========================================================
 # 🚀 PUSH DIRETTO VIA API GITHUB
 # =========================================================
 
-def push_to_github(file_path="bandi_database_reale.json"):
-    """Carica il file aggiornato direttamente su GitHub tramite API REST."""
+def push_to_github(*file_paths, riepilogo_modifiche=None):
+    """
+    Pubblica i file aggiornati su GitHub in un solo commit tramite la Git Data API
+    (blob -> tree -> commit -> ref): JSON e NDJSON arrivano insieme, non come due
+    commit separati della contents API. Il riepilogo del diff va nel messaggio.
+    """
     try:
         token = os.getenv("GITHUB_TOKEN")
         repo = "McFranco99/bandi-italia"
         branch = "main"
         commit_message = f"Aggiornamento automatico bandi ({datetime.now().strftime('%Y-%m-%d %H:%M')})"
+        if riepilogo_modifiche:
+            commit_message += f": {riepilogo_modifiche}"
 
         if not token:
             print("⚠️ Nessun token GitHub trovato (variabile GITHUB_TOKEN mancante).")
             return
 
-        # Legge il file e lo converte in base64
-        with open(file_path, "rb") as f:
-            content = base64.b64encode(f.read()).decode("utf-8")
-
-        # Recupera lo SHA del file attuale (per aggiornamento)
-        url = f"https://api.github.com/repos/{repo}/contents/{file_path}"
+        api = f"https://api.github.com/repos/{repo}/git"
         headers = {"Authorization": f"Bearer {token}"}
-        response = requests.get(url, headers=headers)
-        sha = response.json().get("sha") if response.status_code == 200 else None
-
-        # Crea il payload per la PUT
-        payload = {
+        bot = {"name": "BandiperteBot", "email": "bot@bandiperte.it"}
+
+        # Commit e tree attuali del branch
+        r = requests.get(f"{api}/ref/heads/{branch}", headers=headers)
+        r.raise_for_status()
+        parent = r.json()["object"]["sha"]
+        r = requests.get(f"{api}/commits/{parent}", headers=headers)
+        r.raise_for_status()
+        base_tree = r.json()["tree"]["sha"]
+
+        # Un blob per file (in base64), poi un tree che li sostituisce sopra quello attuale
+        voci = []
+        for file_path in file_paths:
+            with open(file_path, "rb") as f:
+                content = base64.b64encode(f.read()).decode("utf-8")
+            r = requests.post(f"{api}/blobs", headers=headers, json={"content": content, "encoding": "base64"})
+            r.raise_for_status()
+            voci.append({"path": file_path, "mode": "100644", "type": "blob", "sha": r.json()["sha"]})
+        r = requests.post(f"{api}/trees", headers=headers, json={"base_tree": base_tree, "tree": voci})
+        r.raise_for_status()
+
+        r = requests.post(f"{api}/commits", headers=headers, json={
             "message": commit_message,
-            "content": content,
-            "branch": branch,
-            "committer": {
-                "name": "BandiperteBot",
-                "email": "bot@bandiperte.it"
-            }
-        }
-        if sha:
-            payload["sha"] = sha
-
-        r = requests.put(url, headers=headers, json=payload)
-
-        if r.status_code in (200, 201):
-            print("✅ File aggiornato su GitHub con successo via API.")
+            "tree": r.json()["sha"],
+            "parents": [parent],
+            "author": bot,
+            "committer": bot,
+        })
+        r.raise_for_status()
+
+        # Avanza il branch (non forzato: se nel frattempo è cambiato, l'aggiornamento fallisce)
+        r = requests.patch(f"{api}/refs/heads/{branch}", headers=headers, json={"sha": r.json()["sha"]})
+
+        if r.status_code == 200:
+            print(f"✅ {len(file_paths)} file aggiornati su GitHub in un solo commit via API.")
         else:
             print(f"⚠️ Errore API GitHub ({r.status_code}): {r.text}")
 
@@ -0,0 +1,228 @@
+"""
+Hash Password - Hash e verifica delle password fuori dal thread della richiesta
+
+generate_password_hash e check_password_hash sono lenti di proposito (scrypt):
+fatti sul thread della richiesta, una raffica di login bloccava tutte le altre
+richieste del worker. Qui girano in un pool di processi dedicato e limitato:
+oltre HASH_WORKER hash in corso e HASH_CODA in attesa la richiesta viene
+rifiutata subito (CodaPiena -> 503) invece di allungare la coda all'infinito.
+
+Davanti al pool c'è LimiteTentativi, token bucket non bloccanti per account e
+per IP (-> 429): il costo dell'hash lo paga solo chi è entro i limiti.
+
+Configurazione da variabili d'ambiente:
+- PASSWORD_HASH_METODO: metodo di werkzeug con i parametri di costo, es.
+  "scrypt:32768:8:1" o "pbkdf2:sha256:600000" (default: quello di werkzeug).
+  Gli hash salvati con un costo diverso vengono rifatti al login successivo.
+- HASH_WORKER: processi del pool (default: numero di CPU).
+- HASH_CODA: hash in attesa oltre quelli in corso (default: 4 per worker).
+"""
+
+import multiprocessing
+import os
+import sys
+import threading
+import time
+import types
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import contextmanager
+
+from werkzeug import security
+from werkzeug.security import check_password_hash, generate_password_hash
+
+METODO = os.environ.get("PASSWORD_HASH_METODO") or None
+WORKER = int(os.environ.get("HASH_WORKER") or os.cpu_count() or 1)
+CODA = int(os.environ.get("HASH_CODA") or 4 * WORKER)
+TIMEOUT = 30
+
+# Tentativi: (burst, token al secondo). Account: 5 di fila, poi 1 al minuto; IP: 30 di fila, poi 1 ogni 2 s
+LIMITE_ACCOUNT = (5, 1 / 60)
+LIMITE_IP = (30, 0.5)
+MAX_CHIAVI = 100000
+
+
+class CodaPiena(Exception):
+    """Il pool ha già HASH_WORKER + HASH_CODA hash in carico."""
+
+
+# Pool pieno, hash troppo lento o processi del pool morti: per il client è un 503
+ERRORI_POOL = (CodaPiena, TimeoutError, BrokenProcessPool)
+
+
+def _genera(password, metodo):
+    if metodo:
+        return generate_password_hash(password, method=metodo)
+    return generate_password_hash(password)
+
+
+def _verifica(hash_salvato, password):
+    return check_password_hash(hash_salvato, password)
+
+
+def _pronto():
+    return os.getpid()
+
+
+def _parametri(metodo):
+    """
+    Metodo di werkzeug con i default espliciti, per confrontare configurazione e
+    hash salvati: "pbkdf2:sha256" e "pbkdf2:sha256:1000000" sono lo stesso costo.
+    """
+    nome, *parti = metodo.split(":")
+    try:
+        if nome == "scrypt":
+            return ("scrypt", *(map(int, parti) if parti else (2 ** 15, 8, 1)))
+        if nome == "pbkdf2":
+            iterazioni = getattr(security, "DEFAULT_PBKDF2_ITERATIONS", 600000)
+            return ("pbkdf2", parti[0] if parti else "sha256", int(parti[1]) if len(parti) > 1 else iterazioni)
+    except ValueError:
+        pass
+    return (nome, *parti)
+
+
+@contextmanager
+def _senza_main():
+    """
+    Con spawn/forkserver ogni processo nuovo reimporta lo script __main__ del
+    padre: con `python auth_server.py` rieseguirebbe tutto l'avvio del server
+    (thread di commit SQLite, catalogo, osservatore). Mentre i processi del pool
+    partono __main__ è un modulo vuoto, così importano solo questo modulo.
+    """
+    main = sys.modules["__main__"]
+    sys.modules["__main__"] = types.ModuleType("__main__")
+    try:
+        yield
+    finally:
+        sys.modules["__main__"] = main
+
+
+class PoolHash:
+    def __init__(self, worker=WORKER, coda=CODA, metodo=METODO):
+        self.worker = worker
+        self.metodo = metodo
+        self._posti = threading.BoundedSemaphore(worker + coda)
+        self._pool = None
+        self._lock = threading.Lock()
+        self._hash_fittizio = None
+
+    def _esecutore(self):
+        # Creato al primo uso, nel processo che serve le richieste (dopo il fork di gunicorn)
+        with self._lock:
+            if self._pool is None:
+                if "forkserver" in multiprocessing.get_all_start_methods():
+                    # Niente fork del server con i suoi thread e la connessione SQLite: i
+                    # processi partono dal forkserver, che precarica solo questo modulo
+                    ctx = multiprocessing.get_context("forkserver")
+                    ctx.set_forkserver_preload([__name__])
+                else:
+                    ctx = multiprocessing.get_context("spawn")
+                pool = ProcessPoolExecutor(max_workers=self.worker, mp_context=ctx)
+                # I processi partono tutti adesso (uno per submit finché nessuno è libero),
+                # non più tardi durante una richiesta qualsiasi
+                try:
+                    with _senza_main():
+                        avvii = [pool.submit(_pronto) for _ in range(self.worker)]
+                    for avvio in avvii:
+                        avvio.result(timeout=TIMEOUT)
+                except BaseException:
+                    pool.shutdown(wait=False, cancel_futures=True)
+                    raise
+                self._pool = pool
+            return self._pool
+
+    def _scarta(self, pool):
+        """Un processo del pool è morto: il pool non accetta più lavoro e si ricrea al prossimo uso."""
+        with self._lock:
+            if self._pool is pool:
+                self._pool = None
+        pool.shutdown(wait=False, cancel_futures=True)
+
+    def _esegui(self, funzione, *argomenti):
+        if not self._posti.acquire(blocking=False):
+            raise CodaPiena("Troppe richieste di autenticazione in corso")
+        pool = None
+        try:
+            pool = self._esecutore()
+            return pool.submit(funzione, *argomenti).result(timeout=TIMEOUT)
+        except BrokenProcessPool:
+            if pool is not None:
+                self._scarta(pool)
+            raise
+        finally:
+            self._posti.release()
+
+    def genera(self, password):
+        return self._esegui(_genera, password, self.metodo)
+
+    def verifica(self, hash_salvato, password):
+        """
+        Come check_password_hash. Senza hash (utente inesistente o solo OAuth) si
+        verifica comunque un hash fittizio: la risposta non rivela se l'email esiste.
+        """
+        if not hash_salvato:
+            if self._hash_fittizio is None:
+                self._hash_fittizio = self.genera(os.urandom(16).hex())
+            self._esegui(_verifica, self._hash_fittizio, password)
+            return False
+        return self._esegui(_verifica, hash_salvato, password)
+
+    def da_rifare(self, hash_salvato):
+        """True se l'hash è stato fatto con parametri di costo diversi da quelli configurati."""
+        if not self.metodo:
+            return False
+        return _parametri(hash_salvato.split("$", 1)[0]) != _parametri(self.metodo)
+
+    def chiudi(self):
+        with self._lock:
+            if self._pool is not None:
+                self._pool.shutdown(wait=False, cancel_futures=True)
+                self._pool = None
+
+
+class LimiteTentativi:
+    """
+    Token bucket non bloccanti per chiave ("account:<email>", "ip:<indirizzo>"),
+    in memoria del processo come sessions_db. Le chiavi più vecchie oltre
+    MAX_CHIAVI vengono dimenticate (LRU): al peggio ripartono col bucket pieno.
+    """
+
+    def __init__(self, max_chiavi=MAX_CHIAVI):
+        self.max_chiavi = max_chiavi
+        self._bucket = OrderedDict()  # chiave -> [token, ultimo aggiornamento]
+        self._lock = threading.Lock()
+
+    def _token(self, chiave, limite, ora):
+        burst, rate = limite
+        voce = self._bucket.get(chiave)
+        if voce is None:
+            voce = self._bucket[chiave] = [float(burst), ora]
+            while len(self._bucket) > self.max_chiavi:
+                self._bucket.popitem(last=False)
+        else:
+            voce[0] = min(burst, voce[0] + (ora - voce[1]) * rate)
+            voce[1] = ora
+            self._bucket.move_to_end(chiave)
+        return voce
+
+    def consenti(self, *chiavi_limiti):
+        """
+        Consuma un token da ogni (chiave, limite) se tutte ne hanno uno e
+        restituisce 0; altrimenti non consuma nulla e restituisce i secondi da
+        attendere (per Retry-After).
+        """
+        ora = time.monotonic()
+        with self._lock:
+            voci = [(self._token(chiave, limite, ora), limite) for chiave, limite in chiavi_limiti]
+            attesa = max(((1 - voce[0]) / limite[1] for voce, limite in voci if voce[0] < 1), default=0)
+            if attesa:
+                return attesa
+            for voce, _ in voci:
+                voce[0] -= 1
+            return 0
+
+    def azzera(self, chiave):
+        """Login riuscito: l'account riparte con tutti i tentativi."""
+        with self._lock:
+            self._bucket.pop(chiave, None)
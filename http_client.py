@@ -0,0 +1,162 @@
+"""
+HTTP Client - Livello di fetch condiviso da tutti gli scraper
+
+Una sessione keep-alive per host (niente handshake TCP+TLS per ogni URL),
+limiti di frequenza a token bucket per dominio e retry con backoff e jitter.
+Thread-safe: gli scraper possono usarlo da più thread contemporaneamente.
+Ogni tentativo finisce nelle metriche per host (metriche.METRICHE).
+"""
+
+import random
+import threading
+import time
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from metriche import METRICHE
+
+USER_AGENT = "Mozilla/5.0 (BandiItaliaBot/1.0)"
+
+# Richieste al secondo e burst per host: limiti di cortesia verso i portali
+LIMITE_DEFAULT = (4.0, 4)
+LIMITI_HOST = {
+    "portale.inpa.gov.it": (8.0, 8),
+    "www.invitalia.it": (4.0, 4),
+    "www.mimit.gov.it": (2.0, 2),
+    "www.consap.it": (4.0, 4),
+    "www.gazzettaufficiale.it": (2.0, 2),
+}
+
+STATUS_RETRY = (429, 500, 502, 503, 504)
+
+
+class TokenBucket:
+    """Token bucket bloccante: `rate` token al secondo, fino a `burst` accumulati."""
+
+    def __init__(self, rate, burst):
+        self.rate = float(rate)
+        self.burst = float(burst)
+        self.tokens = float(burst)
+        self.ultimo = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquisisci(self):
+        while True:
+            with self.lock:
+                ora = time.monotonic()
+                self.tokens = min(self.burst, self.tokens + (ora - self.ultimo) * self.rate)
+                self.ultimo = ora
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                attesa = (1 - self.tokens) / self.rate
+            time.sleep(attesa)
+
+
+class HttpClient:
+    TIMEOUT = 20
+    MAX_TENTATIVI = 4
+    BACKOFF_BASE = 0.5
+    BACKOFF_MAX = 20.0
+    POOL_PER_HOST = 10
+
+    def __init__(self, limiti=None):
+        self.limiti = dict(LIMITI_HOST, **(limiti or {}))
+        self._sessioni = {}
+        self._bucket = {}
+        self._lock = threading.Lock()
+        self._riscrivi_url = None
+
+    # ---------- Risorse per host ----------
+    def _per_host(self, host):
+        with self._lock:
+            sess = self._sessioni.get(host)
+            if sess is None:
+                sess = requests.Session()
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.POOL_PER_HOST)
+                sess.mount("https://", adapter)
+                sess.mount("http://", adapter)
+                sess.headers.update({"User-Agent": USER_AGENT})
+                rate, burst = self.limiti.get(host, LIMITE_DEFAULT)
+                self._sessioni[host] = sess
+                self._bucket[host] = TokenBucket(rate, burst)
+            return sess, self._bucket[host]
+
+    def imposta_limite(self, host, rate, burst=None):
+        """Cambia il limite di frequenza di un host (anche a runtime)."""
+        with self._lock:
+            self.limiti[host] = (rate, burst or max(1, int(rate)))
+            self._bucket[host] = TokenBucket(*self.limiti[host])
+
+    def imposta_riscrittura(self, funzione):
+        """
+        Riscrive ogni URL prima dell'invio (None per disattivare). Serve al benchmark
+        offline per mandare tutti gli host verso il server locale che riproduce le risposte.
+        """
+        self._riscrivi_url = funzione
+
+    def _attesa_retry(self, tentativo, risposta=None):
+        if risposta is not None:
+            retry_after = risposta.headers.get("Retry-After", "")
+            if retry_after.isdigit():
+                return min(float(retry_after), self.BACKOFF_MAX)
+        # Full jitter: evita che i thread ritentino tutti nello stesso istante
+        return random.uniform(0, min(self.BACKOFF_MAX, self.BACKOFF_BASE * 2 ** tentativo))
+
+    # ---------- Richieste ----------
+    def request(self, method, url, **kwargs):
+        """
+        Come requests.request, con rate limit e retry su errori di rete e 429/5xx.
+        Dopo l'ultimo tentativo restituisce la risposta (il chiamante fa raise_for_status)
+        o rilancia l'eccezione di rete.
+        """
+        kwargs.setdefault("timeout", self.TIMEOUT)
+        if self._riscrivi_url is not None:
+            url = self._riscrivi_url(url)
+        host = urlparse(url).netloc
+        sess, bucket = self._per_host(host)
+
+        for tentativo in range(self.MAX_TENTATIVI):
+            inizio = time.perf_counter()
+            bucket.acquisisci()
+            invio = time.perf_counter()
+            try:
+                r = sess.request(method, url, **kwargs)
+            except (requests.ConnectionError, requests.Timeout):
+                METRICHE.registra_http(host, time.perf_counter() - invio, invio - inizio, retry=tentativo > 0)
+                if tentativo == self.MAX_TENTATIVI - 1:
+                    raise
+                time.sleep(self._attesa_retry(tentativo))
+                continue
+            METRICHE.registra_http(host, time.perf_counter() - invio, invio - inizio,
+                                   len(r.content), r.status_code, retry=tentativo > 0)
+            if r.status_code not in STATUS_RETRY or tentativo == self.MAX_TENTATIVI - 1:
+                return r
+            time.sleep(self._attesa_retry(tentativo, r))
+
+    def get(self, url, **kwargs):
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request("POST", url, **kwargs)
+
+    def close(self):
+        with self._lock:
+            for sess in self._sessioni.values():
+                sess.close()
+            self._sessioni.clear()
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def client_condiviso():
+    """Client unico per processo: tutti gli scraper condividono pool e limiti."""
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = HttpClient()
+        return _client
@@ -0,0 +1,63 @@
+"""
+ID Bandi - Identificativi stabili tra run e macchine diverse
+
+L'id è un digest dell'URL canonico del bando (o di titolo + ente se manca il
+link), ridotto a 53 bit così resta un intero esatto anche in JavaScript.
+A differenza di hash(), non dipende dal seed casuale del processo.
+"""
+
+import hashlib
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+ID_MAX = 2 ** 53 - 1
+
+# Parametri di tracciamento che non identificano la pagina
+PARAMETRI_IGNORATI = ("utm_", "fbclid", "gclid", "mc_cid", "mc_eid")
+
+
+def canonicalizza_url(url):
+    """
+    Forma canonica di un URL: https, host minuscolo senza porta di default,
+    niente frammento né parametri di tracciamento, query ordinata, senza '/' finale.
+    """
+    if not url:
+        return ""
+    parti = urlsplit(url.strip())
+    schema = (parti.scheme or "https").lower()
+    if schema == "http":
+        schema = "https"
+    host = (parti.hostname or "").lower()
+    if parti.port and parti.port not in (80, 443):
+        host = f"{host}:{parti.port}"
+    percorso = parti.path.rstrip("/") or "/"
+    query = urlencode(sorted(
+        (k, v) for k, v in parse_qsl(parti.query, keep_blank_values=True)
+        if not k.lower().startswith(PARAMETRI_IGNORATI)
+    ))
+    return urlunsplit((schema, host, percorso, query, ""))
+
+
+def _digest(testo):
+    return int.from_bytes(hashlib.blake2b(testo.encode("utf-8"), digest_size=8).digest(), "big") & ID_MAX
+
+
+def id_bando(bando):
+    """Id deterministico di un bando (qualunque sia lo schema dei campi)."""
+    link = bando.get("link") or bando.get("url")
+    if link:
+        return _digest(canonicalizza_url(link))
+    titolo = (bando.get("titolo") or bando.get("title") or "").strip().lower()
+    ente = (bando.get("ente") or bando.get("entity") or "").strip().lower()
+    return _digest(f"{titolo}|{ente}")
+
+
+def assegna_id(bandi):
+    """
+    Stadio di normalizzazione: assegna a ogni bando il suo id stabile man mano
+    che i bandi passano (generatore, va bene anche su un flusso).
+    Arrivano già come Bando: l'id nativo della fonte (es. l'UUID dei concorsi
+    InPA) è stato spostato in `id_fonte` da Bando.da_dict.
+    """
+    for bando in bandi:
+        bando["id"] = id_bando(bando)
+        yield bando
@@ -0,0 +1,169 @@
+"""
+Indice Bandi - Indici invertiti in memoria per filtrare e paginare il catalogo
+
+Costruito una sola volta quando api_server.py carica il file JSON: le query
+su /api/bandi costano quanto la pagina richiesta, non quanto il catalogo.
+Lavora su record Bando già normalizzati (schema_bandi): niente fallback tra nomi.
+"""
+
+import base64
+from ricerca import IndiceTestuale
+
+# Stesse parole chiave usate da matchEnteFilter() in index.html
+GRUPPI_ENTE = {
+    "demanio": ("demanio",),
+    "mimit": ("mimit",),
+    "regione": ("regione",),
+    "invitalia": ("invitalia",),
+    "inpa": ("inpa",),
+}
+
+ORDINAMENTI = ("scadenza", "pubblicato", "titolo", "importo")
+
+LIMIT_DEFAULT = 50
+LIMIT_MAX = 500
+
+
+def _gruppi_ente(ente):
+    low = (ente or "").lower()
+    gruppi = [g for g, keywords in GRUPPI_ENTE.items() if any(k in low for k in keywords)]
+    return gruppi or ["altro"]
+
+
+class QueryNonValida(ValueError):
+    """Parametri di query non validi (limit, cursor, sort...)."""
+
+
+class CursorScaduto(QueryNonValida):
+    """Cursor di uno snapshot precedente: dopo una ricarica l'offset indica un'altra posizione."""
+
+
+class IndiceBandi:
+    """Indici invertiti per campo + ordinamenti precalcolati su una lista di Bando."""
+
+    CAMPI = ("categoria", "regione", "stato")
+
+    def __init__(self, bandi, versione=""):
+        self.bandi = bandi
+        self.versione = versione  # scritta nei cursor: vale solo per questo snapshot
+        self.indici = {nome: {} for nome in self.CAMPI}
+        self.indici["ente"] = {}
+
+        for pos, bando in enumerate(bandi):
+            for nome in self.CAMPI:
+                valore = getattr(bando, nome)
+                if valore is not None:
+                    self.indici[nome].setdefault(str(valore).lower(), []).append(pos)
+
+            for gruppo in _gruppi_ente(bando.ente):
+                self.indici["ente"].setdefault(gruppo, []).append(pos)
+
+        self.testo = IndiceTestuale(bandi)
+        self.ordini = self._calcola_ordini()
+        self._rank_cache = {}
+
+    # ---------- Ordinamenti ----------
+    def _chiave_ordinamento(self, nome, bando):
+        if nome == "scadenza":
+            return bando.scadenza
+        if nome == "pubblicato":
+            return bando.pubblicato
+        if nome == "titolo":
+            return (bando.titolo or "").lower() or None
+        if nome == "importo":
+            return bando.importo if isinstance(bando.importo, (int, float)) else None
+        raise KeyError(nome)
+
+    def _calcola_ordini(self):
+        """Per ogni chiave, posizioni ordinate asc/desc con i valori mancanti sempre in coda."""
+        ordini = {}
+        for nome in ORDINAMENTI:
+            chiavi = [(self._chiave_ordinamento(nome, b), pos) for pos, b in enumerate(self.bandi)]
+            presenti = sorted(c for c in chiavi if c[0] is not None)
+            mancanti = [pos for v, pos in chiavi if v is None]
+            asc = [pos for _, pos in presenti] + mancanti
+            desc = [pos for _, pos in reversed(presenti)] + mancanti
+            ordini[nome] = asc
+            ordini["-" + nome] = desc
+        return ordini
+
+    # ---------- Query ----------
+    def filtra(self, filtri):
+        """Posizioni che soddisfano tutti i filtri (None se nessun filtro è attivo)."""
+        candidati = None
+        for nome, valore in (filtri or {}).items():
+            if not valore:
+                continue
+            if nome not in self.indici:
+                raise QueryNonValida(f"filtro non supportato: {nome}")
+            posizioni = set(self.indici[nome].get(str(valore).lower(), ()))
+            candidati = posizioni if candidati is None else candidati & posizioni
+        return candidati
+
+    def cerca(self, filtri=None, q=None, sort=None, limit=LIMIT_DEFAULT, cursor=None):
+        """
+        Restituisce (pagina, totale, next_cursor).
+
+        filtri: dict campo -> valore (categoria, regione, stato, ente)
+        sort:   una di ORDINAMENTI, con '-' davanti per l'ordine decrescente
+        """
+        if limit < 1 or limit > LIMIT_MAX:
+            raise QueryNonValida(f"limit deve essere tra 1 e {LIMIT_MAX}")
+        if sort and sort not in self.ordini:
+            raise QueryNonValida(f"sort non supportato: {sort}")
+        offset = decodifica_cursor(cursor, self.versione)
+
+        candidati = self.filtra(filtri)
+        if q:
+            testo = self.testo.posizioni(q)
+            candidati = testo if candidati is None else candidati & testo
+
+        if candidati is None:
+            ordine = self.ordini[sort] if sort else range(len(self.bandi))
+            totale = len(self.bandi)
+            pagina_pos = list(ordine[offset:offset + limit])
+        else:
+            totale = len(candidati)
+            if sort:
+                ordine = self.ordini[sort]
+                if totale * 4 < len(ordine):
+                    rank = self._rank(sort)
+                    ordinati = sorted(candidati, key=rank.__getitem__)
+                else:
+                    ordinati = [pos for pos in ordine if pos in candidati]
+            else:
+                ordinati = sorted(candidati)
+            pagina_pos = ordinati[offset:offset + limit]
+
+        fine = offset + len(pagina_pos)
+        next_cursor = codifica_cursor(fine, self.versione) if fine < totale else None
+        return [self.bandi[pos] for pos in pagina_pos], totale, next_cursor
+
+    def _rank(self, sort):
+        if sort not in self._rank_cache:
+            rank = [0] * len(self.bandi)
+            for i, pos in enumerate(self.ordini[sort]):
+                rank[pos] = i
+            self._rank_cache[sort] = rank
+        return self._rank_cache[sort]
+
+
+def codifica_cursor(offset, versione=""):
+    return base64.urlsafe_b64encode(f"o:{versione}:{offset}".encode()).decode().rstrip("=")
+
+
+def decodifica_cursor(cursor, versione=""):
+    if not cursor:
+        return 0
+    try:
+        padding = "=" * (-len(cursor) % 4)
+        testo = base64.urlsafe_b64decode(cursor + padding).decode()
+        prefisso, versione_cursor, valore = testo.split(":")
+        offset = int(valore)
+        if prefisso != "o" or offset < 0:
+            raise ValueError
+    except (ValueError, UnicodeDecodeError):
+        raise QueryNonValida("cursor non valido")
+    if versione_cursor != versione:
+        raise CursorScaduto("cursor scaduto: il catalogo è stato aggiornato, ricomincia dalla prima pagina")
+    return offset
@@ -1,41 +1,100 @@
-import requests
+from concurrent.futures import ThreadPoolExecutor
+from http_client import client_condiviso
+from metriche import METRICHE
 
 class InPAScraper:
     BASE_URL = "https://portale.inpa.gov.it/concorsi-smart/api/concorso-public-area/search-better"
-    PAGE_SIZE = 4  # massimo accettato da InPA
-
-    def scrape_bandi_list(self, max_pages=10):
-        bandi = []
-        headers = {'Content-Type': 'application/json'}
-        for page in range(max_pages):
-            r = None  # inizializza r per sicurezza
-            params = {"page": page, "size": self.PAGE_SIZE}
-            payload = {}
+    DETTAGLIO_URL = "https://www.inpa.gov.it/bandi-e-avvisi/dettaglio-bando-avviso/?concorso_id={}"
+    PAGE_SIZE = 4  # massimo accettato da InPA (fallback se le size più grandi vengono rifiutate)
+    PAGE_SIZE_CANDIDATI = (100, 50, 20)  # provate in ordine prima di ripiegare su PAGE_SIZE
+    MAX_IN_VOLO = 6  # richieste concorrenti verso InPA
+    MAX_PAGINE = 1000  # tetto di sicurezza se totalPages è assurdo
+    TIMEOUT = 15
+
+    def __init__(self):
+        # Pool keep-alive, rate limit e retry su 429/5xx sono nel client condiviso
+        self.http = client_condiviso()
+
+    def _post_pagina(self, page, size):
+        """POST su search-better"""
+        r = self.http.post(self.BASE_URL, params={"page": page, "size": size}, json={}, timeout=self.TIMEOUT)
+        r.raise_for_status()
+        with METRICHE.tempo_parsing("InPA"):
+            return r.json()
+
+    def _sonda_page_size(self):
+        """
+        Prova le page size più grandi sulla pagina 0: una size è accettata se il
+        server la rispetta (campo `size` o più di PAGE_SIZE risultati).
+        Restituisce (size, prima_pagina) per non ripetere la richiesta.
+        """
+        for size in self.PAGE_SIZE_CANDIDATI:
             try:
-                r = requests.post(self.BASE_URL, params=params, json=payload, headers=headers, timeout=15)
-                r.raise_for_status()
-                data = r.json()
-                content = data.get("content", [])
+                data = self._post_pagina(0, size)
+            except Exception as e:
+                print(f"InPA: page size {size} rifiutata ({e})")
+                continue
+            content = data.get("content") or []
+            if data.get("size") == size or len(content) > self.PAGE_SIZE:
+                return size, data
+        return self.PAGE_SIZE, self._post_pagina(0, self.PAGE_SIZE)
+
+    def _mappa_titoli(self, content):
+        with METRICHE.tempo_parsing("InPA"):
+            for bando in content:
+                titolo = bando.get('titolo') or bando.get('descrizioneBreve') or bando.get('descrizione') or 'Senza titolo'
+                bando['titolo'] = titolo.strip() if titolo else 'Senza titolo'
+                if bando.get('id') and not bando.get('link'):
+                    bando['link'] = self.DETTAGLIO_URL.format(bando['id'])
+                bando.setdefault('fonte', 'inpa')
+        return content
+
+    def _scarica_pagina(self, page, size):
+        try:
+            content = self._post_pagina(page, size).get("content", [])
+            print(f"Pagina {page}: {len(content)} bandi trovati")
+            return self._mappa_titoli(content)
+        except Exception as e:
+            print(f"⚠️ Errore InPA pagina {page}: {e}")
+            return []
+
+    def iter_bandi(self, max_pages=None):
+        """
+        Genera i bandi pagina per pagina: scarica la pagina 0 (sondando la page
+        size), legge totalPages e scarica le restanti in parallelo con al massimo
+        MAX_IN_VOLO richieste, emettendo ogni pagina appena è disponibile.
+        """
+        try:
+            size, prima = self._sonda_page_size()
+        except Exception as e:
+            print(f"⚠️ Errore InPA pagina 0: {e}")
+            return
+
+        content = self._mappa_titoli(prima.get("content", []))
+        print(f"Pagina 0: {len(content)} bandi trovati (page size {size})")
+        if not content:
+            return
+        yield from content
+        trovati = len(content)
+
+        limite = min(max_pages or self.MAX_PAGINE, self.MAX_PAGINE)
+        totale_pagine = prima.get("totalPages")
+        if totale_pagine is None:
+            # Risposta senza metadati di paginazione: si procede in sequenza fino a pagina vuota
+            for page in range(1, limite):
+                content = self._scarica_pagina(page, size)
                 if not content:
                     break
-    
-                # Mappatura titolo
-                for bando in content:
-                    titolo = bando.get('titolo') or bando.get('descrizioneBreve') or bando.get('descrizione') or 'Senza titolo'
-                    bando['titolo'] = titolo.strip() if titolo else 'Senza titolo'
-                    bandi.append(bando)
-    
-                print(f"Pagina {page}: {len(content)} bandi trovati")
-    
-            except Exception as e:
-                testo = ""
-                if r is not None:
-                    try:
-                        testo = r.text[:300]
-                    except:
-                        pass
-                print(f"⚠️ Errore InPA pagina {page}: {e}; risposta parziale: {testo}")
-                break
-    
-        return bandi
+                yield from content
+            return
+
+        pagine = range(1, min(int(totale_pagine), limite))
+        with ThreadPoolExecutor(max_workers=self.MAX_IN_VOLO) as pool:
+            for content in pool.map(lambda p: self._scarica_pagina(p, size), pagine):
+                trovati += len(content)
+                yield from content
+
+        print(f"InPA: {trovati} bandi da {len(pagine) + 1}/{totale_pagine} pagine")
 
+    def scrape_bandi_list(self, max_pages=None):
+        return list(self.iter_bandi(max_pages))
@@ -1,11 +1,59 @@
+import queue
 import re
-import time
-import json
-import os
-import requests
-from bs4 import BeautifulSoup
+from lxml import etree
+from concurrent.futures import ThreadPoolExecutor
 from urllib.parse import urljoin, urlparse
 from datetime import datetime
+from http_client import client_condiviso
+from cache_http import CacheHttp
+from metriche import METRICHE
+
+
+# Blocchi candidati a card (come "article, .card, .teaser, li, .list-item") e
+# sotto-elementi cercati al loro interno: confronti su tag/classi lxml invece
+# di selettori CSS interpretati elemento per elemento
+CLASSI_BLOCCO = frozenset(("card", "teaser", "list-item"))
+CLASSI_TITOLO = frozenset(("card__title", "teaser__title"))
+CLASSI_TESTO = frozenset(("teaser__text", "card__text"))
+
+
+def _classi(el):
+    return (el.get("class") or "").split()
+
+
+def _is_blocco(el):
+    return el.tag in ("article", "li") or not CLASSI_BLOCCO.isdisjoint(_classi(el))
+
+
+def _is_titolo(el):
+    return el.tag in ("h2", "h3", "a") or not CLASSI_TITOLO.isdisjoint(_classi(el))
+
+
+def _is_testo(el):
+    return el.tag == "p" or not CLASSI_TESTO.isdisjoint(_classi(el))
+
+
+def _testo(el):
+    """Come get_text(" ", strip=True) di BeautifulSoup: frammenti ripuliti uniti da spazi."""
+    return " ".join(t.strip() for t in el.itertext() if t.strip())
+
+
+_PARSER_HTML = etree.HTMLParser()
+
+
+def albero(testo_html):
+    """
+    Parsing lxml della pagina, senza script, style e commenti (come il testo visto
+    da bs4). Parser etree semplice: niente lookup delle classi di lxml.html per elemento.
+    """
+    try:
+        root = etree.fromstring(testo_html, _PARSER_HTML)
+    except ValueError:  # stringa con dichiarazione di encoding XML
+        root = etree.fromstring(testo_html.encode("utf-8"), _PARSER_HTML)
+    if root is None:  # documento vuoto
+        return etree.Element("html")
+    etree.strip_elements(root, "script", "style", etree.Comment, with_tail=False)
+    return root
 
 
 class InvitaliaScraper:
@@ -21,23 +69,30 @@ class InvitaliaScraper:
     HREF_BLOCK = ("privacy", "cookie", "contatti", "trasparenza", "urp", "newsletter", "login", "accedi", "press", "mappa")
     PATH_ALLOW = (r"/incentivi", r"/agevolaz", r"/bando", r"/bandi", r"/misur", r"/finanziam")
 
+    # Le liste sopra compilate una volta in un'unica alternanza ciascuna
+    _STATUS_RE = re.compile("|".join(map(re.escape, STATUS_TOKENS)))
+    # Stessi token sul testo grezzo (frammenti concatenati senza separatori): mai falsi negativi
+    _STATUS_GREZZO_RE = re.compile("|".join(re.escape(t).replace(r"\ ", r"\s*") for t in STATUS_TOKENS), re.I)
+    _TITLE_BLOCK_RE = re.compile("|".join(map(re.escape, TITLE_BLOCK)))
+    _HREF_BLOCK_RE = re.compile("|".join(map(re.escape, HREF_BLOCK)))
+    _PATH_ALLOW_RE = re.compile("|".join(PATH_ALLOW), re.I)
+    _SPAZI_RE = re.compile(r"\s+")
+    _PREFISSO_TITOLO_RE = re.compile(r"^\s*(leggi\s+tutto(\s+su)?|scopri(?:\s+tutto)?)\s*:?\s*", re.I)
+    _DATA_RE = re.compile(r"\b(\d{2}[\/\.\-]\d{2}[\/\.\-]\d{4})\b")
+
     TIMEOUT = 25
     MIN_TITLE = 10
     MIN_SNIPPET = 40
 
     def __init__(self):
-        self.sess = requests.Session()
-        self.sess.headers.update({"User-Agent": "Mozilla/5.0 (BandiItaliaBot/1.0)"})
-        self.manual_file = "data/manual_overrides.json"  # ✅ file override
+        self.http = client_condiviso()  # keep-alive e rate limit per host (niente sleep fissi)
 
     # ---------- Utils ----------
     def _clean(self, s: str) -> str:
-        return re.sub(r"\s+", " ", (s or "").strip())
+        return self._SPAZI_RE.sub(" ", (s or "").strip())
 
     def _sanitize_title(self, t: str) -> str:
-        t = self._clean(t)
-        t = re.sub(r"^\s*(leggi\s+tutto(\s+su)?|scopri(?:\s+tutto)?)\s*:?\s*", "", t, flags=re.I)
-        return re.sub(r"\s{2,}", " ", t).strip()
+        return self._PREFISSO_TITOLO_RE.sub("", self._clean(t), count=1).strip()
 
     def _is_valid_link(self, url: str) -> bool:
         if not url or not url.startswith("http"):
@@ -45,20 +100,19 @@ class InvitaliaScraper:
         u = urlparse(url)
         if "invitalia.it" not in u.netloc:
             return False
-        if any(x in url.lower() for x in self.HREF_BLOCK):
+        if self._HREF_BLOCK_RE.search(url.lower()):
             return False
-        return any(re.search(p, u.path, re.I) for p in self.PATH_ALLOW)
+        return self._PATH_ALLOW_RE.search(u.path) is not None
 
     def _has_status_tokens(self, text: str) -> bool:
-        low = (text or "").lower()
-        return any(tok in low for tok in self.STATUS_TOKENS)
+        return self._STATUS_RE.search((text or "").lower()) is not None
 
-    def _parse_dates(self, text: str) -> tuple[str | None, str | None]:
+    def _parse_dates(self, text: str, low: str | None = None) -> tuple[str | None, str | None]:
         open_dt = close_dt = None
         if not text:
             return None, None
-        low = text.lower()
-        dates = re.findall(r"\b(\d{2}[\/\.\-]\d{2}[\/\.\-]\d{4})\b", text)
+        low = low if low is not None else text.lower()
+        dates = self._DATA_RE.findall(text)
         if "data apertura" in low or "in apertura" in low:
             open_dt = dates[0] if dates else None
         if "data chiusura" in low or "chius" in low:
@@ -67,97 +121,119 @@ class InvitaliaScraper:
             open_dt = dates[0]
         return open_dt, close_dt
 
-    def _extract_snippet(self, card) -> str:
+    def _extract_snippet(self, card, raw_text: str | None = None) -> str:
         texts = []
-        for p in card.select("p, .teaser__text, .card__text"):
-            t = self._clean(p.get_text(" ", strip=True))
-            if t and not t.lower().startswith(("scopri", "segui")):
-                texts.append(t)
+        for p in card.iterdescendants():
+            if _is_testo(p):
+                t = self._clean(_testo(p))
+                if t and not t.lower().startswith(("scopri", "segui")):
+                    texts.append(t)
         if not texts:
-            texts = [self._clean(card.get_text(" ", strip=True))]
+            texts = [raw_text if raw_text is not None else self._clean(_testo(card))]
         snippet = self._clean(" ".join(texts))
         return snippet[:600]
 
     def _extract_title(self, card) -> str:
-        title_el = card.select_one("h2, h3, .card__title, .teaser__title, a")
-        raw = self._clean(title_el.get_text(" ", strip=True) if title_el else "")
+        title_el = next((el for el in card.iterdescendants() if _is_titolo(el)), None)
+        raw = self._clean(_testo(title_el) if title_el is not None else "")
         return self._sanitize_title(raw)
 
-    def _find_next_page(self, soup, current_url: str) -> str | None:
-        a = soup.select_one("a[rel='next']")
-        if a and a.get("href"):
-            return urljoin(current_url, a["href"])
-        for cand in soup.select("a[href]"):
-            txt = self._clean(cand.get_text(" ", strip=True)).lower()
-            aria = (cand.get("aria-label") or "").lower()
-            if "successiv" in txt or "successiv" in aria or "pagina successiva" in aria:
-                return urljoin(current_url, cand.get("href"))
-        for cand in soup.select("a[href*='page=']"):
-            return urljoin(current_url, cand.get("href"))
-        return None
-
-    # ---------- Manual overrides ----------
-    def _carica_override(self):
-        """Carica eventuali descrizioni brevi o aggiornamenti manuali."""
-        if os.path.exists(self.manual_file):
-            try:
-                with open(self.manual_file, "r", encoding="utf-8") as f:
-                    return json.load(f)
-            except Exception as e:
-                print(f"[InvitaliaScraper] ⚠️ Errore lettura manual_overrides.json: {e}")
-        return {}
+    def _find_next_page(self, root, current_url: str) -> str | None:
+        """rel=next, altrimenti un link "successiva", altrimenti il primo con page= (una sola visita)."""
+        rel_next = root.xpath('//a[@href][contains(concat(" ", normalize-space(@rel), " "), " next ")]')
+        if rel_next:
+            return urljoin(current_url, rel_next[0].get("href"))
+        successiva = con_page = None
+        for cand in root.iter("a"):
+            href = cand.get("href")
+            if href is None:
+                continue
+            if successiva is None:
+                txt = self._clean(_testo(cand)).lower()
+                aria = (cand.get("aria-label") or "").lower()
+                if "successiv" in txt or "successiv" in aria:
+                    successiva = href
+            if con_page is None and "page=" in href:
+                con_page = href
+        scelto = successiva or con_page
+        return urljoin(current_url, scelto) if scelto is not None else None
 
     # ---------- Listing parsing ----------
-    def _extract_cards_from_listing(self, soup, base_url: str, overrides: dict) -> list[dict]:
-        results = []
-        blocks = soup.select("article, .card, .teaser, li, .list-item")
-        for b in blocks:
-            raw_text = self._clean(b.get_text(" ", strip=True))
-            if not self._has_status_tokens(raw_text):
+    def _blocchi(self, root, ancore_usate):
+        """
+        Visita in ordine di documento dei blocchi candidati con primo link e testo,
+        calcolato una volta. Se il testo di un blocco non contiene token di stato non
+        può contenerli nemmeno un blocco annidato: il sottoalbero viene saltato (menu,
+        footer). I blocchi senza link o con un link già usato non sono emessi.
+        """
+        pila = [iter(root)]
+        while pila:
+            el = next(pila[-1], None)
+            if el is None:
+                pila.pop()
                 continue
-            title = self._extract_title(b)
-            if len(title) < self.MIN_TITLE or any(x in title.lower() for x in self.TITLE_BLOCK):
+            if not isinstance(el.tag, str):
                 continue
-            a = b.select_one("a[href]")
-            if not a:
+            if _is_blocco(el):
+                # Filtro rapido in C sul testo grezzo prima di costruire il testo ripulito
+                grezzo = etree.tostring(el, method="text", encoding="unicode", with_tail=False)
+                if not self._STATUS_GREZZO_RE.search(grezzo):
+                    continue
+                a = next((a for a in el.iterdescendants("a") if a.get("href") is not None), None)
+                if a is not None and a not in ancore_usate:
+                    raw_text = self._clean(_testo(el))
+                    low = raw_text.lower()
+                    if not self._STATUS_RE.search(low):
+                        continue
+                    yield el, a, raw_text, low
+            pila.append(iter(el))
+
+    def _extract_cards_from_listing(self, root, base_url: str) -> list[dict]:
+        """
+        Una visita dell'albero lxml (vedi _blocchi). Un blocco annidato il cui primo
+        link è già stato usato da un blocco esterno accettato (li > article.card
+        della stessa card) è un duplicato e viene saltato.
+        """
+        results = []
+        ancore_usate = set()
+        fallback = None
+        for b, a, raw_text, low in self._blocchi(root, ancore_usate):
+            title = self._extract_title(b)
+            if len(title) < self.MIN_TITLE or self._TITLE_BLOCK_RE.search(title.lower()):
                 continue
             href = a.get("href", "")
             link = href if href.startswith("http") else urljoin(base_url, href)
             if not self._is_valid_link(link):
                 continue
+            ancore_usate.add(a)
 
-            snippet = self._extract_snippet(b)
+            snippet = self._extract_snippet(b, raw_text)
             if len(snippet) < self.MIN_SNIPPET:
-                ps = soup.select("main p, article p")
-                if ps:
-                    snippet = self._clean(" ".join(p.get_text(" ", strip=True) for p in ps[:3]))[:600]
+                if fallback is None:
+                    ps = root.xpath("//main//p | //article//p")  # uguale per tutta la pagina: calcolato una volta
+                    fallback = self._clean(" ".join(_testo(p) for p in ps[:3]))[:600] if ps else ""
+                if fallback:
+                    snippet = fallback
 
-            open_dt, close_dt = self._parse_dates(raw_text)
+            open_dt, close_dt = self._parse_dates(raw_text, low)
             deadline = close_dt or open_dt or "A sportello"
 
             status = "aperto"
-            low = raw_text.lower()
             if "in apertura" in low:
                 status = "scadenza"
             elif "chiuso" in low:
                 status = "chiuso"
 
-            # 🔄 Applica override se presente
-            override = overrides.get(title) or overrides.get(link) or {}
-            descrizione_breve = override.get("descrizione_breve", "")
-            importo = override.get("importo", 0)
-            scadenza = override.get("scadenza", deadline)
-
+            # Gli override manuali (descrizione breve, importo, scadenza) li applica la pipeline
             results.append({
-                "id": abs(hash(link)),
                 "titolo": title,
                 "categoria": "imprese",
                 "regione": "nazionale",
                 "ente": "Invitalia",
                 "descrizione": snippet,
-                "descrizione_breve": descrizione_breve,
-                "importo": importo,
-                "scadenza": scadenza,
+                "descrizione_breve": "",
+                "importo": 0,
+                "scadenza": deadline,
                 "pubblicato": datetime.utcnow().strftime("%Y-%m-%d"),
                 "link": link,
                 "fonte": "invitalia",
@@ -165,40 +241,80 @@ class InvitaliaScraper:
             })
         return results
 
-    def scrape_listing(self, start_url: str, max_pages: int = 30, sleep_sec: float = 0.5, overrides=None) -> list[dict]:
-        out, seen = [], set()
+    def _pagine_listing(self, start_url: str, max_pages: int, cache):
+        """
+        Genera le card di un elenco una pagina alla volta, seguendo solo il link
+        "successivo" della pagina (nessuna richiesta per pagine che non esistono).
+        """
         url = start_url
         pages = 0
         while url and pages < max_pages:
-            r = self.sess.get(url, timeout=self.TIMEOUT)
-            r.raise_for_status()
-            soup = BeautifulSoup(r.text, "lxml")
-            items = self._extract_cards_from_listing(soup, url, overrides)
+            pagina = cache.get(url, timeout=self.TIMEOUT)
+            pages += 1
+
+            if pagina.invariata:
+                items, next_url = pagina.estratto["items"], pagina.estratto["next"]
+            else:
+                with METRICHE.tempo_parsing("Invitalia"):
+                    root = albero(pagina.risposta.text)
+                    items = self._extract_cards_from_listing(root, url)
+                    next_url = self._find_next_page(root, url)
+                cache.salva_estratto(pagina, {"items": items, "next": next_url})
+
+            yield items
+            url = next_url
+
+    def iter_listing(self, start_url: str, max_pages: int = 30, cache=None, seen=None):
+        """Genera le card di un elenco pagina per pagina, saltando i link già in `seen`."""
+        seen = set() if seen is None else seen
+        cache = cache or CacheHttp(client=self.http)
+        for items in self._pagine_listing(start_url, max_pages, cache):
             for it in items:
                 if it["link"] in seen:
                     continue
                 seen.add(it["link"])
-                out.append(it)
-            url = self._find_next_page(soup, url)
-            pages += 1
-            time.sleep(sleep_sec)
-        return out
+                yield it
+
+    def scrape_listing(self, start_url: str, max_pages: int = 30, cache=None) -> list[dict]:
+        return list(self.iter_listing(start_url, max_pages=max_pages, cache=cache))
+
+    def iter_bandi(self, max_pages_per_list: int = 30):
+        """
+        Genera i bandi di tutti gli entrypoint, scansionati in parallelo (un
+        worker per elenco, che scarica la pagina successiva mentre qui si emettono
+        le card delle precedenti). Ogni elenco ha la sua coda e le code si
+        svuotano nell'ordine di ENTRYPOINTS: a parità di link vince sempre la card
+        del primo elenco, come nella scansione sequenziale, e l'output non dipende
+        da quale thread arriva prima. Il deduplica avviene qui, in un unico insieme
+        condiviso tra gli elenchi.
+        """
+        cache = CacheHttp(client=self.http)
+        code = [queue.Queue() for _ in self.ENTRYPOINTS]
+        seen = set()
+
+        def scansiona(url, pagine):
+            try:
+                for items in self._pagine_listing(url, max_pages_per_list, cache):
+                    pagine.put(items)
+            except Exception as e:
+                print(f"[InvitaliaScraper] ⚠️ Errore su {url}: {e}")
+            finally:
+                pagine.put(None)  # elenco finito
+
+        with ThreadPoolExecutor(max_workers=len(self.ENTRYPOINTS)) as pool:
+            for ep, pagine in zip(self.ENTRYPOINTS, code):
+                pool.submit(scansiona, urljoin(self.BASE, ep), pagine)
+            for pagine in code:
+                for items in iter(pagine.get, None):
+                    for it in items:
+                        if it["link"] in seen:
+                            continue
+                        seen.add(it["link"])
+                        yield it
+        print(f"[InvitaliaScraper] ✅ {len(seen)} bandi unici trovati.")
 
     def scrape_incentivi(self, max_pages_per_list: int = 30) -> list[dict]:
-        overrides = self._carica_override()
-        all_items = []
-        for ep in self.ENTRYPOINTS:
-            url = urljoin(self.BASE, ep)
-            all_items.extend(self.scrape_listing(url, max_pages=max_pages_per_list, overrides=overrides))
-        # dedup finale
-        seen, dedup = set(), []
-        for r in all_items:
-            if r["link"] in seen:
-                continue
-            seen.add(r["link"])
-            dedup.append(r)
-        print(f"[InvitaliaScraper] ✅ {len(dedup)} bandi unici trovati (su {len(all_items)} totali).")
-        return dedup
+        return list(self.iter_bandi(max_pages_per_list))
 
 
 if __name__ == "__main__":
@@ -57,12 +57,14 @@ class MasterScraper:
         
         # Salva in database
         print(f"💾 Salvataggio {len(all_bandi)} bandi in database...")
-        new_bandi_count = self.db.save_bandi(all_bandi)
+        esito = self.db.save_bandi(all_bandi)
         
         print(f"\n{'='*70}")
         print(f"✅ Scraping completato!")
         print(f"   Totale bandi trovati: {len(all_bandi)}")
-        print(f"   Nuovi bandi aggiunti: {new_bandi_count}")
+        print(f"   Nuovi bandi aggiunti: {esito['inseriti']}")
+        print(f"   Bandi aggiornati: {esito['aggiornati']} (invariati: {esito['invariati']})")
+        print(f"   Bandi in quarantena: {esito['quarantena']}")
         print(f"   Timestamp: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
         print(f"{'='*70}\n")
         
@@ -0,0 +1,222 @@
+"""
+Metriche - Strumentazione del refresh dei bandi
+
+Contatori del processo che esegue la pipeline, aggiornati mentre gira:
+- per host (http_client): richieste, byte, retry, errori di rete, risposte per
+  classe di status, secondi di fetch e di attesa del rate limit;
+- per sorgente (scraper): secondi spesi a fare il parsing delle risposte;
+- per stadio della pipeline: secondi esclusivi (al netto degli stadi a monte).
+
+genera_database_bandi unisce questi contatori al report di FlussoSorgenti e
+scrive il riepilogo in data/ultimo_run.json; l'API server, che lancia il
+refresh in un sottoprocesso, lo legge da lì e lo espone su /metrics in
+formato Prometheus.
+"""
+
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+ULTIMO_RUN_FILE = os.path.join("data", "ultimo_run.json")
+
+
+def _nuovo_host():
+    return {"richieste": 0, "retry": 0, "errori": 0, "byte": 0,
+            "secondi_fetch": 0.0, "secondi_attesa": 0.0, "risposte": {}}
+
+
+class Metriche:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.azzera()
+
+    def azzera(self):
+        with self._lock:
+            self.inizio = time.time()
+            self._http = {}
+            self._parsing = {}
+            self._stadi = {}  # nome -> secondi inclusivi, in ordine dalla sorgente verso valle
+            self._sorgenti = []
+
+    # ---------- Registrazione ----------
+    def registra_http(self, host, secondi, attesa=0.0, byte=0, status=None, retry=False):
+        """Un tentativo HTTP verso `host` (status None = errore di rete)."""
+        with self._lock:
+            h = self._http.get(host)
+            if h is None:
+                h = self._http[host] = _nuovo_host()
+            h["richieste"] += 1
+            h["retry"] += retry
+            h["byte"] += byte
+            h["secondi_fetch"] += secondi
+            h["secondi_attesa"] += attesa
+            if status is None:
+                h["errori"] += 1
+            else:
+                classe = f"{status // 100}xx"
+                h["risposte"][classe] = h["risposte"].get(classe, 0) + 1
+
+    @contextmanager
+    def tempo_parsing(self, sorgente):
+        """Somma ai secondi di parsing di `sorgente` il tempo del blocco (thread-safe)."""
+        inizio = time.perf_counter()
+        try:
+            yield
+        finally:
+            trascorso = time.perf_counter() - inizio
+            with self._lock:
+                self._parsing[sorgente] = self._parsing.get(sorgente, 0.0) + trascorso
+
+    def registra_sorgenti(self, report):
+        """Report di FlussoSorgenti a fine flusso (stato, bandi, secondi per sorgente)."""
+        with self._lock:
+            self._sorgenti = [dict(voce) for voce in report]
+
+    def cronometra(self, nome, iterabile):
+        """Avvolge uno stadio della pipeline misurando il tempo speso nei suoi next()."""
+        with self._lock:
+            self._stadi.setdefault(nome, 0.0)
+        return self._cronometro(nome, iter(iterabile))
+
+    def _cronometro(self, nome, iteratore):
+        while True:
+            inizio = time.perf_counter()
+            try:
+                elemento = next(iteratore)
+            except StopIteration:
+                self._stadi[nome] += time.perf_counter() - inizio
+                return
+            self._stadi[nome] += time.perf_counter() - inizio
+            yield elemento
+
+    # ---------- Riepilogo ----------
+    def riepilogo(self, **extra):
+        """Dizionario serializzabile del run in corso (o appena finito); `extra` si aggiunge in cima."""
+        with self._lock:
+            parsing = dict(self._parsing)
+            sorgenti = {}
+            for voce in self._sorgenti:
+                voce = dict(voce)
+                voce["secondi_parsing"] = round(parsing.pop(voce["sorgente"], 0.0), 3)
+                sorgenti[voce.pop("sorgente")] = voce
+            for nome, secondi in parsing.items():  # scraper usati fuori da FlussoSorgenti
+                sorgenti[nome] = {"secondi_parsing": round(secondi, 3)}
+
+            stadi, precedente = {}, 0.0
+            for nome, inclusivi in self._stadi.items():
+                stadi[nome] = round(max(inclusivi - precedente, 0.0), 3)
+                precedente = inclusivi
+
+            http = {}
+            for host, h in self._http.items():
+                http[host] = dict(h, risposte=dict(h["risposte"]),
+                                  secondi_fetch=round(h["secondi_fetch"], 3),
+                                  secondi_attesa=round(h["secondi_attesa"], 3))
+
+        fine = time.time()
+        return dict({
+            "inizio": round(self.inizio, 3),
+            "fine": round(fine, 3),
+            "secondi": round(fine - self.inizio, 2),
+            "sorgenti": sorgenti,
+            "http": http,
+            "stadi": stadi,
+        }, **extra)
+
+
+# Contatori unici per processo, come il client HTTP condiviso
+METRICHE = Metriche()
+
+
+def salva_ultimo_run(riepilogo, percorso=ULTIMO_RUN_FILE):
+    """Scrittura atomica: l'API server non legge mai un file a metà."""
+    os.makedirs(os.path.dirname(percorso) or ".", exist_ok=True)
+    tmp = f"{percorso}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(riepilogo, f, ensure_ascii=False, indent=2)
+    os.replace(tmp, percorso)
+
+
+def leggi_ultimo_run(percorso=ULTIMO_RUN_FILE):
+    """Riepilogo dell'ultimo refresh, None se non c'è (o non è leggibile)."""
+    try:
+        with open(percorso, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+# ---------- Formato Prometheus ----------
+def _valore_etichetta(valore):
+    return str(valore).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _etichette(**etichette):
+    if not etichette:
+        return ""
+    return "{" + ",".join(f'{k}="{_valore_etichetta(v)}"' for k, v in etichette.items()) + "}"
+
+
+class _Esposizione:
+    """Campioni raggruppati per metrica, come vuole il formato testuale di Prometheus."""
+
+    def __init__(self):
+        self._famiglie = {}
+
+    def metrica(self, nome, aiuto, valore, **etichette):
+        if valore is None:
+            return
+        valore = float(valore)
+        testo = str(int(valore)) if valore.is_integer() else repr(valore)
+        campioni = self._famiglie.setdefault(nome, (aiuto, []))[1]
+        campioni.append(f"{nome}{_etichette(**etichette)} {testo}")
+
+    def testo(self):
+        righe = []
+        for nome, (aiuto, campioni) in self._famiglie.items():
+            righe += [f"# HELP {nome} {aiuto}", f"# TYPE {nome} gauge", *campioni]
+        return "\n".join(righe) + "\n"
+
+
+def formato_prometheus(riepilogo, extra=()):
+    """
+    Testo per /metrics. Sono gauge: valgono per l'ultimo run, non si accumulano
+    tra run. `extra` aggiunge (nome, aiuto, valore, etichette) del processo chiamante.
+    """
+    e = _Esposizione()
+    for nome, aiuto, valore, etichette in extra:
+        e.metrica(nome, aiuto, valore, **etichette)
+    if not riepilogo:
+        return e.testo()
+
+    e.metrica("bandi_run_fine_timestamp", "Fine dell'ultimo refresh (epoch)", riepilogo.get("fine"))
+    e.metrica("bandi_run_secondi", "Durata dell'ultimo refresh", riepilogo.get("secondi"))
+    e.metrica("bandi_run_bandi", "Bandi prodotti dall'ultimo refresh", riepilogo.get("bandi"))
+    e.metrica("bandi_run_ok", "1 se l'ultimo refresh è terminato senza eccezioni", riepilogo.get("esito") != "errore")
+
+    for nome, s in riepilogo.get("sorgenti", {}).items():
+        e.metrica("bandi_sorgente_bandi", "Bandi emessi dalla sorgente", s.get("bandi"), sorgente=nome)
+        e.metrica("bandi_sorgente_secondi", "Durata della sorgente (dall'avvio all'ultimo bando)", s.get("secondi"),
+                  sorgente=nome)
+        e.metrica("bandi_sorgente_parsing_secondi", "Secondi di parsing delle risposte", s.get("secondi_parsing"),
+                  sorgente=nome)
+        if s.get("stato"):
+            e.metrica("bandi_sorgente_stato", "Esito della sorgente (ok, errore, timeout)", 1,
+                      sorgente=nome, stato=s["stato"])
+
+    for host, h in riepilogo.get("http", {}).items():
+        e.metrica("bandi_http_richieste", "Tentativi HTTP inviati", h["richieste"], host=host)
+        e.metrica("bandi_http_retry", "Tentativi ripetuti dopo errori o 429/5xx", h["retry"], host=host)
+        e.metrica("bandi_http_errori_rete", "Tentativi falliti per errore di rete o timeout", h["errori"], host=host)
+        e.metrica("bandi_http_byte", "Byte ricevuti (corpo delle risposte)", h["byte"], host=host)
+        e.metrica("bandi_http_fetch_secondi", "Secondi spesi in attesa delle risposte", h["secondi_fetch"], host=host)
+        e.metrica("bandi_http_attesa_limite_secondi", "Secondi di attesa del rate limit", h["secondi_attesa"],
+                  host=host)
+        for classe, n in h.get("risposte", {}).items():
+            e.metrica("bandi_http_risposte", "Risposte per classe di status", n, host=host, classe=classe)
+
+    for nome, secondi in riepilogo.get("stadi", {}).items():
+        e.metrica("bandi_stadio_secondi", "Secondi esclusivi dello stadio della pipeline", secondi, stadio=nome)
+    return e.testo()
@@ -3,30 +3,39 @@ Scraper per MIMIT (Ministero Imprese e Made in Italy)
 Fonte: https://www.mimit.gov.it/it/incentivi
 """
 
-import requests
 from bs4 import BeautifulSoup
 from datetime import datetime
+from http_client import client_condiviso
+from cache_http import CacheHttp
+from metriche import METRICHE
 import re
 
 class MIMITScraper:
     def __init__(self):
         self.base_url = "https://www.mimit.gov.it"
         self.incentivi_url = f"{self.base_url}/it/incentivi"
+        self.http = client_condiviso()
         
-    def scrape_incentivi(self):
-        """Scrape incentivi e bandi MIMIT"""
+    def iter_bandi(self):
+        """Genera gli incentivi MIMIT man mano che vengono estratti dalla pagina elenco"""
         print("🔍 Inizio scraping MIMIT (Incentivi imprese)...")
         
         bandi = []
         
         try:
-            response = requests.get(self.incentivi_url, timeout=15)
-            response.raise_for_status()
+            cache = CacheHttp(client=self.http)
+            pagina = cache.get(self.incentivi_url, timeout=15)
+            if pagina.invariata:
+                # Pagina invariata dall'ultimo run: si riusano gli incentivi già estratti
+                print(f"♻️ MIMIT: pagina invariata, {len(pagina.estratto)} incentivi dalla cache")
+                yield from pagina.estratto
+                return
             
-            soup = BeautifulSoup(response.content, 'html.parser')
-            
-            # Trova tutti i link agli incentivi
-            incentivi_links = soup.find_all('a', href=re.compile(r'/it/incentivi/'))
+            with METRICHE.tempo_parsing("MIMIT"):
+                soup = BeautifulSoup(pagina.risposta.content, 'html.parser')
+                
+                # Trova tutti i link agli incentivi
+                incentivi_links = soup.find_all('a', href=re.compile(r'/it/incentivi/'))
             
             print(f"📋 Trovati {len(incentivi_links)} incentivi da analizzare")
             
@@ -47,7 +56,6 @@ class MIMITScraper:
                     continue
                 
                 bando = {
-                    'id': abs(hash(full_url)),
                     'title': title,
                     'category': 'imprese',
                     'region': 'nazionale',
@@ -60,14 +68,19 @@ class MIMITScraper:
                     'source': 'mimit'
                 }
                 
-                bandi.append(bando)
+                # In cache va la copia estratta, prima che gli stadi a valle modifichino il bando
+                bandi.append(dict(bando))
+                yield bando
             
+            cache.salva_estratto(pagina, bandi)
             print(f"✅ MIMIT: {len(bandi)} incentivi trovati")
             
         except Exception as e:
             print(f"❌ Errore scraping MIMIT: {e}")
-        
-        return bandi
+
+    def scrape_incentivi(self):
+        """Scrape incentivi e bandi MIMIT"""
+        return list(self.iter_bandi())
 
 if __name__ == '__main__':
     scraper = MIMITScraper()
@@ -0,0 +1,89 @@
+"""
+NDJSON Bandi - Snapshot del catalogo un bando per riga
+
+La scrittura procede record per record (nessuna lista materializzata) e
+produce insieme lo snapshot NDJSON e il JSON classico per compatibilità con
+il frontend e la pubblicazione su GitHub. La lettura è incrementale.
+"""
+
+import json
+import os
+
+NDJSON_FILE = "bandi_database_reale.ndjson"
+JSON_FILE = "bandi_database_reale.json"
+
+
+def leggi_ndjson(percorso):
+    """Genera i bandi di un file NDJSON una riga alla volta (le righe corrotte sono saltate)."""
+    with open(percorso, "r", encoding="utf-8") as f:
+        for numero, riga in enumerate(f, 1):
+            riga = riga.strip()
+            if not riga:
+                continue
+            try:
+                yield json.loads(riga)
+            except ValueError as e:
+                print(f"⚠️ Riga {numero} non valida in {percorso}: {e}")
+
+
+def leggi_snapshot(ndjson_path=NDJSON_FILE, json_path=JSON_FILE):
+    """Bandi dello snapshot: NDJSON se presente, altrimenti il JSON classico."""
+    if os.path.exists(ndjson_path):
+        yield from leggi_ndjson(ndjson_path)
+    elif json_path and os.path.exists(json_path):
+        with open(json_path, "r", encoding="utf-8") as f:
+            yield from json.load(f)
+
+
+def riga_ndjson(bando):
+    return json.dumps(bando, ensure_ascii=False, separators=(",", ":")) + "\n"
+
+
+class ScrittoreSnapshot:
+    """
+    Scrive lo snapshot in streaming su file temporanei e li sostituisce agli
+    originali solo all'uscita dal blocco `with` senza errori (e senza annulla()).
+
+        with ScrittoreSnapshot() as s:
+            for bando in bandi:
+                s.scrivi(bando)
+    """
+
+    def __init__(self, ndjson_path=NDJSON_FILE, json_path=JSON_FILE):
+        self.ndjson_path = ndjson_path
+        self.json_path = json_path
+        self.conteggio = 0
+        self._annullato = False
+
+    def __enter__(self):
+        self._ndjson = open(self.ndjson_path + ".tmp", "w", encoding="utf-8")
+        self._json = open(self.json_path + ".tmp", "w", encoding="utf-8") if self.json_path else None
+        if self._json:
+            self._json.write("[")
+        return self
+
+    def scrivi(self, bando):
+        riga = riga_ndjson(bando)
+        self._ndjson.write(riga)
+        if self._json:
+            self._json.write(("," if self.conteggio else "") + riga.rstrip("\n"))
+        self.conteggio += 1
+
+    def annulla(self):
+        """Scarta quanto scritto: gli snapshot esistenti restano intatti."""
+        self._annullato = True
+
+    def __exit__(self, exc_type, exc, tb):
+        if self._json:
+            self._json.write("]")
+        temporanei = [(self._ndjson, self.ndjson_path)]
+        if self._json:
+            temporanei.append((self._json, self.json_path))
+        for f, _ in temporanei:
+            f.close()
+        for f, destinazione in temporanei:
+            if exc_type or self._annullato:
+                os.remove(f.name)
+            else:
+                os.replace(f.name, destinazione)
+        return False
@@ -0,0 +1,168 @@
+"""
+Pipeline Bandi - Sorgenti in streaming e stadi a valle
+
+Ogni scraper espone `iter_bandi()`, un generatore che produce i bandi man mano
+che li estrae, ciascuno nel proprio schema: il primo stadio (schema_bandi.normalizza)
+li porta tutti al record Bando. FlussoSorgenti esegue le sorgenti in thread separati e le fa
+confluire in una coda limitata: se gli stadi a valle (override, id, dedup,
+scrittura) rallentano, gli scraper si fermano invece di accumulare in memoria.
+"""
+
+import json
+import os
+import queue
+import threading
+import time
+
+from differenze_bandi import chiave_bando
+from metriche import METRICHE
+
+OVERRIDE_FILE = os.path.join("data", "manual_overrides.json")
+DIMENSIONE_CODA = 256
+
+_FINE = object()  # segnale di fine sorgente nella coda
+
+
+class FlussoSorgenti:
+    """
+    Iterabile sui bandi di più sorgenti eseguite in parallelo.
+
+    `sorgenti` è una lista di (nome, funzione) dove funzione() restituisce un
+    iterabile di bandi. Al più `concorrenza` sorgenti girano insieme; una
+    sorgente che supera `timeout_sorgente` dal suo avvio viene abbandonata
+    (i bandi già emessi restano). Dopo l'iterazione `report` contiene stato,
+    bandi e secondi per sorgente.
+    """
+
+    def __init__(self, sorgenti, concorrenza, timeout_sorgente, dimensione_coda=DIMENSIONE_CODA):
+        self.sorgenti = sorgenti
+        self.concorrenza = max(1, concorrenza)
+        self.timeout_sorgente = timeout_sorgente
+        self.coda = queue.Queue(maxsize=dimensione_coda)
+        self.report = []
+        self._slot = threading.Semaphore(self.concorrenza)
+        self._lock = threading.Lock()
+        self._stato = {nome: {"sorgente": nome, "stato": "in coda", "bandi": 0, "secondi": 0.0}
+                       for nome, _ in sorgenti}
+        self._avvii = {}
+
+    def _attiva(self, nome):
+        return self._stato[nome]["stato"] == "in corso"
+
+    def _metti(self, nome, elemento):
+        """put bloccante (backpressure) che si arrende se la sorgente viene abbandonata."""
+        while True:
+            try:
+                self.coda.put((nome, elemento), timeout=0.5)
+                return True
+            except queue.Full:
+                if not self._attiva(nome):
+                    return False
+
+    def _produttore(self, nome, funzione):
+        self._slot.acquire()
+        with self._lock:
+            if self._stato[nome]["stato"] != "in coda":
+                self._slot.release()
+                return
+            self._stato[nome]["stato"] = "in corso"
+            self._avvii[nome] = time.monotonic()
+        try:
+            for bando in funzione() or ():
+                if not self._metti(nome, bando):
+                    return  # abbandonata per timeout
+            esito, errore = "ok", None
+        except Exception as e:
+            esito, errore = "errore", str(e)
+        with self._lock:
+            if not self._attiva(nome):
+                return  # già abbandonata per timeout, lo slot è stato liberato
+            self._stato[nome].update(stato=esito, secondi=round(time.monotonic() - self._avvii[nome], 2))
+            if errore:
+                self._stato[nome]["errore"] = errore
+            self._slot.release()
+        self._metti_fine(nome)
+
+    def _metti_fine(self, nome):
+        self.coda.put((nome, _FINE))
+
+    def _controlla_timeout(self, attive):
+        with self._lock:
+            ora = time.monotonic()
+            for nome in list(attive):
+                s = self._stato[nome]
+                if s["stato"] == "in corso" and ora - self._avvii[nome] > self.timeout_sorgente:
+                    s.update(stato="timeout", secondi=round(ora - self._avvii[nome], 2))
+                    self._slot.release()
+                    attive.discard(nome)
+
+    def __iter__(self):
+        inizio = time.monotonic()
+        for nome, funzione in self.sorgenti:
+            threading.Thread(target=self._produttore, args=(nome, funzione), daemon=True,
+                             name=f"scraper-{nome}").start()
+
+        attive = {nome for nome, _ in self.sorgenti}
+        while attive:
+            try:
+                nome, elemento = self.coda.get(timeout=0.5)
+            except queue.Empty:
+                self._controlla_timeout(attive)
+                continue
+            if elemento is _FINE:
+                attive.discard(nome)
+            elif self._stato[nome]["stato"] != "timeout":
+                self._stato[nome]["bandi"] += 1
+                yield elemento
+            self._controlla_timeout(attive)
+
+        self.report = [self._stato[nome] for nome, _ in self.sorgenti]
+        METRICHE.registra_sorgenti(self.report)
+        totale = 0
+        for s in self.report:
+            totale += s["bandi"]
+            if s["stato"] == "ok":
+                print(f"✅ {s['sorgente']}: {s['bandi']} bandi in {s['secondi']}s")
+            elif s["stato"] == "timeout":
+                print(f"⏱️ {s['sorgente']}: abbandonato dopo {s['secondi']}s "
+                      f"(timeout {self.timeout_sorgente}s), {s['bandi']} bandi tenuti")
+            else:
+                print(f"⚠️ Errore {s['sorgente']}: {s.get('errore')}")
+        print(f"⏱️ Scraping completato in {time.monotonic() - inizio:.2f}s "
+              f"({self.concorrenza} sorgenti in parallelo), {totale} bandi totali")
+
+
+# =========================================================
+# 🔧 STADI A VALLE
+# =========================================================
+
+def carica_override(percorso=OVERRIDE_FILE):
+    """Descrizioni brevi, importi e scadenze inseriti a mano (chiave: titolo o link)."""
+    if os.path.exists(percorso):
+        try:
+            with open(percorso, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except Exception as e:
+            print(f"⚠️ Errore lettura {percorso}: {e}")
+    return {}
+
+
+def applica_override(bandi, overrides):
+    """🔄 Applica le modifiche manuali ai bandi (già normalizzati) che le hanno, per titolo o per link."""
+    for bando in bandi:
+        override = overrides.get(bando.get("titolo")) or overrides.get(bando.get("link")) or {}
+        for campo in ("descrizione_breve", "importo", "scadenza"):
+            if campo in override:
+                bando[campo] = override[campo]
+        yield bando
+
+
+def deduplica(bandi):
+    """Scarta i bandi già visti (stessa chiave canonica), anche tra sorgenti diverse."""
+    visti = set()
+    for bando in bandi:
+        chiave = chiave_bando(bando)
+        if chiave in visti:
+            continue
+        visti.add(chiave)
+        yield bando
@@ -0,0 +1,332 @@
+"""
+Preferenze Bandi - Raccomandazioni personalizzate dalle preferenze degli utenti
+
+Le `preferences` salvate da auth_server (categorie, regioni, età, titolo di
+studio, ISEE, genere) vengono compilate una volta in un Predicato e valutate su
+indici bitmap del catalogo: ogni insieme di bandi è un int Python, quindi
+filtri e requisiti si combinano con & e | in C invece di scorrere tutti i bandi
+per ogni utente. Il bit i è l'i-esimo bando per scadenza, così anche la
+classifica resta sulle bitmap: il punteggio è tenuto in contatori bit-sliced e
+dei bandi del livello di punteggio più alto si leggono i bit più bassi, già
+nell'ordine giusto, fino al limite.
+
+I requisiti dei bandi (schema_bandi: age_min, age_max, education, isee_max,
+gender) sono soglie: per ognuna l'indice tiene le bitmap cumulate sui valori
+ordinati e "bandi con age_min <= 30" è una ricerca binaria più un lookup.
+
+Utenti con le stesse preferenze condividono lo stesso Predicato: il batch che
+gira dopo ogni refresh (genera_database_bandi) valuta ogni profilo distinto una
+volta sola e salva le raccomandazioni nell'archivio utenti.
+"""
+
+import time
+from bisect import bisect_left, bisect_right
+from datetime import date
+
+LIMITE = 50
+
+# Nomi accettati nelle preferenze dell'utente, come ALIAS in schema_bandi
+ALIAS = {
+    "categorie": ("categorie", "categories", "categoria", "category"),
+    "regioni": ("regioni", "regions", "regione", "region"),
+    "eta": ("eta", "età", "age"),
+    "istruzione": ("istruzione", "titolo_studio", "education"),
+    "isee": ("isee",),
+    "genere": ("genere", "gender"),
+}
+
+# Titolo di studio richiesto da un bando -> livello; chi ha un livello pari o superiore lo soddisfa
+LIVELLI_ISTRUZIONE = {
+    "nessuno": 0,
+    "licenza_media": 1,
+    "diploma": 2,
+    "laurea": 3,
+    "laurea_triennale": 3,
+    "laurea_magistrale": 4,
+    "master": 4,
+    "dottorato": 5,
+}
+
+REGIONE_NAZIONALE = "nazionale"  # vale per chiunque, qualunque regione abbia scelto
+
+# Pesi (interi) del punteggio: un bando della propria regione conta più di uno nazionale,
+# e un requisito esplicitamente soddisfatto indica un bando pensato per quel profilo
+PESO_REGIONE = 2
+PESO_REQUISITO = 1
+
+
+def posizioni(bitmap):
+    """Indici dei bit accesi, dal più basso."""
+    while bitmap:
+        bit = bitmap & -bitmap
+        yield bit.bit_length() - 1
+        bitmap ^= bit
+
+
+def _somma(contatore, bitmap, peso):
+    """Aggiunge `peso` ai bandi di `bitmap` nel contatore bit-sliced (contatore[k] = bit k del punteggio)."""
+    k = 0
+    while peso:
+        if peso & 1:
+            riporto, i = bitmap, k
+            while riporto:
+                while i >= len(contatore):
+                    contatore.append(0)
+                cifra = contatore[i]
+                contatore[i] = cifra ^ riporto
+                riporto &= cifra
+                i += 1
+        peso >>= 1
+        k += 1
+
+
+def _livello(valore):
+    if not isinstance(valore, str):
+        return None
+    return LIVELLI_ISTRUZIONE.get(valore.strip().lower().replace(" ", "_"))
+
+
+def _numero(valore):
+    if isinstance(valore, bool):
+        return None
+    if isinstance(valore, (int, float)):
+        return valore
+    try:
+        return float(str(valore).replace(",", "."))
+    except ValueError:
+        return None
+
+
+class _Soglie:
+    """Bitmap cumulate su valori ordinati: i bandi con valore <= x (o < x) in O(log n)."""
+
+    def __init__(self, coppie):
+        self.valori, self._cumulate = [], []
+        self.tutti = 0
+        for valore, pos in sorted(coppie):
+            if self.valori and self.valori[-1] == valore:
+                self.tutti |= 1 << pos
+                self._cumulate[-1] = self.tutti
+            else:
+                self.tutti |= 1 << pos
+                self.valori.append(valore)
+                self._cumulate.append(self.tutti)
+
+    def al_massimo(self, x):
+        i = bisect_right(self.valori, x)
+        return self._cumulate[i - 1] if i else 0
+
+    def sotto(self, x):
+        i = bisect_left(self.valori, x)
+        return self._cumulate[i - 1] if i else 0
+
+
+class IndicePreferenze:
+    """
+    Bitmap per categoria, regione, stato, scadenza e requisiti di una lista di
+    Bando. Il bit i è self.bandi[i]: i bandi sono riordinati per scadenza (più
+    vicina prima, senza scadenza in coda).
+    """
+
+    def __init__(self, bandi):
+        bandi = sorted(bandi, key=lambda b: (b.scadenza is None, b.scadenza or date.min))
+        self.bandi = bandi
+        self.universo = (1 << len(bandi)) - 1
+        self.categoria, self.regione, self.genere = {}, {}, {}
+        self.aperti = 0
+        eta_min, eta_max, isee, istruzione, scadenze = [], [], [], [], []
+
+        for pos, bando in enumerate(bandi):
+            bit = 1 << pos
+            if bando.categoria:
+                self.categoria[bando.categoria] = self.categoria.get(bando.categoria, 0) | bit
+            if bando.regione:
+                self.regione[bando.regione] = self.regione.get(bando.regione, 0) | bit
+            if bando.stato == "aperto":
+                self.aperti |= bit
+            if bando.scadenza is not None:
+                scadenze.append((bando.scadenza, pos))
+
+            requisiti = bando.requisiti or {}
+            for chiave, lista in (("age_min", eta_min), ("age_max", eta_max), ("isee_max", isee)):
+                valore = _numero(requisiti.get(chiave))
+                if valore is not None:
+                    lista.append((valore, pos))
+            livello = _livello(requisiti.get("education"))
+            if livello is not None:  # un titolo non riconosciuto non esclude nessuno
+                istruzione.append((livello, pos))
+            genere = requisiti.get("gender")
+            if isinstance(genere, str) and genere.strip():
+                genere = genere.strip().lower()
+                self.genere[genere] = self.genere.get(genere, 0) | bit
+
+        self.eta_min = _Soglie(eta_min)
+        self.eta_max = _Soglie(eta_max)
+        self.isee = _Soglie(isee)
+        self.istruzione = _Soglie(istruzione)
+        self.scadenze = _Soglie(scadenze)
+        self.con_genere = 0
+        for bitmap in self.genere.values():
+            self.con_genere |= bitmap
+
+    # ---------- Compatibilità con un profilo ----------
+    def validi(self, oggi):
+        """Bandi aperti e non ancora scaduti alla data `oggi`."""
+        return self.aperti & ~self.scadenze.sotto(oggi)
+
+    def per_eta(self, eta):
+        minimo = (self.universo & ~self.eta_min.tutti) | self.eta_min.al_massimo(eta)
+        massimo = (self.universo & ~self.eta_max.tutti) | (self.eta_max.tutti & ~self.eta_max.sotto(eta))
+        return minimo & massimo
+
+    def per_isee(self, isee):
+        return (self.universo & ~self.isee.tutti) | (self.isee.tutti & ~self.isee.sotto(isee))
+
+    def per_istruzione(self, livello):
+        return (self.universo & ~self.istruzione.tutti) | self.istruzione.al_massimo(livello)
+
+    def per_genere(self, genere):
+        return (self.universo & ~self.con_genere) | self.genere.get(genere, 0)
+
+
+class Predicato:
+    """Preferenze normalizzate di un utente; hashable, così i profili uguali si valutano una volta."""
+
+    __slots__ = ("categorie", "regioni", "eta", "istruzione", "isee", "genere")
+
+    def __init__(self, categorie=frozenset(), regioni=frozenset(), eta=None, istruzione=None,
+                 isee=None, genere=None):
+        self.categorie = categorie
+        self.regioni = regioni
+        self.eta = eta
+        self.istruzione = istruzione
+        self.isee = isee
+        self.genere = genere
+
+    def _chiave(self):
+        return (self.categorie, self.regioni, self.eta, self.istruzione, self.isee, self.genere)
+
+    def __eq__(self, altro):
+        return isinstance(altro, Predicato) and self._chiave() == altro._chiave()
+
+    def __hash__(self):
+        return hash(self._chiave())
+
+    def valuta(self, indice, oggi=None):
+        """Bitmap dei bandi che soddisfano le preferenze."""
+        risultato = indice.validi(oggi or date.today())
+        if self.categorie:
+            scelte = 0
+            for categoria in self.categorie:
+                scelte |= indice.categoria.get(categoria, 0)
+            risultato &= scelte
+        if self.regioni:
+            scelte = indice.regione.get(REGIONE_NAZIONALE, 0)
+            for regione in self.regioni:
+                scelte |= indice.regione.get(regione, 0)
+            risultato &= scelte
+        if self.eta is not None:
+            risultato &= indice.per_eta(self.eta)
+        if self.isee is not None:
+            risultato &= indice.per_isee(self.isee)
+        if self.istruzione is not None:
+            risultato &= indice.per_istruzione(self.istruzione)
+        if self.genere is not None:
+            risultato &= indice.per_genere(self.genere)
+        return risultato
+
+    def classifica(self, indice, oggi=None, limite=LIMITE):
+        """
+        [(posizione, punteggio)] dei bandi compatibili: punteggio più alto prima,
+        a parità la scadenza più vicina (l'ordine dei bit).
+        """
+        compatibili = self.valuta(indice, oggi)
+        bonus = []
+        if self.regioni:
+            specifici = 0
+            for regione in self.regioni - {REGIONE_NAZIONALE}:
+                specifici |= indice.regione.get(regione, 0)
+            bonus.append((specifici, PESO_REGIONE))
+        if self.eta is not None:
+            bonus.append((indice.eta_min.tutti | indice.eta_max.tutti, PESO_REQUISITO))
+        if self.isee is not None:
+            bonus.append((indice.isee.tutti, PESO_REQUISITO))
+        if self.istruzione is not None:
+            bonus.append((indice.istruzione.tutti, PESO_REQUISITO))
+        if self.genere is not None:
+            bonus.append((indice.con_genere, PESO_REQUISITO))
+        contatore = []
+        for bitmap, peso in bonus:
+            _somma(contatore, compatibili & bitmap, peso)
+
+        risultati = []
+        for punteggio in range(sum(peso for _, peso in bonus), -1, -1):
+            livello = compatibili
+            for k, cifra in enumerate(contatore):
+                livello &= cifra if punteggio >> k & 1 else ~cifra
+            if punteggio >> len(contatore):
+                livello = 0  # punteggio non rappresentabile: nessun bando lo raggiunge
+            for pos in posizioni(livello):
+                if len(risultati) == limite:
+                    return risultati
+                risultati.append((pos, punteggio))
+        return risultati
+
+
+def _valori(valore):
+    if isinstance(valore, str):
+        valore = [valore]
+    if not isinstance(valore, (list, tuple, set)):
+        return frozenset()
+    return frozenset(v.strip().lower() for v in valore if isinstance(v, str) and v.strip())
+
+
+def _campo(preferenze, nome):
+    for alias in ALIAS[nome]:
+        if preferenze.get(alias) not in (None, "", []):
+            return preferenze[alias]
+    return None
+
+
+def compila(preferenze):
+    """Predicato dalle preferences di un utente (chiavi sconosciute e valori non validi ignorati)."""
+    preferenze = preferenze if isinstance(preferenze, dict) else {}
+    eta = _numero(_campo(preferenze, "eta"))
+    isee = _numero(_campo(preferenze, "isee"))
+    genere = _campo(preferenze, "genere")
+    return Predicato(
+        categorie=_valori(_campo(preferenze, "categorie")),
+        regioni=_valori(_campo(preferenze, "regioni")),
+        eta=eta,
+        istruzione=_livello(_campo(preferenze, "istruzione")),
+        isee=isee,
+        genere=genere.strip().lower() if isinstance(genere, str) and genere.strip() else None,
+    )
+
+
+def raccomanda(indice, preferenze, oggi=None, limite=LIMITE):
+    """[(bando, punteggio)] per le preferenze di un utente."""
+    return [(indice.bandi[pos], punteggio)
+            for pos, punteggio in compila(preferenze).classifica(indice, oggi, limite)]
+
+
+def raccomanda_tutti(indice, utenti, oggi=None, limite=LIMITE):
+    """
+    Batch per tutta la base utenti: `utenti` è un iterabile di (email, preferences).
+    Restituisce {email: [(bando_id, punteggio)]}; ogni profilo distinto si valuta una volta.
+    """
+    inizio = time.perf_counter()
+    oggi = oggi or date.today()
+    per_predicato = {}
+    for email, preferenze in utenti:
+        per_predicato.setdefault(compila(preferenze), []).append(email)
+
+    risultati = {}
+    for predicato, emails in per_predicato.items():
+        classifica = [(indice.bandi[pos].id, punteggio)
+                      for pos, punteggio in predicato.classifica(indice, oggi, limite)]
+        for email in emails:
+            risultati[email] = classifica
+    print(f"🎯 Raccomandazioni: {len(risultati)} utenti, {len(per_predicato)} profili distinti "
+          f"in {time.perf_counter() - inizio:.2f}s")
+    return risultati
@@ -0,0 +1,171 @@
+"""
+Ricerca - Indice full-text per i bandi con analisi della lingua italiana
+
+Tokenizzazione con piegatura di accenti e apostrofi (l’acquisto = l'acquisto =
+acquisto), stopword e stemming leggero italiano, ranking BM25 e completamento
+per prefisso dell'ultima parola digitata. Le query leggono solo le posting
+list dei termini cercati, non scorrono l'intero catalogo.
+"""
+
+import heapq
+import math
+import re
+import unicodedata
+from bisect import bisect_left
+
+APOSTROFI = str.maketrans({"’": "'", "‘": "'", "`": "'", "´": "'", "ʼ": "'"})
+_PAROLA_RE = re.compile(r"[a-z0-9]+")
+
+STOPWORD = frozenset("""
+a ad al alla alle allo agli ai all anche che chi ci con cui da dal dalla dalle dai dagli dall
+degli dei del della delle dello dell di e ed gli i il in la le lo l ma ne nel nella nelle nello
+nei negli nell non o per piu se si sia sono su sul sulla sulle sui sugli sull tra fra un una uno
+come questo questa questi queste quello quella essere ha hanno tutto tutti
+""".split())
+
+# Suffissi derivazionali e participi, dal più lungo: se ne toglie al più uno
+SUFFISSI = sorted((
+    "azione", "azioni", "amento", "amenti", "imento", "imenti", "mente", "atore", "atori",
+    "atrice", "atrici", "itore", "itori", "abile", "abili", "ibile", "ibili", "ista", "isti",
+    "iste", "ismo", "ismi", "ita", "ato", "ati", "ata", "ate", "ito", "iti", "ite", "uto",
+    "uti", "uta", "ute", "ando", "endo", "ivo", "ivi", "iva", "ive",
+), key=len, reverse=True)
+
+MIN_RADICE = 3
+K1 = 1.2
+B = 0.75
+PESO_TITOLO = 2  # i termini del titolo contano come se comparissero due volte
+
+
+def piega(testo):
+    """Minuscolo, senza accenti, apostrofi tipografici uniformati."""
+    testo = unicodedata.normalize("NFKD", (testo or "").translate(APOSTROFI))
+    return "".join(c for c in testo if not unicodedata.combining(c)).lower()
+
+
+def stem(parola):
+    """Stemmer leggero: un suffisso derivazionale, poi la vocale finale."""
+    if len(parola) <= MIN_RADICE + 1 or parola.isdigit():
+        return parola
+    for suffisso in SUFFISSI:
+        if parola.endswith(suffisso) and len(parola) - len(suffisso) >= MIN_RADICE:
+            parola = parola[:-len(suffisso)]
+            break
+    if len(parola) > MIN_RADICE + 1 and parola[-1] in "aeio":
+        parola = parola[:-1]
+    if len(parola) > MIN_RADICE + 1 and parola.endswith(("ch", "gh")):
+        parola = parola[:-1]
+    return parola
+
+
+def parole(testo):
+    """Parole piegate, con le elisioni separate (l'acquisto -> acquisto) e senza stopword."""
+    return [p for p in _PAROLA_RE.findall(piega(testo)) if len(p) > 1 and p not in STOPWORD]
+
+
+class IndiceTestuale:
+    """Indice invertito BM25 su titolo, descrizione ed ente dei bandi."""
+
+    def __init__(self, bandi):
+        self.n_doc = len(bandi)
+        self.posting = {}      # radice -> {posizione: frequenza}
+        self.lunghezze = []
+        self.forme = {}        # parola piegata -> radice (per il completamento)
+        self.df_forme = {}     # parola piegata -> numero di bandi che la contengono
+
+        for pos, bando in enumerate(bandi):
+            titolo = bando.titolo or ""
+            corpo = " ".join(v for v in (bando.descrizione_breve, bando.descrizione, bando.ente) if v)
+            parole_titolo, parole_corpo = parole(titolo), parole(corpo)
+
+            frequenze = {}
+            for parola in parole_titolo * PESO_TITOLO + parole_corpo:
+                radice = self.forme.get(parola)
+                if radice is None:
+                    radice = self.forme[parola] = stem(parola)
+                frequenze[radice] = frequenze.get(radice, 0) + 1
+            for parola in set(parole_titolo + parole_corpo):
+                self.df_forme[parola] = self.df_forme.get(parola, 0) + 1
+            for radice, tf in frequenze.items():
+                self.posting.setdefault(radice, {})[pos] = tf
+            self.lunghezze.append(sum(frequenze.values()))
+
+        self.lunghezza_media = (sum(self.lunghezze) / self.n_doc) if self.n_doc else 0.0
+        self.vocabolario = sorted(self.forme)
+
+    # ---------- Analisi della query ----------
+    def _espandi_prefisso(self, prefisso, massimo=50):
+        """Radici delle parole del vocabolario che iniziano con `prefisso`."""
+        i = bisect_left(self.vocabolario, prefisso)
+        radici = set()
+        while i < len(self.vocabolario) and self.vocabolario[i].startswith(prefisso) and len(radici) < massimo:
+            radici.add(self.forme[self.vocabolario[i]])
+            i += 1
+        return radici
+
+    def _gruppi_query(self, q, prefisso=True):
+        """
+        Un gruppo di radici alternative per ogni parola della query.
+        L'ultima parola, se la query non termina con uno spazio, vale anche come prefisso.
+        """
+        termini = parole(q)
+        gruppi = [{stem(t)} for t in termini]
+        if prefisso and termini and q and not q[-1].isspace():
+            gruppi[-1] |= self._espandi_prefisso(termini[-1])
+        return gruppi
+
+    def _idf(self, radice):
+        df = len(self.posting.get(radice, ()))
+        return math.log(1 + (self.n_doc - df + 0.5) / (df + 0.5))
+
+    # ---------- Query ----------
+    def posizioni(self, q, prefisso=True):
+        """Posizioni dei bandi che contengono tutte le parole della query."""
+        risultato = None
+        for gruppo in self._gruppi_query(q, prefisso):
+            trovati = set()
+            for radice in gruppo:
+                trovati.update(self.posting.get(radice, ()))
+            risultato = trovati if risultato is None else risultato & trovati
+            if not risultato:
+                return set()
+        return risultato if risultato is not None else set()
+
+    def cerca(self, q, limit=20, candidati=None, prefisso=True):
+        """
+        Bandi ordinati per BM25 (tutte le parole richieste). Restituisce
+        ([(posizione, punteggio)], totale). `candidati` restringe a un sottoinsieme.
+        """
+        gruppi = self._gruppi_query(q, prefisso)
+        if not gruppi:
+            return [], 0
+        trovati = self.posizioni(q, prefisso)
+        if candidati is not None:
+            trovati &= candidati
+        if not trovati:
+            return [], 0
+
+        punteggi = dict.fromkeys(trovati, 0.0)
+        for gruppo in gruppi:
+            for radice in gruppo:
+                idf = self._idf(radice)
+                for pos, tf in self.posting.get(radice, {}).items():
+                    if pos in punteggi:
+                        norma = K1 * (1 - B + B * self.lunghezze[pos] / (self.lunghezza_media or 1))
+                        punteggi[pos] += idf * tf * (K1 + 1) / (tf + norma)
+
+        migliori = heapq.nlargest(limit, punteggi.items(), key=lambda kv: (kv[1], -kv[0]))
+        return migliori, len(punteggi)
+
+    def completa(self, prefisso, limit=8):
+        """Parole del catalogo che iniziano con il prefisso, le più frequenti prima."""
+        termini = _PAROLA_RE.findall(piega(prefisso))
+        if not termini:
+            return []
+        prefisso = termini[-1]
+        i = bisect_left(self.vocabolario, prefisso)
+        candidate = []
+        while i < len(self.vocabolario) and self.vocabolario[i].startswith(prefisso):
+            candidate.append(self.vocabolario[i])
+            i += 1
+        return heapq.nsmallest(limit, candidate, key=lambda p: (-self.df_forme.get(p, 0), p))
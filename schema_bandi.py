@@ -0,0 +1,193 @@
+"""
+Schema Bandi - Record canonico unico per tutte le sorgenti
+
+Gli scraper parlano dialetti diversi (titolo/link/scadenza/fonte,
+title/url/deadline/source, i dict grezzi dell'API InPA). Lo stadio di
+normalizzazione li traduce una volta sola in Bando: nomi italiani, categoria,
+regione e stato in minuscolo, importo numerico e date già convertite in
+datetime.date. Con __slots__ ogni record occupa una frazione di un dict e a
+valle (indici, API, frontend) non servono più i fallback tra nomi alternativi.
+"""
+
+import re
+import sys
+from datetime import date, datetime
+
+FORMATI_DATA = ("%Y-%m-%d", "%d/%m/%Y", "%d.%m.%Y", "%d-%m-%Y")
+
+# Campo canonico -> nomi con cui le sorgenti lo chiamano (il primo non vuoto vince)
+ALIAS = {
+    "titolo": ("titolo", "title"),
+    "descrizione": ("descrizione", "description"),
+    "descrizione_breve": ("descrizione_breve", "descrizioneBreve"),
+    "ente": ("ente", "entity", "entiRiferimento"),
+    "categoria": ("categoria", "category"),
+    "regione": ("regione", "region"),
+    "stato": ("stato", "status"),
+    "importo": ("importo", "amount"),
+    "scadenza": ("scadenza", "deadline", "dataScadenza"),
+    "pubblicato": ("pubblicato", "published", "dataPubblicazione"),
+    "link": ("link", "url"),
+    "fonte": ("fonte", "source"),
+    "requisiti": ("requisiti", "requirements"),
+    "fonti": ("fonti",),
+}
+
+DEFAULT = {
+    "titolo": "Bando senza titolo",
+    "descrizione": "",
+    "descrizione_breve": "",
+    "categoria": "generale",
+    "regione": "nazionale",
+    "stato": "aperto",
+    "importo": 0,
+}
+
+_MINUSCOLI = ("categoria", "regione", "stato", "fonte")
+_MIGLIAIA_RE = re.compile(r"\d{1,3}(\.\d{3})+")
+
+
+def parse_data(valore):
+    """date da una data testuale (anche ISO con orario), None se non è una data."""
+    if isinstance(valore, datetime):
+        return valore.date()
+    if isinstance(valore, date):
+        return valore
+    if not valore or not isinstance(valore, str):
+        return None
+    testo = valore.strip()[:10]
+    for fmt in FORMATI_DATA:
+        try:
+            return datetime.strptime(testo, fmt).date()
+        except ValueError:
+            continue
+    return None
+
+
+def _importo(valore):
+    """Importo numerico; "€ 50.000" e "1.500,50" sono letti all'italiana, altri testi restano testo."""
+    if isinstance(valore, (int, float)) and not isinstance(valore, bool):
+        return valore
+    testo = str(valore or "").replace("€", "").strip()
+    if not testo:
+        return 0
+    if "," in testo or _MIGLIAIA_RE.fullmatch(testo):
+        testo = testo.replace(".", "").replace(",", ".")
+    try:
+        numero = float(testo)
+    except ValueError:
+        return str(valore).strip()
+    return int(numero) if numero.is_integer() else numero
+
+
+class Bando:
+    """
+    Bando normalizzato. Si legge per attributo (bando.scadenza è una date) ma
+    supporta anche get()/[] sui nomi canonici, così gli stadi della pipeline
+    funzionano sia sui dict sia sui Bando.
+    """
+
+    __slots__ = ("id", "id_fonte", "titolo", "descrizione", "descrizione_breve", "ente",
+                 "categoria", "regione", "stato", "importo", "scadenza", "scadenza_nota",
+                 "pubblicato", "link", "fonte", "requisiti", "fonti")
+
+    def __init__(self, **campi):
+        for nome in self.__slots__:
+            setattr(self, nome, None)
+        for nome, valore in campi.items():
+            self[nome] = valore
+
+    @classmethod
+    def da_dict(cls, dati):
+        """Normalizza un record di qualunque sorgente (o di uno snapshot precedente)."""
+        bando = cls()
+        for nome, alias in ALIAS.items():
+            for chiave in alias:
+                valore = dati.get(chiave)
+                if valore not in (None, "", []):
+                    bando[nome] = valore
+                    break
+            else:
+                if nome in DEFAULT:
+                    bando[nome] = DEFAULT[nome]
+
+        nativo = dati.get("id")
+        if isinstance(nativo, str) and nativo:
+            bando.id_fonte = nativo  # es. l'UUID dei concorsi InPA
+        elif isinstance(nativo, int):
+            bando.id = nativo
+        if dati.get("id_fonte"):
+            bando.id_fonte = dati["id_fonte"]
+        if bando.ente is None:
+            bando.ente = bando.fonte or "altro"
+        return bando
+
+    # ---------- Accesso stile dict ----------
+    def __setitem__(self, nome, valore):
+        if nome not in self.__slots__:
+            raise KeyError(nome)
+        if nome == "scadenza":
+            self.scadenza = parse_data(valore)
+            # testi come "A sportello" restano come nota; "N/D" e simili equivalgono a nessuna scadenza
+            nota = valore.strip() if isinstance(valore, str) and self.scadenza is None else None
+            self.scadenza_nota = nota if nota and nota.upper() not in ("N/D", "ND", "N.D.") else None
+            return
+        if nome == "pubblicato":
+            valore = parse_data(valore)
+        elif nome == "importo":
+            valore = _importo(valore)
+        elif nome == "ente" and isinstance(valore, list):
+            valore = ", ".join(str(v) for v in valore if v)
+        elif nome in _MINUSCOLI and isinstance(valore, str):
+            valore = sys.intern(valore.strip().lower())  # pochi valori distinti: una copia sola
+        elif nome == "ente" and isinstance(valore, str):
+            valore = sys.intern(valore.strip())
+        elif nome == "requisiti" and isinstance(valore, dict):
+            valore = {k: v for k, v in valore.items() if v is not None} or None
+        elif isinstance(valore, str):
+            valore = valore.strip()
+        setattr(self, nome, valore)
+
+    def __getitem__(self, nome):
+        if nome not in self.__slots__:
+            raise KeyError(nome)
+        return getattr(self, nome)
+
+    def get(self, nome, default=None):
+        valore = getattr(self, nome, None) if nome in self.__slots__ else None
+        return default if valore is None else valore
+
+    # ---------- Serializzazione ----------
+    def a_dict(self):
+        """Forma JSON dello snapshot e dell'API (date in ISO, scadenza testuale se non è una data)."""
+        dati = {
+            "id": self.id,
+            "titolo": self.titolo,
+            "descrizione": self.descrizione,
+            "descrizione_breve": self.descrizione_breve,
+            "ente": self.ente,
+            "categoria": self.categoria,
+            "regione": self.regione,
+            "stato": self.stato,
+            "importo": self.importo,
+            "scadenza": self.scadenza.isoformat() if self.scadenza else self.scadenza_nota,
+            "pubblicato": self.pubblicato.isoformat() if self.pubblicato else None,
+            "link": self.link,
+            "fonte": self.fonte,
+        }
+        if self.id_fonte:
+            dati["id_fonte"] = self.id_fonte
+        if self.requisiti:
+            dati["requisiti"] = self.requisiti
+        if self.fonti:
+            dati["fonti"] = self.fonti  # provenienza dei quasi-duplicati assorbiti (duplicati_bandi)
+        return dati
+
+    def __repr__(self):
+        return f"Bando(id={self.id!r}, titolo={self.titolo!r})"
+
+
+def normalizza(bandi):
+    """Stadio della pipeline: dict di qualunque sorgente -> Bando."""
+    for dati in bandi:
+        yield dati if isinstance(dati, Bando) else Bando.da_dict(dati)
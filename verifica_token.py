@@ -0,0 +1,111 @@
+"""
+Verifica Token - JWT verificati una volta e revoca lato server
+
+Ogni richiesta protetta di auth_server ripeteva jwt.decode (HMAC + parsing
+JSON). Qui i claim già verificati restano in una cache LRU limitata, con
+chiave il digest del token (il token in chiaro non viene conservato): una voce
+vale al massimo TTL secondi e mai oltre l'`exp` del token.
+
+La revoca rende effettivo il logout: il digest del token (16 byte) va
+nell'archivio utenti, condiviso tra i worker, fino alla sua scadenza naturale.
+Ogni processo ne tiene una copia in un set e la aggiorna al più ogni
+AGGIORNA_REVOCHE secondi leggendo solo le revoche nuove.
+"""
+
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+import jwt
+
+CAPIENZA = 10000
+TTL = 300
+AGGIORNA_REVOCHE = 2.0
+MARGINE_REVOCHE = 5.0  # si rilegge un po' all'indietro: revoche di altri worker con orologio di commit sfasato
+ALGORITMI = ["HS256"]
+
+
+class TokenRevocato(jwt.InvalidTokenError):
+    pass
+
+
+def digest_token(token):
+    return hashlib.blake2b(token.encode("utf-8"), digest_size=16).digest()
+
+
+class VerificaToken:
+    def __init__(self, segreto, archivio=None, capienza=CAPIENZA, ttl=TTL):
+        self.segreto = segreto
+        self.archivio = archivio  # None: revoche valide solo in questo processo
+        self.capienza = capienza
+        self.ttl = ttl
+        self._cache = OrderedDict()  # digest -> (claims, valida_fino_a)
+        self._revocati = {}  # digest -> scadenza del token
+        self._ultima_revoca = 0.0
+        self._prossimo_aggiornamento = 0.0
+        self._lock = threading.Lock()
+
+    def verifica(self, token):
+        """
+        Claim del token; solleva jwt.ExpiredSignatureError, TokenRevocato o un
+        altro jwt.InvalidTokenError come jwt.decode.
+        """
+        digest = digest_token(token)
+        ora = time.time()
+        self._aggiorna_revoche(ora)
+        with self._lock:
+            if digest in self._revocati:
+                raise TokenRevocato("Token revocato")
+            voce = self._cache.get(digest)
+            if voce is not None:
+                claims, valida_fino_a = voce
+                if ora < valida_fino_a:
+                    self._cache.move_to_end(digest)
+                    return claims
+                del self._cache[digest]
+                if "exp" in claims and ora >= claims["exp"]:
+                    raise jwt.ExpiredSignatureError("Signature has expired")
+
+        claims = jwt.decode(token, self.segreto, algorithms=ALGORITMI)
+        valida_fino_a = min(ora + self.ttl, claims.get("exp", float("inf")))
+        with self._lock:
+            self._cache[digest] = (claims, valida_fino_a)
+            self._cache.move_to_end(digest)
+            while len(self._cache) > self.capienza:
+                self._cache.popitem(last=False)
+        return claims
+
+    def revoca(self, token):
+        """Revoca un token valido (logout); False se il token non è verificabile."""
+        try:
+            claims = self.verifica(token)
+        except jwt.InvalidTokenError:
+            return False
+        digest = digest_token(token)
+        scadenza = claims.get("exp", time.time() + self.ttl)
+        if self.archivio is not None:
+            self.archivio.revoca_token(digest, scadenza)
+            self.archivio.pulisci_token_revocati()
+        with self._lock:
+            self._revocati[digest] = scadenza
+            self._cache.pop(digest, None)
+        return True
+
+    def _aggiorna_revoche(self, ora):
+        """Legge dall'archivio le revoche fatte dagli altri worker e scarta quelle scadute."""
+        if self.archivio is None or ora < self._prossimo_aggiornamento:
+            return
+        with self._lock:
+            if ora < self._prossimo_aggiornamento:
+                return
+            self._prossimo_aggiornamento = ora + AGGIORNA_REVOCHE
+            dal = self._ultima_revoca - MARGINE_REVOCHE
+        nuove = self.archivio.token_revocati(dal)
+        with self._lock:
+            for digest, scadenza, revocato_il in nuove:
+                self._revocati[digest] = scadenza
+                self._cache.pop(digest, None)
+                self._ultima_revoca = max(self._ultima_revoca, revocato_il)
+            for digest in [d for d, scadenza in self._revocati.items() if scadenza <= ora]:
+                del self._revocati[digest]